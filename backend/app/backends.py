@@ -0,0 +1,413 @@
+import os
+import pickle
+from abc import ABC, abstractmethod
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional
+
+import pandas as pd
+
+from .transforms import densify
+
+# Where session versions live besides this process's memory. With the default
+# in-process backend nothing is shared and a session exists only in the worker
+# that created it. The shared backends keep every version in a blob store all
+# workers can reach, so any uvicorn worker or host can serve any session:
+#   directory  one directory (local or a shared mount) of Arrow IPC files,
+#              read back memory-mapped, and flock-based session locks
+#   kv         a key-value service; the key scheme is the same as the
+#              directory's. Clients need get/set(nx, px)/delete plus the
+#              token-guarded delete_if/expire_if used by session locks: LocalKV
+#              is an in-process stand-in, RedisKV adapts redis-py.
+#
+# Blob layout, per session:
+#   <sid>/manifest      pickled {'versions': [entry, ...], 'lazy': bool, 'plan': [step, ...],
+#                       'last_used': wall-clock time any worker last used the session}
+#   <sid>/<vid>/index   the version's row index, Arrow IPC
+#   <sid>/<vid>/<n>     column n of the version, Arrow IPC, one column per file
+# Each manifest entry lists the version's columns as (name, blob key) pairs.
+# Columns a step did not change keep pointing at the parent's blobs, so, like
+# the in-memory store, a version only writes what it changed.
+# Manifests and steps are pickled: the store must only be reachable by the
+# workers themselves.
+SESSION_BACKEND = os.environ.get('DATAPREPPER_SESSION_BACKEND', 'memory')
+SESSION_DIR = os.environ.get('DATAPREPPER_SESSION_DIR', '')
+KV_URL = os.environ.get('DATAPREPPER_KV_URL', 'local://')
+# Seconds a KV session lock outlives its worker (guards against dead workers);
+# a live holder renews it every third of that
+LOCK_TIMEOUT = float(os.environ.get('DATAPREPPER_LOCK_TIMEOUT', 60))
+
+def _to_ipc(table):
+    import pyarrow as pa
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def _series_table(series):
+    import pyarrow as pa
+    # Column names live in the manifest; the file holds a single 'values' field
+    frame, _ = densify(pd.DataFrame({'values': series.reset_index(drop=True)}))
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+def _index_table(index):
+    import pyarrow as pa
+    return pa.Table.from_pandas(pd.DataFrame(index=index), preserve_index=True)
+
+class InProcessBackend:
+    """Nothing is shared: sessions live only in this worker's memory."""
+
+    shared = False
+
+    def read_manifest(self, session_id):
+        return None
+
+    def lock(self, session_id):
+        return _NoLock()
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class SharedBackend(ABC):
+    """Session versions kept in a blob store shared by every worker."""
+
+    shared = True
+
+    @abstractmethod
+    def get(self, key):
+        """The blob stored under `key`, or None."""
+
+    @abstractmethod
+    def put(self, key, blob):
+        """Store `blob` under `key`, replacing any previous value."""
+
+    @abstractmethod
+    def read_table(self, key):
+        """The Arrow table stored under `key`."""
+
+    @abstractmethod
+    def delete_prefix(self, prefix):
+        """Delete every blob whose key starts with `prefix`."""
+
+    @abstractmethod
+    def lock(self, session_id):
+        """A context manager excluding every other worker from the session."""
+
+    @abstractmethod
+    def session_ids(self):
+        """Every session with a manifest in the store."""
+
+    def read_manifest(self, session_id) -> Optional[Dict[str, Any]]:
+        blob = self.get(f"{session_id}/manifest")
+        return pickle.loads(blob) if blob is not None else None
+
+    def write_manifest(self, session_id, manifest):
+        self.put(f"{session_id}/manifest", pickle.dumps(manifest))
+
+    def write_version(self, session_id, version, parent_entry=None):
+        """Store a version's new columns and return its manifest entry."""
+        vid = version['id']
+        frame = version['frame']
+        shared = parent_entry is not None and version['changed'] is not None and version['index_shared']
+        index_key = parent_entry['index'] if shared else f"{session_id}/{vid}/index"
+        if not shared:
+            self.put(index_key, _to_ipc(_index_table(frame.index)))
+        parent_columns = dict(parent_entry['columns']) if shared else {}
+        columns = []
+        for n, col in enumerate(frame.columns):
+            if col in parent_columns and col not in version['changed']:
+                columns.append((col, parent_columns[col]))
+                continue
+            key = f"{session_id}/{vid}/{n}"
+            self.put(key, _to_ipc(_series_table(version['data'][col])))
+            columns.append((col, key))
+        # Arrow files hold sparse columns densified; the manifest remembers their fill values
+        sparse = densify(frame.iloc[:0])[1]
+        return {
+            'id': vid, 'index': index_key, 'columns': columns, 'sparse': sparse,
+            'changed': version['changed'], 'steps': version['steps'],
+        }
+
+    def read_version(self, entry):
+        """Rebuild a version's (data, frame) from its blobs."""
+        index = self.read_table(entry['index']).to_pandas().index
+        sparse = entry.get('sparse', {})
+        data = {}
+        for col, key in entry['columns']:
+            values = self.read_table(key).to_pandas()['values']
+            if col in sparse:
+                values = values.astype(pd.SparseDtype(values.dtype, sparse[col]))
+            values.index = index
+            data[col] = values.rename(col)
+        return data, pd.DataFrame(data, index=index, copy=False)
+
+    def drop_session(self, session_id):
+        self.delete_prefix(f"{session_id}/")
+
+    def drop_version(self, session_id, entry):
+        self.delete_prefix(f"{session_id}/{entry['id']}/")
+
+class DirectoryBackend(SharedBackend):
+    """Blobs as files under `root`; column files are memory-mapped when read."""
+
+    def __init__(self, root):
+        if not root:
+            raise ValueError("The directory session backend needs DATAPREPPER_SESSION_DIR.")
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, blob):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        temp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(blob)
+        os.replace(temp, path)
+
+    def read_table(self, key):
+        import pyarrow as pa
+        with pa.memory_map(self._path(key)) as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def delete_prefix(self, prefix):
+        import shutil
+        shutil.rmtree(self._path(prefix.rstrip('/')), ignore_errors=True)
+
+    def lock(self, session_id):
+        return _FileLock(os.path.join(self.root, f"{session_id}.lock"))
+
+    def session_ids(self):
+        return [name for name in os.listdir(self.root) if os.path.isfile(os.path.join(self.root, name, 'manifest'))]
+
+class _FileLock:
+    """Exclusive flock on a lock file; blocks until every other worker lets go."""
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        import fcntl
+        self.handle = open(self.path, 'a')
+        fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        import fcntl
+        fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+        self.handle = None
+        return False
+
+class KeyValueBackend(SharedBackend):
+    """Blobs as values in a key-value service."""
+
+    # Pickled set of session IDs, so expiry can find every session without SCAN
+    SESSIONS_KEY = '_sessions'
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def put(self, key, blob):
+        self.client.set(key, blob)
+        # Keep a per-session key list, so a session or version can be deleted without SCAN
+        keys_key = f"{key.split('/')[0]}/keys"
+        keys = set(pickle.loads(self.client.get(keys_key) or pickle.dumps(set())))
+        if key not in keys:
+            keys.add(key)
+            self.client.set(keys_key, pickle.dumps(keys))
+
+    def read_table(self, key):
+        import pyarrow as pa
+        return pa.ipc.open_file(pa.BufferReader(self.client.get(key))).read_all()
+
+    def delete_prefix(self, prefix):
+        keys_key = f"{prefix.split('/')[0]}/keys"
+        keys = set(pickle.loads(self.client.get(keys_key) or pickle.dumps(set())))
+        doomed = {key for key in keys if key.startswith(prefix)}
+        for key in doomed:
+            self.client.delete(key)
+        if keys - doomed:
+            self.client.set(keys_key, pickle.dumps(keys - doomed))
+        else:
+            self.client.delete(keys_key)
+
+    def lock(self, session_id):
+        return _KeyLock(self.client, f"{session_id}/lock")
+
+    def write_manifest(self, session_id, manifest):
+        super().write_manifest(session_id, manifest)
+        if session_id not in self.session_ids():
+            self._update_sessions(lambda ids: ids | {session_id})
+
+    def drop_session(self, session_id):
+        super().drop_session(session_id)
+        self._update_sessions(lambda ids: ids - {session_id})
+
+    def session_ids(self):
+        blob = self.client.get(self.SESSIONS_KEY)
+        return pickle.loads(blob) if blob is not None else set()
+
+    def _update_sessions(self, change):
+        with _KeyLock(self.client, f"{self.SESSIONS_KEY}/lock"):
+            self.client.set(self.SESSIONS_KEY, pickle.dumps(change(self.session_ids())))
+
+class LockLost(Exception):
+    """Raised when a KV session lock expired or was taken over while held."""
+
+class _KeyLock:
+    """Lock held by setting a key only if absent, expiring after LOCK_TIMEOUT.
+
+    A heartbeat thread renews the expiry while the lock is held. Renewal and
+    release only touch the key while it still holds this lock's token; if the
+    token is gone (the worker stalled past the timeout), release raises
+    LockLost instead of returning as if nothing happened.
+    """
+
+    def __init__(self, client, key):
+        self.client = client
+        self.key = key
+        self.token = None
+        self._stop = None
+        self._lost = False
+
+    def __enter__(self):
+        token = uuid.uuid4().hex.encode()
+        ttl = max(int(LOCK_TIMEOUT * 1000), 1)
+        while not self.client.set(self.key, token, nx=True, px=ttl):
+            time.sleep(0.01)
+        self.token = token
+        self._lost = False
+        self._stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(token, ttl, self._stop), daemon=True).start()
+        return self
+
+    def _heartbeat(self, token, ttl, stop):
+        while not stop.wait(ttl / 3000):
+            if not self.client.expire_if(self.key, token, ttl):
+                self._lost = True
+                return
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        released = self.client.delete_if(self.key, self.token)
+        self.token = None
+        if (self._lost or not released) and exc[0] is None:
+            raise LockLost(f"Lost the lock {self.key} while holding it; another worker may have changed the session.")
+        return False
+
+class LocalKV:
+    """In-process stand-in for the key-value client KeyValueBackend uses."""
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._guard = threading.Lock()
+
+    def _live(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires < time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def get(self, key):
+        with self._guard:
+            return self._data[key] if self._live(key) else None
+
+    def set(self, key, value, nx=False, px=None):
+        with self._guard:
+            if nx and self._live(key):
+                return None
+            self._data[key] = value
+            if px is not None:
+                self._expires[key] = time.monotonic() + px / 1000
+            else:
+                self._expires.pop(key, None)
+            return True
+
+    def delete(self, key):
+        with self._guard:
+            self._expires.pop(key, None)
+            return 1 if self._data.pop(key, None) is not None else 0
+
+    def delete_if(self, key, token):
+        """Delete `key` only while it holds `token`."""
+        with self._guard:
+            if not self._live(key) or self._data[key] != token:
+                return 0
+            self._expires.pop(key, None)
+            del self._data[key]
+            return 1
+
+    def expire_if(self, key, token, px):
+        """Reset `key`'s expiry to `px` milliseconds only while it holds `token`."""
+        with self._guard:
+            if not self._live(key) or self._data[key] != token:
+                return 0
+            self._expires[key] = time.monotonic() + px / 1000
+            return 1
+
+# Compare-and-delete/expire must be atomic, or a release could remove a lock
+# another worker acquired between the check and the delete
+_DELETE_IF = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+_EXPIRE_IF = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+
+class RedisKV:
+    """A redis-py client with delete_if/expire_if run as Lua scripts."""
+
+    def __init__(self, client):
+        self.client = client
+        self.get = client.get
+        self.set = client.set
+        self.delete = client.delete
+        self._delete_if = client.register_script(_DELETE_IF)
+        self._expire_if = client.register_script(_EXPIRE_IF)
+
+    def delete_if(self, key, token):
+        return self._delete_if(keys=[key], args=[token])
+
+    def expire_if(self, key, token, px):
+        return self._expire_if(keys=[key], args=[token, px])
+
+def _kv_client(url):
+    if url.startswith('local://'):
+        return LocalKV()
+    try:
+        import redis
+    except ImportError:
+        raise ValueError("The kv session backend needs the redis package for URL " + url)
+    return RedisKV(redis.Redis.from_url(url))
+
+def make_backend(name=None):
+    name = name or SESSION_BACKEND
+    if name == 'memory':
+        return InProcessBackend()
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ValueError(f"The {name} session backend requires pyarrow to be installed.")
+    if name == 'directory':
+        return DirectoryBackend(SESSION_DIR)
+    if name == 'kv':
+        return KeyValueBackend(_kv_client(KV_URL))
+    raise ValueError(f"Unknown session backend: {name}")
@@ -0,0 +1,319 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Iterator
+
+from .dedupe import FingerprintSet, first_occurrences, duplicate_report
+from .profiling import profile_columns
+from .sketches import sketch_columns
+from .store import SESSION_TTL
+from .transforms import densify, validate_step, needs_fit, new_fit_state, partial_fit, finish_fit, apply_step
+
+# Out-of-core sessions for files larger than memory. The upload is converted
+# once to a Parquet spill file, and every transformation streams the previous
+# version's spill chunk by chunk into a new spill, so no step ever holds more
+# than one chunk (plus, for two-pass steps, the fitted parameters) in memory.
+SPILL_DIR = os.environ.get('DATAPREPPER_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'dataprepper'))
+CHUNK_ROWS = int(os.environ.get('DATAPREPPER_CHUNK_ROWS', 250_000))
+
+# dedupe streams too: the fingerprints of earlier rows carry over from chunk to chunk (see dedupe.py)
+CHUNKED_ACTIONS = ('drop', 'impute', 'encode', 'scale', 'filter', 'rename', 'dtype', 'dedupe')
+
+# session_id -> {'dir': spill directory, 'chunk_rows': int, 'lock': RLock,
+#                'last_used': monotonic time, 'versions': [{'path', 'rows', 'columns', 'stats'}, ...]}
+# Spill files are read under the session lock (or opened under it: undo and
+# expiry delete files, but a file already open stays readable). Sessions idle
+# for longer than store.SESSION_TTL are dropped with their spills.
+chunked_sessions: Dict[str, Dict[str, Any]] = {}
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ValueError("Chunked mode requires pyarrow to be installed.")
+
+def is_chunked(session_id):
+    return session_id is not None and session_id in chunked_sessions
+
+def _session(session_id):
+    session = chunked_sessions.get(session_id)
+    if session is None:
+        raise ValueError(f"Unknown session ID: {session_id}")
+    session['last_used'] = time.monotonic()
+    return session
+
+def current_spill(session_id):
+    return _session(session_id)['versions'][-1]
+
+def _sniff_dtypes(file, chunk_rows):
+    """Column dtypes for reading every chunk the same way.
+
+    Numeric columns are read as float64 so a chunk with missing values cannot
+    change an integer column's type; everything else is read as text.
+    """
+    start = file.tell()
+    sample = pd.read_csv(file, nrows=min(chunk_rows, 10_000))
+    file.seek(start)
+    return {
+        col: 'float64' if pd.api.types.is_numeric_dtype(sample[col]) and not pd.api.types.is_bool_dtype(sample[col]) else str
+        for col in sample.columns
+    }
+
+def write_spill(path, chunks: Iterator[pd.DataFrame]):
+    """Write DataFrame chunks to one Parquet file; returns (rows, columns)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    schema = None
+    rows = 0
+    columns = []
+    try:
+        for chunk in chunks:
+            # Parquet has no sparse columns
+            chunk = densify(chunk)[0]
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(path, schema)
+                columns = chunk.columns.tolist()
+            if len(chunk) == 0:
+                continue
+            try:
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise ValueError(f"Chunk at row {rows} does not match the types of earlier chunks: {e}")
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows, columns
+
+def iter_spill(path, columns=None, chunk_rows=CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield a spill file as DataFrames of at most `chunk_rows` rows (at least one, possibly empty)."""
+    import pyarrow.parquet as pq
+    return _batches(pq.ParquetFile(path), columns, chunk_rows)
+
+def _batches(spill, columns, chunk_rows):
+    if spill.metadata.num_rows == 0:
+        table = spill.schema_arrow.empty_table()
+        yield (table.select(columns) if columns else table).to_pandas()
+        return
+    for batch in spill.iter_batches(batch_size=chunk_rows, columns=columns):
+        yield batch.to_pandas()
+
+def iter_chunks(session_id, columns=None) -> Iterator[pd.DataFrame]:
+    session = _session(session_id)
+    with session['lock']:
+        return iter_spill(session['versions'][-1]['path'], columns, session['chunk_rows'])
+
+def open_spill(session_id):
+    """The current spill file, opened for reading under the session lock."""
+    session = _session(session_id)
+    with session['lock']:
+        return open(session['versions'][-1]['path'], 'rb')
+
+def expire_chunked_sessions(keep=None):
+    """Drop chunked sessions idle for longer than SESSION_TTL; busy ones are skipped."""
+    if not SESSION_TTL:
+        return
+    now = time.monotonic()
+    idle = [sid for sid, session in list(chunked_sessions.items()) if sid != keep and now - session['last_used'] > SESSION_TTL]
+    for sid in idle:
+        session = chunked_sessions.get(sid)
+        if session is not None and session['lock'].acquire(blocking=False):
+            try:
+                drop_chunked_session(sid)
+            finally:
+                session['lock'].release()
+
+def create_chunked_session(file, chunk_rows=None):
+    """Convert an uploaded CSV to a Parquet spill without loading it whole."""
+    _require_pyarrow()
+    expire_chunked_sessions()
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    if chunk_rows <= 0:
+        raise ValueError("chunk_rows must be positive.")
+    session_id = uuid.uuid4().hex
+    directory = os.path.join(SPILL_DIR, session_id)
+    os.makedirs(directory, exist_ok=True)
+    began = time.perf_counter()
+    try:
+        dtypes = _sniff_dtypes(file, chunk_rows)
+        path = os.path.join(directory, 'v0.parquet')
+        rows, columns = write_spill(path, pd.read_csv(file, dtype=dtypes, chunksize=chunk_rows))
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    chunked_sessions[session_id] = {
+        'dir': directory,
+        'chunk_rows': chunk_rows,
+        'lock': threading.RLock(),
+        'last_used': time.monotonic(),
+        'versions': [{'path': path, 'rows': rows, 'columns': columns, 'stats': {}}],
+    }
+    report = {
+        'rows': rows,
+        'columns': len(columns),
+        'chunk_rows': chunk_rows,
+        'parse_seconds': time.perf_counter() - began,
+        'spill_bytes': os.path.getsize(path),
+    }
+    return session_id, report
+
+def _step_columns(action, columns, params):
+    if action == 'rename':
+        return list(params.get('rename_map', {}))
+    if action == 'dtype':
+        return list(params.get('dtype_map', {}))
+    return columns
+
+def apply_chunked(session_id, action, columns, params, fitted=None):
+    """Stream the current spill through one step into a new spill version.
+
+    With `fitted` (saved parameters, see recipes.py) the fitting pass is skipped.
+    """
+    validate_step(action, columns, params)
+    if action not in CHUNKED_ACTIONS:
+        raise ValueError(f"Action '{action}' is not supported in chunked mode.")
+    expire_chunked_sessions(keep=session_id)
+    session = _session(session_id)
+    with session['lock']:
+        source = session['versions'][-1]
+        unknown = [col for col in _step_columns(action, columns, params) if col not in source['columns']]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+        if fitted is None and needs_fit(action, params):
+            # First pass reads only the step's columns
+            state = new_fit_state(action, columns, params)
+            for chunk in iter_spill(source['path'], columns, session['chunk_rows']):
+                partial_fit(state, action, columns, params, chunk)
+            fitted = finish_fit(state, action, columns, params)
+        fitted = fitted or {}
+        path = os.path.join(session['dir'], f"v{len(session['versions'])}.parquet")
+        if action == 'dedupe':
+            seen = FingerprintSet()
+            subset = columns or source['columns']
+            chunks = (
+                chunk[first_occurrences(chunk[subset], seen)]
+                for chunk in iter_spill(source['path'], chunk_rows=session['chunk_rows'])
+            )
+        else:
+            chunks = (
+                apply_step(chunk, action, columns, params, fitted)[0]
+                for chunk in iter_spill(source['path'], chunk_rows=session['chunk_rows'])
+            )
+        try:
+            rows, out_columns = write_spill(path, chunks)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        session['versions'].append({'path': path, 'rows': rows, 'columns': out_columns, 'stats': {}})
+        return len(session['versions']) > 1
+
+def _rows_at(path, columns, positions, chunk_rows):
+    """The spill's rows at `positions`, in that order, reading no further than the last of them."""
+    wanted = np.asarray(positions, dtype=np.int64)
+    order = np.unique(wanted)
+    parts, start = [], 0
+    for chunk in iter_spill(path, columns, chunk_rows):
+        inside = order[(order >= start) & (order < start + len(chunk))]
+        parts.append(chunk.iloc[inside - start])
+        start += len(chunk)
+        if not len(order) or start > order[-1]:
+            break
+    found = pd.concat(parts, ignore_index=True)
+    return found.iloc[np.searchsorted(order, wanted)].reset_index(drop=True)
+
+def duplicates_chunked(session_id, subset=None, rows=5):
+    """Dedupe the current spill without writing it: returns (first `rows` kept rows, duplicate report).
+
+    One pass reads only the subset columns; the preview rows and the top
+    groups' values are then read by position.
+    """
+    session = _session(session_id)
+    with session['lock']:
+        source = session['versions'][-1]
+        subset = list(subset) if subset else source['columns']
+        unknown = [col for col in subset if col not in source['columns']]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}")
+        seen = FingerprintSet(track=True)
+        kept = []
+        for chunk in iter_spill(source['path'], subset, session['chunk_rows']):
+            start = seen.rows
+            keep = first_occurrences(chunk, seen)
+            if len(kept) < rows:
+                kept.extend((start + np.flatnonzero(keep)[:rows - len(kept)]).tolist())
+        window = _rows_at(source['path'], None, kept, session['chunk_rows'])
+        representatives = _rows_at(source['path'], subset, [first for first, _ in seen.top_groups()], session['chunk_rows'])
+    return window, duplicate_report(seen, subset, representatives)
+
+def undo_chunked(session_id):
+    session = _session(session_id)
+    with session['lock']:
+        if len(session['versions']) <= 1:
+            raise ValueError("No history to undo.")
+        version = session['versions'].pop()
+        os.remove(version['path'])
+        return len(session['versions']) > 1
+
+def page_chunked(session_id, offset, limit, columns=None):
+    """Read rows [offset, offset + limit) touching only the row groups that hold them."""
+    import pyarrow.parquet as pq
+    session = _session(session_id)
+    with session['lock']:
+        version = session['versions'][-1]
+        spill = pq.ParquetFile(version['path'])
+        groups, first_row, seen = [], None, 0
+        for i in range(spill.metadata.num_row_groups):
+            n = spill.metadata.row_group(i).num_rows
+            if seen + n > offset and seen < offset + limit:
+                if first_row is None:
+                    first_row = seen
+                groups.append(i)
+            seen += n
+        if not groups:
+            table = spill.schema_arrow.empty_table()
+            window = (table.select(columns) if columns else table).to_pandas()
+        else:
+            window = spill.read_row_groups(groups, columns=columns).to_pandas()
+            window = window.iloc[offset - first_row:offset - first_row + limit]
+        return window, version['rows']
+
+def column_stats_chunked(session_id, approximate=False):
+    """Profile the current spill one column at a time, caching per version.
+
+    With `approximate`, every column is sketched in one streaming pass over the
+    spill instead, so no column is ever loaded whole.
+    """
+    import pyarrow.parquet as pq
+    session = _session(session_id)
+    with session['lock']:
+        version = session['versions'][-1]
+        if approximate:
+            sketches = version.setdefault('sketches', {})
+            missing = [col for col in version['columns'] if col not in sketches]
+            if missing:
+                partial = {}
+                for chunk in iter_spill(version['path'], missing, session['chunk_rows']):
+                    sketch_columns(chunk, missing, partial)
+                sketches.update(partial)
+            return {col: sketches[col].stats() for col in version['columns']}
+        spill = pq.ParquetFile(version['path'])
+        for col in version['columns']:
+            if col not in version['stats']:
+                frame = spill.read(columns=[col]).to_pandas()
+                version['stats'].update(profile_columns(frame, [col]))
+        return {col: version['stats'][col] for col in version['columns']}
+
+def drop_chunked_session(session_id):
+    session = chunked_sessions.pop(session_id, None)
+    if session is not None:
+        shutil.rmtree(session['dir'], ignore_errors=True)
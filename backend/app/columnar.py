@@ -0,0 +1,94 @@
+from typing import Dict, Any, Optional
+
+import pandas as pd
+
+from .transforms import densify
+from .metrics import stage
+
+# Columnar binary responses. A client that sends
+#   Accept: application/vnd.apache.arrow.stream
+# to /preview, /page or /column_stats gets an Arrow IPC stream instead of JSON:
+# column buffers go from the frame to the wire without building a Python object
+# per cell, and nothing is validated cell by cell. JSON stays the default, and
+# is also what clients get when pyarrow is not installed.
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+def _media_ranges(accept):
+    """(media type, q) for each entry of an Accept header."""
+    for part in (accept or '').split(','):
+        media_type, *params = [piece.strip() for piece in part.split(';')]
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        yield media_type.lower(), q
+
+def _quality(ranges, media_type):
+    """q the Accept ranges give `media_type`, the most specific range winning."""
+    family = media_type.split('/')[0] + '/*'
+    for candidate in (media_type, family, '*/*'):
+        matches = [q for name, q in ranges if name == candidate]
+        if matches:
+            return max(matches)
+    return 0.0
+
+def wants_arrow(accept: Optional[str]) -> bool:
+    """Whether an Accept header prefers Arrow IPC over JSON (ties go to JSON)."""
+    ranges = list(_media_ranges(accept))
+    arrow = _quality(ranges, ARROW_STREAM)
+    if arrow <= 0:
+        return False
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return arrow > _quality(ranges, 'application/json')
+
+def _arrow_table(frame):
+    import pyarrow as pa
+    frame, _ = densify(frame)
+    try:
+        return pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Object columns mixing types: send the mixed ones as text
+        arrays = []
+        for col in frame.columns:
+            try:
+                arrays.append(pa.Array.from_pandas(frame[col]))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                arrays.append(pa.Array.from_pandas(frame[col].astype(str).where(frame[col].notna())))
+        return pa.Table.from_arrays(arrays, names=[str(col) for col in frame.columns])
+
+def _ipc(table, metadata=None):
+    import pyarrow as pa
+    if metadata:
+        table = table.replace_schema_metadata({key: str(value) for key, value in metadata.items()})
+    with stage('serialize'):
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+def frame_to_arrow(frame: pd.DataFrame, metadata: Optional[Dict[str, Any]] = None) -> bytes:
+    """`frame` as an Arrow IPC stream; `metadata` goes into the schema's key/value metadata."""
+    return _ipc(_arrow_table(frame), metadata)
+
+def stats_to_arrow(stats: Dict[str, Dict[str, Any]]) -> bytes:
+    """Column stats as an Arrow IPC stream, one row per profiled column.
+
+    Scalars (count, mean, top, ...) are plain columns; histograms, value counts
+    and data issues are struct and list columns. Fields a column's profile
+    lacks are null.
+    """
+    import pyarrow as pa
+    rows = [dict(stats_row, column=col) for col, stats_row in stats.items()]
+    # Inferred from every row, so numeric-only fields exist even if the first column is text
+    table = pa.Table.from_struct_array(pa.array(rows)) if rows else pa.table({'column': pa.array([], pa.string())})
+    order = ['column'] + [name for name in table.column_names if name != 'column']
+    return _ipc(table.select(order))
@@ -1,104 +1,226 @@
+import numpy as np
 import pandas as pd
 from typing import Tuple, List, Any, Dict
 from io import TextIOBase, BufferedReader
 import uuid
-import hashlib
-import time
-
-dropped_columns_cache: Dict[str, Dict[str, list]] = {}
-# Session history: session_id -> list of DataFrame CSV strings (stack)
-session_history = {}
-
-# Helper to serialize DataFrame to CSV string
-def df_to_csv_str(df):
-    from io import StringIO
-    buf = StringIO()
-    df.to_csv(buf, index=False)
-    return buf.getvalue()
-
-# Helper to load DataFrame from CSV string
-def df_from_csv_str(csv_str):
-    from io import StringIO
-    return pd.read_csv(StringIO(csv_str))
-
-def preview_csv(file: BufferedReader, rows: int) -> Tuple[List[str], List[List[Any]]]:
-    """Read first `rows` lines from CSV file-like and return columns and row data."""
-    # pandas can read file-like objects directly
-    df = pd.read_csv(file, nrows=rows)
-    columns = df.columns.tolist()
-    data = df.values.tolist()
-    return columns, data
+import os
+from collections import OrderedDict
+from .columnar import frame_to_arrow, stats_to_arrow
+from .serialize import rows_json
+from .chunked import is_chunked, create_chunked_session, apply_chunked, duplicates_chunked, undo_chunked, page_chunked, column_stats_chunked, iter_chunks, open_spill
+from .export import EXPORT_CHUNK_ROWS, EXPORT_FORMATS, iter_export, iter_csv_frames, iter_file
+from .datasets import content_hash, parse_dataset
+from .dedupe import FingerprintSet, first_occurrences, duplicate_report
+from .dtypes import cast_series
+from .ingest import read_csv
+from .metrics import stage, cache_lookup
+from .profiling import profile_columns
+from .sketches import sketch_columns
+from .recipes import parse_recipe, recipe_steps, fitted_step, fitted_specs, save_recipe, get_recipe
+from .transforms import apply_step, make_step, validate_step, cached_fit, progress_units
+from .pipeline import preview_plan, run_plan
+from .predicates import parse_predicate, legacy_predicate, select_rows
+from .store import put_dataset, has_dataset, get_current, current_version, push_version, pop_version, history_depth, session_lock, is_lazy, pending_steps
 
-def impute_missing(file, columns, method, value=None, rows=5):
-    import pandas as pd
-    import numpy as np
-    df = pd.read_csv(file)
-    for col in columns:
-        if method == 'mean':
-            df[col] = df[col].fillna(df[col].mean())
-        elif method == 'median':
-            df[col] = df[col].fillna(df[col].median())
-        elif method == 'mode':
-            df[col] = df[col].fillna(df[col].mode()[0])
-        elif method == 'constant':
-            df[col] = df[col].fillna(value)
-        else:
-            raise ValueError(f"Unknown imputation method: {method}")
-    df = df.replace([np.nan, np.inf, -np.inf], None)
+# Columns removed by /drop_columns_with_cache, kept for /restore_dropped_columns.
+# Oldest operations are forgotten first once the cache is full.
+DROPPED_CACHE_ENTRIES = int(os.environ.get('DATAPREPPER_DROPPED_CACHE_ENTRIES', 64))
+dropped_columns_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# Use the session's cached frame when there is one, otherwise parse the upload
+def load_frame(file=None, session_id=None):
+    if is_chunked(session_id):
+        raise ValueError("Chunked sessions are only transformed through /apply_transformation.")
+    cached = has_dataset(session_id)
+    cache_lookup('session', cached)
+    if cached:
+        materialize(session_id)
+        return get_current(session_id)
+    return _parsed(file)['frame'].copy(deep=False)
+
+# Parse cache entry for an upload (see datasets.py)
+def _parsed(file):
+    if file is None:
+        raise ValueError("Either a file or a known session_id is required.")
+    return parse_dataset(file)[0]
+
+# Adapt a progress(done, total, label) callback (see jobs.py) to one call per finished unit
+def _counter(progress, total):
+    if progress is None:
+        return None
+    done = 0
+    progress(0, total, None)
+
+    def tick(label):
+        nonlocal done
+        done += 1
+        progress(done, total, label)
+    return tick
+
+# Run steps over the session's current version, letting filters use its cached indexes
+def run_on_current(session_id, steps, progress=None):
+    version = current_version(session_id)
+    with stage('transform') as frame_bytes:
+        tick = _counter(progress, progress_units(steps))
+        df, changed = run_plan(version['frame'].copy(deep=False), steps, indexes=version['indexes'], progress=tick, fits=version['fits'])
+        frame_bytes(df.memory_usage(index=False).sum())
+    return df, changed
+
+# Run a lazy session's pending steps as one fused pass and record them as one version
+def materialize(session_id):
+    with session_lock(session_id):
+        steps = pending_steps(session_id)
+        if steps:
+            df, changed = run_on_current(session_id, steps)
+            push_version(session_id, df, changed, steps=list(steps))
+            steps.clear()
+
+# Current rows of a session, including a lazy session's pending steps
+def session_head(session_id, rows):
+    with session_lock(session_id):
+        steps = pending_steps(session_id)
+        if steps:
+            with stage('transform'):
+                return preview_plan(get_current(session_id), steps, rows, current_version(session_id)['fits'])
+        return get_current(session_id).head(rows)
+
+# Columns and pre-rendered JSON rows (NaN/inf/-inf become null) for the first `rows` rows
+def preview_frame(df, rows):
     preview = df.head(rows)
-    return preview.columns.tolist(), preview.values.tolist()
+    return preview.columns.tolist(), rows_json(preview)
 
-def encode_categorical(file, columns, method, rows=5):
-    import pandas as pd
-    import numpy as np
-    df = pd.read_csv(file)
-    if method == 'onehot':
-        df = pd.get_dummies(df, columns=columns)
-    elif method == 'ordinal':
-        for col in columns:
-            df[col] = df[col].astype('category').cat.codes
+def preview_window(file, rows: int, session_id=None):
+    """First `rows` rows of the session (or of a CSV file-like) as a frame."""
+    if is_chunked(session_id):
+        return page_chunked(session_id, 0, rows)[0]
+    if has_dataset(session_id):
+        return session_head(session_id, rows)
+    # pandas can read file-like objects directly
+    with stage('parse'):
+        return read_csv(file, nrows=rows)
+
+def preview_csv(file: BufferedReader, rows: int, session_id=None) -> Tuple[List[str], List[List[Any]]]:
+    """Read first `rows` lines from CSV file-like and return columns and row data."""
+    return preview_frame(preview_window(file, rows, session_id), rows)
+
+def _sort_order(df, column, ascending, version=None):
+    """Row positions of `df` ordered by `column` (missing values last), cached on the version."""
+    key = (column, ascending)
+    if version is not None and key in version['sorted']:
+        return version['sorted'][key]
+    keys = df[column].reset_index(drop=True)
+    order = keys.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+    if version is not None:
+        version['sorted'][key] = order
+    return order
+
+def page_window(file, offset=0, limit=100, columns=None, sort_by=None, ascending=True, session_id=None):
+    """Return (window frame, total rows); only the window's rows are copied."""
+    if offset < 0 or limit < 0:
+        raise ValueError("offset and limit must be non-negative.")
+    if is_chunked(session_id):
+        if sort_by is not None:
+            raise ValueError("Sorting is not supported for chunked sessions.")
+        return page_chunked(session_id, offset, limit, columns)
+    if has_dataset(session_id):
+        materialize(session_id)
+    version = current_version(session_id) if has_dataset(session_id) else None
+    df = version['frame'] if version is not None else load_frame(file, session_id)
+    if columns:
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Unknown columns: {missing}")
+    if sort_by is not None:
+        if sort_by not in df.columns:
+            raise ValueError(f"Unknown sort column: {sort_by}")
+        positions = _sort_order(df, sort_by, ascending, version)[offset:offset + limit]
+        window = df.iloc[positions]
     else:
-        raise ValueError(f"Unknown encoding method: {method}")
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    preview = df.head(rows)
-    return preview.columns.tolist(), preview.values.tolist()
+        window = df.iloc[offset:offset + limit]
+    if columns:
+        window = window[columns]
+    return window, len(df)
 
-def scale_numeric(file, columns, method, rows=5):
-    import pandas as pd
-    import numpy as np
-    from sklearn.preprocessing import MinMaxScaler, StandardScaler
-    df = pd.read_csv(file)
-    scaler = MinMaxScaler() if method == 'minmax' else StandardScaler()
-    df[columns] = scaler.fit_transform(df[columns])
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    preview = df.head(rows)
-    return preview.columns.tolist(), preview.values.tolist()
+def page_rows(file, offset=0, limit=100, columns=None, sort_by=None, ascending=True, session_id=None):
+    """Return one window of rows, rendered as JSON; only the window is copied."""
+    window, total_rows = page_window(file, offset, limit, columns, sort_by, ascending, session_id)
+    return window.columns.tolist(), rows_json(window), total_rows
+
+# Arrow IPC bodies for clients that ask for them (see columnar.py)
+def preview_arrow(file, rows, session_id=None):
+    return frame_to_arrow(preview_window(file, rows, session_id).head(rows))
+
+def page_arrow(file, offset=0, limit=100, columns=None, sort_by=None, ascending=True, session_id=None):
+    window, total_rows = page_window(file, offset, limit, columns, sort_by, ascending, session_id)
+    return frame_to_arrow(window, {'offset': offset, 'limit': limit, 'total_rows': total_rows})
+
+def column_stats_arrow(file, session_id=None, approximate=False):
+    return stats_to_arrow(get_column_stats(file, session_id=session_id, approximate=approximate))
+
+def export_dataset(session_id, fmt='csv', chunk_rows=EXPORT_CHUNK_ROWS):
+    """Return (media type, filename, byte chunks) for streaming the session's current version."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if chunk_rows <= 0:
+        raise ValueError("chunk_rows must be positive.")
+    media_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"processed_data.{extension}"
+    if is_chunked(session_id):
+        # The spill already is a Parquet file; CSV is re-encoded one chunk at a time
+        if fmt == 'parquet':
+            return media_type, filename, iter_file(open_spill(session_id))
+        return media_type, filename, iter_csv_frames(iter_chunks(session_id), compress=fmt == 'csv.gz')
+    materialize(session_id)
+    df = current_version(session_id)['frame']
+    return media_type, filename, iter_export(df, fmt, chunk_rows)
 
-def drop_columns(file, columns, rows=5):
+# Preview of one step. Fill values, scaler ranges and category vocabularies
+# are fitted over every row once per version and column (the version's fit
+# cache, see transforms.cached_fit); only the preview rows are transformed.
+def _preview_step(file, session_id, action, columns, params, rows):
+    validate_step(action, columns, params)
+    df = load_frame(file, session_id)
+    fits = current_version(session_id)['fits'] if has_dataset(session_id) else _parsed(file)['fits']
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise KeyError(f"{missing} not in index")
+    with stage('transform'):
+        fitted = cached_fit(fits, df, action, columns, params)
+        preview, _ = apply_step(df.head(rows), action, columns, params, fitted)
+    return preview_frame(preview, rows)
+
+def impute_missing(file, columns, method, value=None, rows=5, session_id=None):
+    return _preview_step(file, session_id, 'impute', columns, {'method': method, 'value': value}, rows)
+
+# `options` (sparse, max_categories, min_frequency, other_label) select the compact onehot encoder
+def encode_categorical(file, columns, method, rows=5, session_id=None, options=None):
+    params = {'method': method, **options} if options and method == 'onehot' else {'method': method}
+    return _preview_step(file, session_id, 'encode', columns, params, rows)
+
+def scale_numeric(file, columns, method, rows=5, session_id=None):
+    return _preview_step(file, session_id, 'scale', columns, {'method': method}, rows)
+
+def drop_columns(file, columns, rows=5, session_id=None):
     import pandas as pd
-    import numpy as np
-    df = pd.read_csv(file)
+    df = load_frame(file, session_id)
     df = df.drop(columns=columns)
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    preview = df.head(rows)
-    return preview.columns.tolist(), preview.values.tolist()
+    return preview_frame(df, rows)
 
-def drop_columns_with_cache(file, columns, rows=5):
+def drop_columns_with_cache(file, columns, rows=5, session_id=None):
     import pandas as pd
-    import numpy as np
-    df = pd.read_csv(file)
-    dropped = {col: df[col].tolist() for col in columns if col in df.columns}
+    df = load_frame(file, session_id)
+    # The column arrays themselves (shared with the frame, not copied to lists)
+    dropped = {col: df[col].array for col in columns if col in df.columns}
     df = df.drop(columns=columns)
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    preview = df.head(rows)
     op_id = str(uuid.uuid4())
     dropped_columns_cache[op_id] = dropped
-    return preview.columns.tolist(), preview.values.tolist(), op_id
+    while len(dropped_columns_cache) > DROPPED_CACHE_ENTRIES:
+        dropped_columns_cache.popitem(last=False)
+    return (*preview_frame(df, rows), op_id)
 
-def restore_dropped_columns(file, op_id, rows=5):
+def restore_dropped_columns(file, op_id, rows=5, session_id=None):
     import pandas as pd
-    import numpy as np
-    df = pd.read_csv(file)
+    df = load_frame(file, session_id)
     dropped = dropped_columns_cache.get(op_id)
     if not dropped:
         raise ValueError("No dropped columns found for this operation ID.")
@@ -111,218 +233,214 @@ def restore_dropped_columns(file, op_id, rows=5):
     for col in dropped:
         if col not in df.columns:
             df[col] = dropped[col]
-    # Convert NaN/inf/-inf to None for JSON serialization
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    preview = df.head(rows)
-    return preview.columns.tolist(), preview.values.tolist()
+    return preview_frame(df, rows)
 
-def filter_rows(file, column, value=None, min_value=None, max_value=None, regex=None, rows=5):
-    import pandas as pd
-    import numpy as np
-    df = pd.read_csv(file)
-    if value is not None:
-        df = df[df[column] == value]
-    if min_value is not None:
-        df = df[df[column] >= min_value]
-    if max_value is not None:
-        df = df[df[column] <= max_value]
-    if regex is not None:
-        df = df[df[column].astype(str).str.contains(regex, na=False)]
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    preview = df.head(rows)
-    return preview.columns.tolist(), preview.values.tolist()
+def filter_rows(file, column=None, value=None, min_value=None, max_value=None, regex=None, rows=5, session_id=None, where=None):
+    """Preview the rows kept by a `where` predicate, or by conditions on one column."""
+    if where is not None:
+        if any(param is not None for param in (value, min_value, max_value, regex)):
+            raise ValueError("Give either 'where' or value/min_value/max_value/regex, not both.")
+        predicate = parse_predicate(where)
+    elif column is not None:
+        predicate = legacy_predicate(column, {'value': value, 'min_value': min_value, 'max_value': max_value, 'regex': regex})
+    else:
+        raise ValueError("Either a column or a 'where' predicate is required.")
+    df = load_frame(file, session_id)
+    # Sessions keep the indexes between calls; an upload is scanned
+    indexes = current_version(session_id)['indexes'] if has_dataset(session_id) else None
+    kept = select_rows(predicate, {col: df[col] for col in df.columns}, len(df), indexes, set(df.columns))
+    return preview_frame(df.iloc[kept.to_positions()[:rows]], rows)
 
-def rename_columns(file, rename_map, rows=5):
+def rename_columns(file, rename_map, rows=5, session_id=None):
     import pandas as pd
-    import numpy as np
-    df = pd.read_csv(file)
+    df = load_frame(file, session_id)
     df = df.rename(columns=rename_map)
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    preview = df.head(rows)
-    return preview.columns.tolist(), preview.values.tolist()
+    return preview_frame(df, rows)
 
-def change_dtypes(file, dtype_map, rows=5):
-    import pandas as pd
-    import numpy as np
-    df = pd.read_csv(file)
+def change_dtypes(file, dtype_map, rows=5, session_id=None):
+    df = load_frame(file, session_id)
     for col, dtype in dtype_map.items():
-        if dtype == 'datetime':
-            df[col] = pd.to_datetime(df[col], errors='coerce')
-        else:
-            df[col] = df[col].astype(dtype, errors='ignore')
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    preview = df.head(rows)
-    return preview.columns.tolist(), preview.values.tolist()
+        df[col] = cast_series(df[col], dtype)
+    return preview_frame(df, rows)
 
-def drop_duplicates(file, subset=None, rows=5):
-    import pandas as pd
-    import numpy as np
-    df = pd.read_csv(file)
-    if subset:
-        df = df.drop_duplicates(subset=subset)
-    else:
-        df = df.drop_duplicates()
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    preview = df.head(rows)
-    return preview.columns.tolist(), preview.values.tolist()
-
-def generate_session_id(file):
-    file.seek(0)
-    content = file.read(1024 * 1024)
-    file.seek(0)
-    h = hashlib.sha256(content).hexdigest()
-    return f"{h}_{int(time.time())}"
-
-# On session creation, store the initial file state
-def create_session(file):
-    df = pd.read_csv(file)
-    file.seek(0)
-    session_id = generate_session_id(file)
-    session_history[session_id] = [df_to_csv_str(df)]
-    return session_id
-
-# Apply transformation to the latest DataFrame in history, push new state
-def apply_transformation(file, session_id, action, columns, params, rows=5):
-    import numpy as np
-    stack = session_history.setdefault(session_id, [])
-    if not stack:
-        # If stack is empty, initialize from file
-        df = pd.read_csv(file)
+# Preview without duplicate rows, plus duplicate statistics (see dedupe.py).
+# Only the subset columns are hashed; no deduplicated copy of the frame is made.
+def drop_duplicates(file, subset=None, rows=5, session_id=None):
+    if is_chunked(session_id):
+        window, report = duplicates_chunked(session_id, subset, rows)
+        return (*preview_frame(window, rows), report)
+    df = load_frame(file, session_id)
+    subset = list(subset) if subset else df.columns.tolist()
+    unknown = [col for col in subset if col not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+    seen = FingerprintSet(track=True)
+    with stage('transform'):
+        keep = first_occurrences(df[subset], seen)
+    representatives = df[subset].iloc[[first for first, _ in seen.top_groups()]]
+    return (*preview_frame(df.iloc[np.flatnonzero(keep)[:rows]], rows), duplicate_report(seen, subset, representatives))
+
+# Content hash of the whole upload plus a random suffix: sessions on the same
+# file share its parse, but each has its own history
+def generate_session_id(file, digest=None):
+    digest = digest or content_hash(file)
+    return f"{digest}_{uuid.uuid4().hex[:12]}"
+
+# On session creation, parse the upload once and cache the frame (or reuse the
+# parse of identical content). Chunked sessions convert the upload to an
+# on-disk spill instead of loading it.
+def create_session(file, chunked=False, lazy=False):
+    if chunked:
+        return create_chunked_session(file)
+    digest = content_hash(file)
+    session_id = generate_session_id(file, digest)
+    entry, report = parse_dataset(file, digest)
+    put_dataset(session_id, entry['frame'].copy(deep=False), lazy=lazy, stats=entry['stats'], sketches=entry['sketches'], fits=entry['fits'])
+    return session_id, report
+
+# Apply transformation to the session's current version, push the result.
+# `progress` (see jobs.py) follows the columns of an eager in-memory session's step.
+def apply_transformation(file, session_id, action, columns, params, rows=5, progress=None):
+    if is_chunked(session_id):
+        can_undo = apply_chunked(session_id, action, columns, params)
+        return (*preview_frame(page_chunked(session_id, 0, rows)[0], rows), can_undo)
+    with session_lock(session_id):
+        if not has_dataset(session_id):
+            # Session was not created through /create_session: adopt the upload
+            if file is None:
+                raise ValueError(f"Unknown session ID: {session_id}")
+            entry = _parsed(file)
+            put_dataset(session_id, entry['frame'].copy(deep=False), stats=entry['stats'], sketches=entry['sketches'], fits=entry['fits'])
+        if is_lazy(session_id):
+            # Record the step and compute just enough rows for the preview
+            steps = pending_steps(session_id)
+            steps.append(make_step(action, columns, params))
+            try:
+                with stage('transform'):
+                    preview = preview_plan(get_current(session_id), steps, rows, current_version(session_id)['fits'])
+            except Exception:
+                steps.pop()
+                raise
+            return (*preview_frame(preview, rows), True)
+        # Columns added or rewritten by this step; the rest are shared with the previous version
+        df, changed = run_on_current(session_id, [make_step(action, columns, params)], progress)
+        push_version(session_id, df, changed)
+        can_undo = history_depth(session_id) > 0
+        return (*preview_frame(df, rows), can_undo)
+
+# Run a whole recipe as one plan: one version (or one queued batch), one preview, optional stats.
+# With `save_fitted`, the recipe saved as `save_as` keeps this run's fitted parameters (see recipes.py).
+def apply_recipe(file, session_id, recipe=None, recipe_name=None, save_as=None, rows=5, include_stats=False, save_fitted=False):
+    if recipe is None and recipe_name is None:
+        raise ValueError("Either a recipe or a recipe_name is required.")
+    specs = parse_recipe(recipe) if recipe is not None else get_recipe(recipe_name)
+    if is_chunked(session_id):
+        if save_fitted:
+            raise ValueError("Fitted parameters cannot be saved from a chunked session.")
+        # Each step is its own streaming pass over the spill
+        for spec in specs:
+            can_undo = apply_chunked(session_id, spec['action'], spec['columns'], spec['params'], fitted_step(spec))
+        cols, data = preview_frame(page_chunked(session_id, 0, rows)[0], rows)
+        stats = column_stats_chunked(session_id) if include_stats else None
     else:
-        df = df_from_csv_str(stack[-1])
-    # ...existing transformation logic...
-    if action == 'drop':
-        df = df.drop(columns=columns)
-    elif action == 'impute':
-        method = params.get('method', 'mean')
-        value = params.get('value', None)
-        for col in columns:
-            if method == 'mean':
-                df[col] = df[col].fillna(df[col].mean())
-            elif method == 'median':
-                df[col] = df[col].fillna(df[col].median())
-            elif method == 'mode':
-                df[col] = df[col].fillna(df[col].mode()[0])
-            elif method == 'constant':
-                df[col] = df[col].fillna(value)
+        steps = recipe_steps(specs)
+        with session_lock(session_id):
+            if not has_dataset(session_id):
+                if file is None:
+                    raise ValueError(f"Unknown session ID: {session_id}")
+                entry = _parsed(file)
+                put_dataset(session_id, entry['frame'].copy(deep=False), stats=entry['stats'], sketches=entry['sketches'], fits=entry['fits'])
+            if is_lazy(session_id):
+                pending = pending_steps(session_id)
+                pending.extend(steps)
+                try:
+                    cols, data = preview_frame(preview_plan(get_current(session_id), pending, rows, current_version(session_id)['fits']), rows)
+                except Exception:
+                    del pending[len(pending) - len(steps):]
+                    raise
             else:
-                raise ValueError(f"Unknown imputation method: {method}")
-    # TODO: Add support for encode, scale, etc.
-    else:
-        raise ValueError(f"Unsupported action for history: {action}")
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    # Push new state to stack
-    stack.append(df_to_csv_str(df))
-    preview = df.head(rows)
-    can_undo = len(stack) > 0
-    return preview.columns.tolist(), preview.values.tolist(), can_undo
+                df, changed = run_on_current(session_id, steps)
+                push_version(session_id, df, changed, steps=steps)
+                cols, data = preview_frame(df, rows)
+            can_undo = history_depth(session_id) > 0
+        stats = get_column_stats(None, session_id) if include_stats else None
+        if save_fitted:
+            specs = fitted_specs(specs, steps)
+    if save_as:
+        save_recipe(save_as, specs)
+    return cols, data, can_undo, stats
 
-# Undo: pop the last state, return the previous one
+# Undo: drop the current version and return the previous one
 def undo_last_transformation(file, session_id, rows=5):
-    import numpy as np
-    stack = session_history.get(session_id, [])
-    if not stack or len(stack) == 0:
-        raise ValueError("No history to undo.")
-    stack.pop()  # Remove last state
-    if len(stack):
-        df = df_from_csv_str(stack[len(stack)-1])
-    else:
-        df = pd.read_csv(file)
-    df = df.replace([np.nan, np.inf, -np.inf], None)
-    preview = df.head(rows)
-    can_undo = len(stack) > 0
-    return preview.columns.tolist(), preview.values.tolist(), can_undo
-
-def get_column_stats(file, session_id=None):
-    import pandas as pd
-    import numpy as np
-    df = None
-    if session_id is not None and session_id in session_history and session_history[session_id]:
-        df = df_from_csv_str(session_history[session_id][-1])
-    else:
-        df = pd.read_csv(file)
-    stats = {}
-    n_rows = len(df)
-    for col in df.columns:
-        col_data = df[col]
-        col_stats = {
-            'count': int(col_data.count()),
-            'missing_pct': float(col_data.isnull().mean() * 100),
-            'unique': int(col_data.nunique()),
-        }
-        # Data issue scores
-        data_issues = {}
-        # Recommendations
-        recommendations = []
-        # Missingness
-        missingness = float(col_data.isnull().mean())
-        data_issues['missing'] = missingness  # 0-1
-        if missingness > 0.5:
-            recommendations.append('Consider dropping this column due to excessive missing data.')
-        elif 0.1 < missingness <= 0.5:
-            recommendations.append('Consider imputing missing values.')
-        # Constant value
-        if n_rows > 0:
-            value_counts = col_data.value_counts(dropna=False)
-            most_common_pct = float(value_counts.iloc[0] / n_rows) if not value_counts.empty else 0.0
+    if is_chunked(session_id):
+        can_undo = undo_chunked(session_id)
+        return (*preview_frame(page_chunked(session_id, 0, rows)[0], rows), can_undo)
+    with session_lock(session_id):
+        if history_depth(session_id) == 0:
+            raise ValueError("No history to undo.")
+        steps = pending_steps(session_id)
+        if steps:
+            steps.pop()
         else:
-            most_common_pct = 0.0
-        data_issues['constant'] = most_common_pct  # 0-1
-        if most_common_pct > 0.95:
-            recommendations.append('Consider dropping this column as it is nearly constant.')
-        # High cardinality
-        cardinality = float(col_data.nunique() / n_rows) if n_rows > 0 else 0.0
-        data_issues['high_cardinality'] = cardinality  # 0-1
-        if cardinality > 0.8:
-            recommendations.append('Consider dropping or encoding this column due to high cardinality.')
-        # Outlier risk (for numerics)
-        if pd.api.types.is_numeric_dtype(col_data):
-            col_stats.update({
-                'mean': float(col_data.mean()) if col_data.count() else None,
-                'median': float(col_data.median()) if col_data.count() else None,
-                'std': float(col_data.std()) if col_data.count() else None,
-                'min': float(col_data.min()) if col_data.count() else None,
-                'max': float(col_data.max()) if col_data.count() else None,
-            })
-            # Outlier risk: % of values > 3 std from mean
-            if col_data.count() > 0 and col_data.std() is not None and col_data.std() > 0:
-                outlier_mask = (np.abs(col_data - col_data.mean()) > 3 * col_data.std())
-                outlier_risk = float(outlier_mask.sum() / col_data.count())
-            else:
-                outlier_risk = 0.0
-            data_issues['outlier'] = outlier_risk  # 0-1
-            if outlier_risk > 0.1:
-                recommendations.append('Consider scaling or transforming this column due to high outlier risk.')
-            # Add histogram for numeric columns
-            try:
-                clean_col = col_data.dropna().astype(float)
-                if len(clean_col) > 0:
-                    hist_counts, hist_edges = np.histogram(clean_col, bins=20)
-                    col_stats['histogram'] = {
-                        'bin_edges': hist_edges.tolist(),
-                        'counts': hist_counts.tolist()
-                    }
+            fused = current_version(session_id)['steps']
+            pop_version(session_id)
+            if fused and len(fused) > 1:
+                # A fused version undoes one step at a time: the rest go back to
+                # the plan, or are rerun with their fitted values kept
+                if is_lazy(session_id):
+                    steps.extend(fused[:-1])
                 else:
-                    col_stats['histogram'] = {'bin_edges': [], 'counts': []}
-            except Exception:
-                col_stats['histogram'] = {'bin_edges': [], 'counts': []}
-        else:
-            top = col_data.mode().iloc[0] if not col_data.mode().empty else None
-            freq = int((col_data == top).sum()) if top is not None else 0
-            col_stats.update({
-                'top': str(top) if top is not None else None,
-                'freq': freq
-            })
-            data_issues['outlier'] = None  # Not applicable
-            # Add value counts for categorical columns (top 20)
-            try:
-                value_counts = col_data.value_counts(dropna=False).head(20)
-                col_stats['value_counts'] = [
-                    {'value': str(idx), 'count': int(cnt)} for idx, cnt in value_counts.items()
-                ]
-            except Exception:
-                col_stats['value_counts'] = []
-        col_stats['data_issues'] = data_issues
-        col_stats['recommendations'] = recommendations
-        stats[col] = col_stats
-    return stats
\ No newline at end of file
+                    df, changed = run_on_current(session_id, fused[:-1])
+                    push_version(session_id, df, changed, steps=fused[:-1])
+        can_undo = history_depth(session_id) > 0
+        return (*preview_frame(session_head(session_id, rows), rows), can_undo)
+
+# With `approximate`, stats come from mergeable sketches (see sketches.py) and carry error bounds.
+# `progress` (see jobs.py) follows the columns still to be profiled.
+def get_column_stats(file, session_id=None, approximate=False, progress=None):
+    if is_chunked(session_id):
+        return column_stats_chunked(session_id, approximate)
+    if not has_dataset(session_id):
+        # A bare upload: the parse cache entry holds stats like a version does
+        return _cached_stats(_parsed(file), approximate, progress)
+    materialize(session_id)
+    with session_lock(session_id):
+        return _cached_stats(current_version(session_id), approximate, progress)
+
+# Stats are cached per version and column; only columns the last steps touched are profiled
+def _cached_stats(version, approximate=False, progress=None):
+    columns = version['frame'].columns.tolist()
+    if approximate:
+        sketches = version['sketches']
+        missing = [col for col in columns if col not in sketches]
+        cache_lookup('sketches', True, len(columns) - len(missing))
+        cache_lookup('sketches', False, len(missing))
+        tick = _counter(progress, len(missing))
+        # The dict may be the parse cache's, shared with other sessions: sketches
+        # are built privately and only finished ones are published
+        building = {}
+
+        def finished(col):
+            sketches.setdefault(col, building.pop(col))
+            if tick:
+                tick(col)
+        with stage('stats'):
+            sketch_columns(version['frame'], missing, building, progress=finished)
+            return {col: sketches[col].stats() for col in columns}
+    cached = version['stats']
+    missing = [col for col in columns if col not in cached]
+    # Counted per column: a version's stats are reused column by column
+    cache_lookup('stats', True, len(columns) - len(missing))
+    cache_lookup('stats', False, len(missing))
+    if missing:
+        tick = _counter(progress, len(missing))
+
+        def finished(stats):
+            # Cached as each batch finishes, so an abandoned run keeps the columns it did
+            cached.update(stats)
+            for col in stats:
+                if tick:
+                    tick(col)
+        with stage('stats'):
+            profile_columns(version['frame'], missing, progress=finished)
+    return {col: cached[col] for col in columns}
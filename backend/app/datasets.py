@@ -0,0 +1,77 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from .dtypes import OPTIMIZE_DTYPES, optimize_frame
+from .ingest import read_csv_with_report
+from .metrics import stage, cache_lookup
+
+# Content-addressed parse cache. An upload is identified by a hash of all of
+# its bytes, so the same extract uploaded again (or opened in another session)
+# reuses the frame parsed the first time, along with any column stats and
+# sketches computed on it since. Frames are shared read-only: callers get
+# shallow copies, and copy-on-write keeps their edits out of the cache.
+PARSE_CACHE_BYTES = int(os.environ.get('DATAPREPPER_PARSE_CACHE_BYTES', 1024 ** 3))
+HASH_BLOCK_BYTES = 1024 * 1024
+
+# digest -> {'frame', 'report', 'stats', 'sketches', 'fits', 'nbytes'}, least recently used first
+parsed: "OrderedDict[str, dict]" = OrderedDict()
+_parsed_guard = threading.Lock()
+
+def content_hash(file) -> str:
+    """BLAKE2b digest of the whole file, read in blocks; leaves the file at its start."""
+    with stage('upload_read'):
+        file.seek(0)
+        digest = hashlib.blake2b(digest_size=20)
+        while True:
+            block = file.read(HASH_BLOCK_BYTES)
+            if not block:
+                break
+            digest.update(block if isinstance(block, bytes) else block.encode())
+        file.seek(0)
+        return digest.hexdigest()
+
+def _lookup(digest):
+    with _parsed_guard:
+        entry = parsed.get(digest)
+        if entry is not None:
+            parsed.move_to_end(digest)
+        return entry
+
+def _remember(digest, entry):
+    with _parsed_guard:
+        parsed[digest] = entry
+        total = sum(cached['nbytes'] for cached in parsed.values())
+        # Keep at least the newest entry, even if it alone is over budget
+        while total > PARSE_CACHE_BYTES and len(parsed) > 1:
+            _, evicted = parsed.popitem(last=False)
+            total -= evicted['nbytes']
+
+def parse_dataset(file, digest=None):
+    """Parse an upload, or reuse the cached parse of identical bytes.
+
+    Returns (cache entry, report). The entry's 'stats', 'sketches' and 'fits'
+    dicts are shared by every session opened on this content.
+    """
+    digest = digest or content_hash(file)
+    entry = _lookup(digest)
+    cache_lookup('parse', entry is not None)
+    if entry is not None:
+        return entry, dict(entry['report'], content_hash=digest, cached=True)
+    with stage('parse') as frame_bytes:
+        df, report = read_csv_with_report(file)
+        frame_bytes(report['memory_bytes'])
+    if OPTIMIZE_DTYPES:
+        with stage('optimize_dtypes') as frame_bytes:
+            df, report['dtypes'] = optimize_frame(df)
+            report['memory_bytes'] = int(df.memory_usage(deep=True).sum())
+            frame_bytes(report['memory_bytes'])
+    entry = {'frame': df, 'report': report, 'stats': {}, 'sketches': {}, 'fits': {}, 'nbytes': report['memory_bytes']}
+    if PARSE_CACHE_BYTES:
+        _remember(digest, entry)
+    return entry, dict(report, content_hash=digest, cached=False)
+
+def clear_parse_cache():
+    with _parsed_guard:
+        parsed.clear()
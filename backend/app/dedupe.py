@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+
+from .serialize import column_values
+
+# Duplicate detection on 64-bit row fingerprints. The subset columns of a
+# batch of rows are hashed column by column into one uint64 per row
+# (pandas' vectorized hash_pandas_object), and a FingerprintSet remembers the
+# fingerprints seen so far as a few sorted uint64 arrays. A row is kept when
+# its fingerprint is new, so a frame can be deduplicated one chunk at a time
+# in 8 bytes per distinct row (24 with duplicate statistics), without
+# building Python tuples for the rows.
+#
+# Two distinct rows share a fingerprint with probability about 2**-64 per
+# pair, so for 10M distinct rows the chance that any row is wrongly dropped
+# is around 3 in a million.
+
+TOP_DUPLICATE_GROUPS = 10
+
+def row_fingerprints(frame: pd.DataFrame) -> np.ndarray:
+    """One uint64 per row of `frame`; equal rows (as drop_duplicates sees them) get equal values."""
+    columns = {}
+    for i in range(len(frame.columns)):
+        values = frame.iloc[:, i]
+        if isinstance(values.dtype, pd.SparseDtype):
+            values = values.sparse.to_dense()
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind == 'f':
+            # 0.0 and -0.0 are one value, and every NaN the same missing value
+            array = values.to_numpy() + 0.0
+            array[np.isnan(array)] = np.nan
+            values = pd.Series(array, index=values.index)
+        elif pd.api.types.is_object_dtype(values.dtype) or isinstance(values.dtype, pd.StringDtype):
+            # Hash each distinct string once; a categorical hashes like its values
+            codes, uniques = pd.factorize(values)
+            values = pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=values.index)
+        columns[i] = values
+    return pd.util.hash_pandas_object(pd.DataFrame(columns, index=frame.index, copy=False), index=False).to_numpy()
+
+class FingerprintSet:
+    """Fingerprints seen so far, kept as sorted uint64 levels that merge as they grow.
+
+    With `track`, each fingerprint also keeps its row count and the position
+    of its first row, for duplicate statistics.
+    """
+
+    def __init__(self, track=False):
+        self.track = track
+        self.levels: List[Dict[str, np.ndarray]] = []
+        self.rows = 0
+
+    def __len__(self):
+        return sum(len(level['keys']) for level in self.levels)
+
+    def add(self, fingerprints: np.ndarray) -> np.ndarray:
+        """Record a batch of row fingerprints; returns a mask of the rows seen for the first time."""
+        # A hash table pass, then a sort of the distinct keys only
+        codes, keys = pd.factorize(fingerprints)
+        # Codes number the keys in order of first appearance
+        first = np.flatnonzero(np.diff(np.maximum.accumulate(codes), prepend=-1) > 0)
+        order = np.argsort(keys)
+        keys, first = keys[order], first[order]
+        counts = np.bincount(codes, minlength=len(order))[order] if self.track else None
+        found = np.zeros(len(keys), dtype=bool)
+        for level in self.levels:
+            positions = np.searchsorted(level['keys'], keys)
+            inside = positions < len(level['keys'])
+            hit = np.zeros(len(keys), dtype=bool)
+            hit[inside] = level['keys'][positions[inside]] == keys[inside]
+            if self.track:
+                # Keys are unique within the batch, so the positions are too
+                level['counts'][positions[hit]] += counts[hit]
+            found |= hit
+        new = ~found
+        keep = np.zeros(len(fingerprints), dtype=bool)
+        keep[first[new]] = True
+        if new.any():
+            level = {'keys': keys[new]}
+            if self.track:
+                level['counts'] = counts[new].astype(np.int64)
+                level['first'] = first[new].astype(np.int64) + self.rows
+            self._push(level)
+        self.rows += len(fingerprints)
+        return keep
+
+    def _push(self, level):
+        self.levels.append(level)
+        # Merge while the newest level is at least half the size of the one below,
+        # so there are O(log n) levels and each key is merged O(log n) times
+        while len(self.levels) > 1 and 2 * len(self.levels[-1]['keys']) >= len(self.levels[-2]['keys']):
+            upper, lower = self.levels.pop(), self.levels.pop()
+            # Levels never share a key, so a merge is a concatenation and a sort
+            order = np.argsort(np.concatenate([lower['keys'], upper['keys']]), kind='stable')
+            self.levels.append({name: np.concatenate([lower[name], upper[name]])[order] for name in lower})
+
+    def top_groups(self, n=TOP_DUPLICATE_GROUPS):
+        """(first row position, row count) of the `n` largest groups with more than one row."""
+        if not self.track or not self.levels:
+            return []
+        counts = np.concatenate([level['counts'] for level in self.levels])
+        first = np.concatenate([level['first'] for level in self.levels])
+        repeated = np.flatnonzero(counts > 1)
+        # Largest groups first; ties go to the group that appeared first
+        order = repeated[np.lexsort((first[repeated], -counts[repeated]))][:n]
+        return [(int(first[i]), int(counts[i])) for i in order]
+
+def first_occurrences(frame: pd.DataFrame, seen: Optional[FingerprintSet] = None) -> np.ndarray:
+    """Mask of the rows of `frame` that duplicate no earlier row (in `frame`, or already in `seen`)."""
+    seen = seen if seen is not None else FingerprintSet()
+    return seen.add(row_fingerprints(frame))
+
+def duplicate_report(seen: FingerprintSet, subset: List[str], representatives: pd.DataFrame) -> Dict[str, Any]:
+    """Duplicate statistics of a tracked FingerprintSet.
+
+    `representatives` holds the subset columns of the first row of each top
+    group, in top_groups() order.
+    """
+    groups = seen.top_groups()
+    values = [column_values(representatives[col]) for col in subset]
+    return {
+        'subset': subset,
+        'rows': seen.rows,
+        'unique_rows': len(seen),
+        'duplicate_rows': seen.rows - len(seen),
+        'top_groups': [
+            {'values': {col: column[i] for col, column in zip(subset, values)}, 'count': count}
+            for i, (_, count) in enumerate(groups)
+        ],
+    }
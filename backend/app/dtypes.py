@@ -0,0 +1,142 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Tuple
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    # pandas < 2.2 only has the private spelling
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# Memory-optimizing dtypes, chosen once when an upload is parsed:
+#   integers      the smallest signed width that holds every value
+#   floats        float32 when every value survives the round trip
+#   dates         text columns whose values all parse with one date format
+#   categories    text columns with few distinct values (at most
+#                 CATEGORY_MAX_RATIO of the non-missing values)
+# Numbers are never changed, only stored in less space.
+OPTIMIZE_DTYPES = os.environ.get('DATAPREPPER_OPTIMIZE_DTYPES', '1').lower() not in ('0', 'false', 'no')
+CATEGORY_MAX_RATIO = float(os.environ.get('DATAPREPPER_CATEGORY_MAX_RATIO', 0.5))
+# Values looked at before committing to a full pass over a column
+SAMPLE_ROWS = 10_000
+
+# Tried in order after pandas' own guess; the first that parses the whole sample wins
+DATE_FORMATS = [
+    '%m/%d/%Y %I:%M:%S %p',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d',
+]
+_DATE_LIKE = re.compile(r'^\s*\d{1,4}[-/]\d{1,2}[-/]\d{1,4}')
+
+def _is_text(series):
+    return pd.api.types.is_string_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype)
+
+def _sample(series):
+    present = series.dropna()
+    return present.iloc[:SAMPLE_ROWS]
+
+def downcast_numeric(series):
+    """`series` in the narrowest numeric dtype that holds it exactly."""
+    if pd.api.types.is_bool_dtype(series.dtype) or not pd.api.types.is_numeric_dtype(series.dtype):
+        return series
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return pd.to_numeric(series, downcast='integer')
+    if series.dtype == np.float64:
+        values = series.to_numpy()
+        narrow = values.astype(np.float32)
+        with np.errstate(invalid='ignore'):
+            exact = (narrow.astype(np.float64) == values) | np.isnan(values)
+        if exact.all():
+            return pd.Series(narrow, index=series.index, name=series.name)
+    return series
+
+def date_format(series):
+    """The strftime format every sampled value of a text column parses with, or None."""
+    sample = _sample(series)
+    if sample.empty or not sample.iloc[:100].astype(str).str.match(_DATE_LIKE).all():
+        return None
+    guessed = guess_datetime_format(str(sample.iloc[0]))
+    for fmt in ([guessed] if guessed else []) + DATE_FORMATS:
+        if pd.to_datetime(sample, format=fmt, errors='coerce').notna().all():
+            return fmt
+    return None
+
+def parse_dates(series):
+    """`series` as datetimes if it is a text column of dates in one format, else unchanged."""
+    if not _is_text(series):
+        return series
+    fmt = date_format(series)
+    if fmt is None:
+        return series
+    parsed = pd.to_datetime(series, format=fmt, errors='coerce')
+    # Any value that fails the format keeps the column as text
+    if parsed.isna().sum() != series.isna().sum():
+        return series
+    return parsed
+
+def to_category(series, max_ratio=None):
+    """`series` as a category if it has few distinct values for its length, else unchanged."""
+    if not _is_text(series):
+        return series
+    max_ratio = CATEGORY_MAX_RATIO if max_ratio is None else max_ratio
+    sample = _sample(series)
+    # Cheap rejection of identifiers and free text before counting the whole column
+    if sample.empty or sample.nunique() > max_ratio * len(sample):
+        return series
+    if series.nunique() > max_ratio * series.count():
+        return series
+    return series.astype('category')
+
+def optimize_series(series):
+    """`series` in the most compact dtype that keeps its values."""
+    series = parse_dates(series)
+    series = to_category(series)
+    return downcast_numeric(series)
+
+def optimize_frame(df) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Optimize every column's dtype; report each column's dtype and bytes before and after."""
+    columns = {}
+    data = {}
+    for col in df.columns:
+        before = df[col]
+        after = optimize_series(before)
+        data[col] = after
+        columns[col] = {
+            'dtype_before': str(before.dtype),
+            'dtype_after': str(after.dtype),
+            'bytes_before': int(before.memory_usage(index=False, deep=True)),
+            'bytes_after': int(after.memory_usage(index=False, deep=True)),
+        }
+    optimized = pd.DataFrame(data, index=df.index, copy=False)
+    report = {
+        'bytes_before': sum(entry['bytes_before'] for entry in columns.values()),
+        'bytes_after': sum(entry['bytes_after'] for entry in columns.values()),
+        'columns': columns,
+    }
+    return optimized, report
+
+def cast_series(series, dtype):
+    """`series` converted to `dtype`; 'datetime', 'category' and 'auto' are understood.
+
+    Casting to the dtype a column already has returns it without a copy.
+    """
+    if dtype == 'datetime':
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return series
+        fmt = date_format(series) if _is_text(series) else None
+        return pd.to_datetime(series, format=fmt, errors='coerce')
+    if dtype == 'category':
+        return series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    if dtype == 'auto':
+        return optimize_series(series)
+    try:
+        if series.dtype == pd.api.types.pandas_dtype(dtype):
+            return series
+    except TypeError:
+        pass
+    return series.astype(dtype, errors='ignore')
@@ -0,0 +1,46 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from .metrics import traced
+
+# pandas/NumPy release the GIL inside their kernels, so a thread
+# pool spreads one process's requests across cores while every worker still
+# sees the in-process session store.
+MAX_WORKERS = int(os.environ.get('DATAPREPPER_WORKERS', os.cpu_count() or 4))
+# Requests running or waiting for a worker; beyond this new work is rejected
+MAX_PENDING = int(os.environ.get('DATAPREPPER_MAX_PENDING', MAX_WORKERS * 4))
+# Seconds clients are asked to wait before retrying a rejected request
+RETRY_AFTER = int(os.environ.get('DATAPREPPER_RETRY_AFTER', 2))
+
+class WorkerPoolBusy(Exception):
+    """Raised when MAX_PENDING requests are already running or queued."""
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='dataprepper')
+# Incremented on the event loop, decremented when the work itself ends (on a worker thread)
+_pending = 0
+_pending_guard = threading.Lock()
+
+def pending():
+    return _pending
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking pandas call on the worker pool without stalling the event loop."""
+    global _pending
+    with _pending_guard:
+        if _pending >= MAX_PENDING:
+            raise WorkerPoolBusy(f"Server busy: {_pending} requests already pending.")
+        _pending += 1
+    # Run in the request's context, so stage timings and profiling follow the work
+    context = contextvars.copy_context()
+    future = _pool.submit(partial(context.run, traced, func, *args, **kwargs))
+    # Counted until the work finishes: a cancelled request's thread keeps running
+    future.add_done_callback(_finished)
+    return await asyncio.wrap_future(future)
+
+def _finished(future):
+    global _pending
+    with _pending_guard:
+        _pending -= 1
@@ -0,0 +1,100 @@
+import io
+import zlib
+from typing import Iterator
+
+from .transforms import densify
+
+# Rows serialized per chunk; bounds the extra memory an export needs
+EXPORT_CHUNK_ROWS = 100_000
+
+EXPORT_FORMATS = {
+    # format -> (media type, file extension)
+    'csv': ('text/csv', 'csv'),
+    'csv.gz': ('application/gzip', 'csv.gz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+def iter_csv_frames(frames, compress=False) -> Iterator[bytes]:
+    """Yield consecutive DataFrame chunks as one CSV file, optionally gzip-compressed."""
+    # wbits=31 produces a gzip container rather than a raw zlib stream
+    gzip = zlib.compressobj(wbits=31) if compress else None
+    for i, frame in enumerate(frames):
+        chunk = frame.to_csv(index=False, header=i == 0).encode()
+        if gzip is None:
+            yield chunk
+        else:
+            compressed = gzip.compress(chunk)
+            if compressed:
+                yield compressed
+    if gzip is not None:
+        yield gzip.flush()
+
+def iter_csv(df, chunk_rows=EXPORT_CHUNK_ROWS, compress=False) -> Iterator[bytes]:
+    """Yield `df` as CSV bytes, `chunk_rows` rows at a time, optionally gzip-compressed."""
+    frames = (df.iloc[start:start + chunk_rows] for start in range(0, max(len(df), 1), chunk_rows))
+    return iter_csv_frames(frames, compress)
+
+def iter_file(f, chunk_bytes=1024 * 1024) -> Iterator[bytes]:
+    """Blocks of an open binary file, which is closed at the end."""
+    with f:
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            yield block
+
+class _DrainSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller on drain()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # The Parquet footer records absolute offsets, so count drained bytes too
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_parquet(df, chunk_rows=EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield `df` as a Parquet file with one row group per chunk. Requires pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    # Parquet has no sparse columns: they are densified one chunk at a time
+    schema = pa.Schema.from_pandas(densify(df.iloc[:0])[0], preserve_index=False)
+    sink = _DrainSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for start in range(0, len(df), chunk_rows):
+            chunk = densify(df.iloc[start:start + chunk_rows])[0]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def iter_export(df, fmt, chunk_rows=EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    if fmt == 'csv':
+        return iter_csv(df, chunk_rows)
+    if fmt == 'csv.gz':
+        return iter_csv(df, chunk_rows, compress=True)
+    if fmt == 'parquet':
+        # Checked up front: once streaming starts the status code is already sent
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow to be installed.")
+        return iter_parquet(df, chunk_rows)
+    raise ValueError(f"Unknown export format: {fmt}")
@@ -0,0 +1,83 @@
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Tuple
+
+logger = logging.getLogger("dataprepper")
+
+# 'auto' tries each engine in ENGINE_ORDER and keeps the first that parses the
+# file; naming an engine forces it.
+CSV_ENGINE = os.environ.get('DATAPREPPER_CSV_ENGINE', 'auto')
+ENGINE_ORDER = ['pyarrow', 'c']
+
+def _arrow_string_dtype():
+    """Arrow-backed string dtype with NaN missing values, or None without pyarrow."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    try:
+        return pd.StringDtype('pyarrow', na_value=np.nan)
+    except TypeError:
+        # pandas < 2.3 spells the NaN-semantics variant as a storage name
+        return pd.StringDtype('pyarrow_numpy')
+
+def _read_pyarrow(file, **kwargs):
+    # Multithreaded Arrow CSV reader; object columns become Arrow strings
+    df = pd.read_csv(file, engine='pyarrow', **kwargs)
+    string_dtype = _arrow_string_dtype()
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) == 'string':
+            df[col] = df[col].astype(string_dtype)
+    return df
+
+def _read_c(file, **kwargs):
+    return pd.read_csv(file, **kwargs)
+
+# Engine name -> reader(file, **read_csv kwargs) -> DataFrame
+ENGINES = {
+    'pyarrow': _read_pyarrow,
+    'c': _read_c,
+}
+
+def _engines_for(kwargs):
+    if CSV_ENGINE != 'auto':
+        return [CSV_ENGINE]
+    if 'nrows' in kwargs:
+        # The Arrow reader cannot stop early, so short previews stay on the C parser
+        return ['c']
+    if _arrow_string_dtype() is None:
+        return ['c']
+    return ENGINE_ORDER
+
+def read_csv_with_report(file, **kwargs) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Parse a CSV upload and report the engine used, parse time and frame memory."""
+    engines = _engines_for(kwargs)
+    start = file.tell() if hasattr(file, 'tell') else 0
+    for i, name in enumerate(engines):
+        began = time.perf_counter()
+        try:
+            df = ENGINES[name](file, **kwargs)
+        except (ImportError, ValueError) as e:
+            if i == len(engines) - 1:
+                raise
+            logger.warning(f"CSV engine '{name}' failed, falling back: {e}")
+            file.seek(start)
+            continue
+        report = {
+            'engine': name,
+            'parse_seconds': time.perf_counter() - began,
+            'rows': len(df),
+            'columns': len(df.columns),
+            'memory_bytes': int(df.memory_usage(deep=True).sum()),
+        }
+        logger.info(
+            f"Parsed CSV with engine={name}: rows={report['rows']}, columns={report['columns']}, "
+            f"seconds={report['parse_seconds']:.3f}, memory_mb={report['memory_bytes'] / 2**20:.1f}"
+        )
+        return df, report
+
+def read_csv(file, **kwargs) -> pd.DataFrame:
+    return read_csv_with_report(file, **kwargs)[0]
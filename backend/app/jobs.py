@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any
+
+from starlette.websockets import WebSocketDisconnect
+
+from . import metrics
+from .chunked import is_chunked
+from .crud import get_column_stats, apply_transformation
+from .executor import run_blocking, pending, MAX_PENDING, WorkerPoolBusy
+from .serialize import dumps
+from .store import has_dataset
+
+# Background jobs for operations that can run for a long time on big sessions.
+# A job runs on the worker pool like any request, but the request that
+# submits it returns at once with the job's ID. The work reports progress
+# through a callback (per column or per step, see crud.py), and the same
+# callback raises JobCancelled once the job is cancelled, so the work stops at
+# the next column. Results land where the synchronous endpoints put them: stats
+# in the version's stats cache, transformations as a new session version.
+#
+# Clients follow a job over Server-Sent Events or a WebSocket. When the last
+# one disconnects before the job finishes, the job is cancelled, unless it
+# was submitted with detach.
+
+# Finished jobs kept for GET /jobs/{id}; the oldest finished ones go first
+JOBS_KEPT = int(os.environ.get('DATAPREPPER_JOBS_KEPT', 256))
+# Seconds between progress checks for a streaming client
+JOB_POLL_INTERVAL = float(os.environ.get('DATAPREPPER_JOB_POLL_INTERVAL', 0.1))
+
+JOB_KINDS = ('column_stats', 'apply_transformation')
+FINISHED = ('done', 'failed', 'cancelled')
+
+class JobCancelled(Exception):
+    """Raised inside a job's work, at its next progress report, once the job is cancelled."""
+
+jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_jobs_guard = threading.Lock()
+
+def get_job(job_id):
+    with _jobs_guard:
+        job = jobs.get(job_id)
+    if job is None:
+        raise ValueError(f"Unknown job ID: {job_id}")
+    return job
+
+def snapshot(job) -> Dict[str, Any]:
+    """The public state of a job; `result` is set once it is done."""
+    with _jobs_guard:
+        state = {
+            'job_id': job['id'],
+            'kind': job['kind'],
+            'session_id': job['session_id'],
+            'status': job['status'],
+            'done': job['done'],
+            'total': job['total'],
+            'current': job['current'],
+            'elapsed_seconds': (job['finished'] or time.monotonic()) - job['created'],
+        }
+        if job['status'] == 'done':
+            state['result'] = job['result']
+        if job['error'] is not None:
+            state['error'] = job['error']
+    return state
+
+def _update(job, **fields):
+    with _jobs_guard:
+        job.update(fields)
+        job['seq'] += 1
+
+def _forget_finished():
+    # Called with _jobs_guard held
+    finished = [job_id for job_id, job in jobs.items() if job['status'] in FINISHED]
+    for job_id in finished[:max(0, len(jobs) - JOBS_KEPT)]:
+        del jobs[job_id]
+
+def _work(job, func, args, kwargs):
+    """Run on a worker thread: the operation, with a progress callback that also checks for cancellation."""
+    def progress(done, total, label):
+        if job['cancel'].is_set():
+            raise JobCancelled(f"Job {job['id']} was cancelled.")
+        _update(job, done=done, total=total, current=label)
+
+    progress(0, None, None)
+    _update(job, status='running')
+    return func(*args, progress=progress, **kwargs)
+
+def _result(kind, value):
+    if kind == 'column_stats':
+        return {'stats': value}
+    columns, data, can_undo = value
+    # Plain lists rather than pre-rendered JSON, so the result nests in the job state
+    return {'columns': columns, 'data': json.loads(data), 'can_undo': can_undo}
+
+async def _run(job, func, args, kwargs):
+    # The job outlives the request that submitted it; keep its stages out of that request's timings
+    metrics.detach()
+    try:
+        value = await run_blocking(_work, job, func, args, kwargs)
+    except JobCancelled:
+        status, fields = 'cancelled', {}
+    except Exception as e:
+        status, fields = 'failed', {'error': str(e)}
+    else:
+        status, fields = 'done', {'result': _result(job['kind'], value)}
+    _update(job, status=status, finished=time.monotonic(), **fields)
+    metrics.count('dataprepper_jobs_total', kind=job['kind'], status=status)
+
+def submit_job(kind, session_id, options=None, detach=False):
+    """Start a job on the running event loop; returns its state.
+
+    `options` holds the operation's arguments: `approximate` for column_stats;
+    `action`, `columns`, `params` and `rows` for apply_transformation.
+    """
+    options = options or {}
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}. Expected one of {', '.join(JOB_KINDS)}.")
+    if not (has_dataset(session_id) or is_chunked(session_id)):
+        raise ValueError(f"Unknown session ID: {session_id}")
+    if pending() >= MAX_PENDING:
+        raise WorkerPoolBusy(f"Server busy: {pending()} requests already pending.")
+    if kind == 'column_stats':
+        func, args, kwargs = get_column_stats, (None, session_id), {'approximate': bool(options.get('approximate'))}
+    else:
+        if not options.get('action'):
+            raise ValueError("An apply_transformation job needs an action.")
+        args = (None, session_id, options['action'], options.get('columns') or [], options.get('params') or {}, options.get('rows', 5))
+        func, kwargs = apply_transformation, {}
+    now = time.monotonic()
+    job = {
+        'id': uuid.uuid4().hex, 'kind': kind, 'session_id': session_id, 'status': 'queued',
+        'done': 0, 'total': None, 'current': None, 'result': None, 'error': None,
+        'created': now, 'finished': None, 'seq': 0, 'detach': detach, 'watchers': 0,
+        'cancel': threading.Event(),
+    }
+    with _jobs_guard:
+        jobs[job['id']] = job
+        _forget_finished()
+    # Keep a reference to the task, or it may be garbage collected while it runs
+    job['task'] = asyncio.get_running_loop().create_task(_run(job, func, args, kwargs))
+    return snapshot(job)
+
+def cancel_job(job_id):
+    """Ask a job to stop; it does at its next progress report (a queued job, before it starts)."""
+    job = get_job(job_id)
+    job['cancel'].set()
+    return snapshot(job)
+
+@contextmanager
+def _watching(job):
+    """Count a client following the job; the last one leaving early cancels it unless detached."""
+    with _jobs_guard:
+        job['watchers'] += 1
+    try:
+        yield
+    finally:
+        with _jobs_guard:
+            job['watchers'] -= 1
+            abandoned = job['watchers'] == 0 and job['status'] not in FINISHED and not job['detach']
+        if abandoned:
+            job['cancel'].set()
+
+async def job_events(job):
+    """The job's state each time it changes, ending with its final state."""
+    seen = -1
+    with _watching(job):
+        while True:
+            if job['seq'] != seen:
+                seen = job['seq']
+                state = snapshot(job)
+                yield state
+                if state['status'] in FINISHED:
+                    return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+async def sse_events(job):
+    """job_events as Server-Sent Events: 'progress' events, then one named after the final status."""
+    async for state in job_events(job):
+        event = state['status'] if state['status'] in FINISHED else 'progress'
+        yield f"event: {event}\ndata: {dumps(state)}\n\n"
+
+async def serve_socket(websocket, job_id):
+    """Send the job's states over `websocket`; a {"action": "cancel"} message cancels it."""
+    try:
+        job = get_job(job_id)
+    except ValueError as e:
+        await websocket.close(code=4404, reason=str(e))
+        return
+    await websocket.accept()
+    seen = -1
+    with _watching(job):
+        while True:
+            if job['seq'] != seen:
+                seen = job['seq']
+                state = snapshot(job)
+                await websocket.send_text(dumps(state))
+                if state['status'] in FINISHED:
+                    await websocket.close()
+                    return
+            # Wait for a message, but no longer than the next progress check
+            try:
+                message = json.loads(await asyncio.wait_for(websocket.receive_text(), JOB_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                continue
+            except WebSocketDisconnect:
+                return
+            except ValueError:
+                continue
+            if isinstance(message, dict) and message.get('action') == 'cancel':
+                job['cancel'].set()
@@ -1,14 +1,39 @@
 import logging
-from fastapi import FastAPI, UploadFile, File, HTTPException, Body, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Body, Form, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from .crud import preview_csv, impute_missing, encode_categorical, scale_numeric, drop_columns, filter_rows, rename_columns, change_dtypes, drop_duplicates, drop_columns_with_cache, restore_dropped_columns, generate_session_id, apply_transformation, undo_last_transformation, get_column_stats
-from .models import PreviewResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from .crud import preview_csv, preview_arrow, page_arrow, column_stats_arrow, impute_missing, encode_categorical, scale_numeric, drop_columns, filter_rows, rename_columns, change_dtypes, drop_duplicates, drop_columns_with_cache, restore_dropped_columns, page_rows, export_dataset, create_session as create_session_from_file, apply_transformation, apply_recipe, undo_last_transformation, get_column_stats
+from .recipes import list_recipes
+from .store import session_memory, memory_report, history_summary
+from .models import PreviewResponse, PageResponse
+from .export import EXPORT_CHUNK_ROWS
+from .columnar import ARROW_STREAM, wants_arrow
+from .serialize import json_response
+from .executor import run_blocking, WorkerPoolBusy, RETRY_AFTER, pending
+from . import metrics
+from .jobs import submit_job, get_job, cancel_job, snapshot, sse_events, serve_socket
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("dataprepper")
 
 app = FastAPI(title="DataPrepper API")
 
+@app.exception_handler(WorkerPoolBusy)
+async def worker_pool_busy_handler(request, exc):
+    logger.warning(f"{request.url.path} rejected: {exc}")
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(RETRY_AFTER)})
+
+# Uploads are optional once a session exists; the cached frame is used instead
+def _upload(file):
+    return file.file if file is not None else None
+
+def _filename(file):
+    return file.filename if file is not None else None
+
+# Endpoints that can answer in Arrow IPC vary on Accept, so caches keep the formats apart
+def _arrow_response(content):
+    return Response(content=content, media_type=ARROW_STREAM, headers={"Vary": "Accept"})
+
 # Allow local frontend access
 app.add_middleware(
     CORSMiddleware,
@@ -16,226 +41,471 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile", "X-Profile-Id", "X-Profile-Samples"],
 )
 
+# Per-request stage breakdown (Server-Timing header) and request metrics; with
+# DATAPREPPER_PROFILE_REQUESTS=1, an `X-Profile: 1` request header also samples its stacks
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    token, record = metrics.begin_request(profile=request.headers.get("x-profile") == "1")
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        # Route templates, not raw paths, keep the label set bounded
+        route = request.scope.get("route")
+        headers = metrics.end_request(token, record, getattr(route, "path", "unmatched"), status)
+    response.headers.update(headers)
+    return response
+
 @app.post("/preview", response_model=PreviewResponse)
-async def preview(file: UploadFile = File(...), rows: int = 5):
-    logger.info(f"/preview called with file={file.filename}, rows={rows}")
+async def preview(request: Request, file: UploadFile = File(None), session_id: str = Form(None), rows: int = 5):
+    logger.info(f"/preview called with file={_filename(file)}, session_id={session_id}, rows={rows}")
     try:
-        columns, data = preview_csv(file.file, rows)
-        logger.info(f"/preview success: columns={columns}")
-        return PreviewResponse(columns=columns, data=data)
+        if wants_arrow(request.headers.get("accept")):
+            return _arrow_response(await run_blocking(preview_arrow, _upload(file), rows, session_id=session_id))
+        columns, data = await run_blocking(preview_csv, _upload(file), rows, session_id=session_id)
+        logger.info(f"/preview success: {len(columns)} columns")
+        return json_response({"columns": columns, "data": data}, headers={"Vary": "Accept"})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/preview error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/page", response_model=PageResponse)
+async def page(
+    request: Request,
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
+    columns: str = Form(None),
+    sort_by: str = Form(None),
+    ascending: bool = Form(True),
+    offset: int = 0,
+    limit: int = 100
+):
+    logger.info(f"/page called with file={_filename(file)}, session_id={session_id}, columns={columns}, sort_by={sort_by}, ascending={ascending}, offset={offset}, limit={limit}")
+    try:
+        import json
+        columns_list = (json.loads(columns) if columns.startswith('[') else [columns]) if columns else None
+        if wants_arrow(request.headers.get("accept")):
+            content = await run_blocking(page_arrow, _upload(file), offset, limit, columns_list, sort_by, ascending, session_id=session_id)
+            return _arrow_response(content)
+        cols, data, total_rows = await run_blocking(page_rows, _upload(file), offset, limit, columns_list, sort_by, ascending, session_id=session_id)
+        return json_response({"columns": cols, "data": data, "offset": offset, "limit": limit, "total_rows": total_rows}, headers={"Vary": "Accept"})
+    except WorkerPoolBusy:
+        raise
+    except Exception as e:
+        logger.error(f"/page error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/impute", response_model=PreviewResponse)
 async def impute(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
     method: str = Form(...),
     columns: str = Form(...),
     value: str = Form(None),
     rows: int = 5
 ):
-    logger.info(f"/impute called with file={file.filename}, method={method}, columns={columns}, value={value}, rows={rows}")
+    logger.info(f"/impute called with file={_filename(file)}, session_id={session_id}, method={method}, columns={columns}, value={value}, rows={rows}")
     try:
         import json
         columns_list = json.loads(columns) if columns.startswith('[') else [columns]
-        columns, data = impute_missing(file.file, columns_list, method, value, rows)
-        logger.info(f"/impute success: columns={columns}")
-        return PreviewResponse(columns=columns, data=data)
+        columns, data = await run_blocking(impute_missing, _upload(file), columns_list, method, value, rows, session_id=session_id)
+        logger.info(f"/impute success: {len(columns)} columns")
+        return json_response({"columns": columns, "data": data})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/impute error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/encode", response_model=PreviewResponse)
 async def encode(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
     method: str = Form(...),
     columns: str = Form(...),
+    sparse: bool = Form(False),
+    max_categories: int = Form(None),
+    min_frequency: float = Form(None),
+    other_label: str = Form(None),
     rows: int = 5
 ):
-    logger.info(f"/encode called with file={file.filename}, method={method}, columns={columns}, rows={rows}")
+    logger.info(f"/encode called with file={_filename(file)}, session_id={session_id}, method={method}, columns={columns}, rows={rows}")
     try:
         import json
         columns_list = json.loads(columns) if columns.startswith('[') else [columns]
-        columns, data = encode_categorical(file.file, columns_list, method, rows)
-        logger.info(f"/encode success: columns={columns}")
-        return PreviewResponse(columns=columns, data=data)
+        options = {
+            key: value for key, value in
+            {'sparse': sparse or None, 'max_categories': max_categories, 'min_frequency': min_frequency, 'other_label': other_label}.items()
+            if value is not None
+        }
+        columns, data = await run_blocking(encode_categorical, _upload(file), columns_list, method, rows, session_id=session_id, options=options)
+        logger.info(f"/encode success: {len(columns)} columns")
+        return json_response({"columns": columns, "data": data})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/encode error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/scale", response_model=PreviewResponse)
 async def scale(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
     method: str = Form(...),
     columns: str = Form(...),
     rows: int = 5
 ):
-    logger.info(f"/scale called with file={file.filename}, method={method}, columns={columns}, rows={rows}")
+    logger.info(f"/scale called with file={_filename(file)}, session_id={session_id}, method={method}, columns={columns}, rows={rows}")
     try:
         import json
         columns_list = json.loads(columns) if columns.startswith('[') else [columns]
-        columns, data = scale_numeric(file.file, columns_list, method, rows)
-        logger.info(f"/scale success: columns={columns}")
-        return PreviewResponse(columns=columns, data=data)
+        columns, data = await run_blocking(scale_numeric, _upload(file), columns_list, method, rows, session_id=session_id)
+        logger.info(f"/scale success: {len(columns)} columns")
+        return json_response({"columns": columns, "data": data})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/scale error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/drop_columns", response_model=PreviewResponse)
 async def drop_columns_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
     columns: str = Form(...),
     rows: int = 5
 ):
-    logger.info(f"/drop_columns called with file={file.filename}, columns={columns}, rows={rows}")
+    logger.info(f"/drop_columns called with file={_filename(file)}, session_id={session_id}, columns={columns}, rows={rows}")
     try:
         import json
         columns_list = json.loads(columns) if columns.startswith('[') else [columns]
-        cols, data = drop_columns(file.file, columns_list, rows)
-        logger.info(f"/drop_columns success: columns={cols}")
-        return PreviewResponse(columns=cols, data=data)
+        cols, data = await run_blocking(drop_columns, _upload(file), columns_list, rows, session_id=session_id)
+        logger.info(f"/drop_columns success: {len(cols)} columns")
+        return json_response({"columns": cols, "data": data})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/drop_columns error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/filter_rows", response_model=PreviewResponse)
 async def filter_rows_endpoint(
-    file: UploadFile = File(...),
-    column: str = Form(...),
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
+    column: str = Form(None),
     value: str = Form(None),
     min_value: str = Form(None),
     max_value: str = Form(None),
     regex: str = Form(None),
+    where: str = Form(None),
     rows: int = 5
 ):
-    logger.info(f"/filter_rows called with file={file.filename}, column={column}, value={value}, min_value={min_value}, max_value={max_value}, regex={regex}, rows={rows}")
+    logger.info(f"/filter_rows called with file={_filename(file)}, session_id={session_id}, column={column}, value={value}, min_value={min_value}, max_value={max_value}, regex={regex}, where={where}, rows={rows}")
     try:
-        cols, data = filter_rows(file.file, column, value, min_value, max_value, regex, rows)
-        logger.info(f"/filter_rows success: columns={cols}")
-        return PreviewResponse(columns=cols, data=data)
+        cols, data = await run_blocking(filter_rows, _upload(file), column, value, min_value, max_value, regex, rows, session_id=session_id, where=where)
+        logger.info(f"/filter_rows success: {len(cols)} columns")
+        return json_response({"columns": cols, "data": data})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/filter_rows error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/rename_columns", response_model=PreviewResponse)
 async def rename_columns_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
     rename_map: str = Form(...),
     rows: int = 5
 ):
-    logger.info(f"/rename_columns called with file={file.filename}, rename_map={rename_map}, rows={rows}")
+    logger.info(f"/rename_columns called with file={_filename(file)}, session_id={session_id}, rename_map={rename_map}, rows={rows}")
     try:
         import json
         rename_map_dict = json.loads(rename_map)
-        cols, data = rename_columns(file.file, rename_map_dict, rows)
-        logger.info(f"/rename_columns success: columns={cols}")
-        return PreviewResponse(columns=cols, data=data)
+        cols, data = await run_blocking(rename_columns, _upload(file), rename_map_dict, rows, session_id=session_id)
+        logger.info(f"/rename_columns success: {len(cols)} columns")
+        return json_response({"columns": cols, "data": data})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/rename_columns error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/change_dtypes", response_model=PreviewResponse)
 async def change_dtypes_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
     dtype_map: str = Form(...),
     rows: int = 5
 ):
-    logger.info(f"/change_dtypes called with file={file.filename}, dtype_map={dtype_map}, rows={rows}")
+    logger.info(f"/change_dtypes called with file={_filename(file)}, session_id={session_id}, dtype_map={dtype_map}, rows={rows}")
     try:
         import json
         dtype_map_dict = json.loads(dtype_map)
-        cols, data = change_dtypes(file.file, dtype_map_dict, rows)
-        logger.info(f"/change_dtypes success: columns={cols}")
-        return PreviewResponse(columns=cols, data=data)
+        cols, data = await run_blocking(change_dtypes, _upload(file), dtype_map_dict, rows, session_id=session_id)
+        logger.info(f"/change_dtypes success: {len(cols)} columns")
+        return json_response({"columns": cols, "data": data})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/change_dtypes error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/drop_duplicates", response_model=PreviewResponse)
 async def drop_duplicates_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
     subset: str = Form(None),
     rows: int = 5
 ):
-    logger.info(f"/drop_duplicates called with file={file.filename}, subset={subset}, rows={rows}")
+    logger.info(f"/drop_duplicates called with file={_filename(file)}, session_id={session_id}, subset={subset}, rows={rows}")
     try:
         import json
         subset_list = json.loads(subset) if subset else None
-        cols, data = drop_duplicates(file.file, subset_list, rows)
-        logger.info(f"/drop_duplicates success: columns={cols}")
-        return PreviewResponse(columns=cols, data=data)
+        cols, data, report = await run_blocking(drop_duplicates, _upload(file), subset_list, rows, session_id=session_id)
+        logger.info(f"/drop_duplicates success: {len(cols)} columns, {report['duplicate_rows']} duplicate rows")
+        return json_response({"columns": cols, "data": data, "duplicates": report})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/drop_duplicates error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/drop_columns_with_cache")
 async def drop_columns_with_cache_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
     columns: str = Form(...),
     rows: int = 5
 ):
-    logger.info(f"/drop_columns_with_cache called with file={file.filename}, columns={columns}, rows={rows}")
+    logger.info(f"/drop_columns_with_cache called with file={_filename(file)}, session_id={session_id}, columns={columns}, rows={rows}")
     try:
         import json
         columns_list = json.loads(columns) if columns.startswith('[') else [columns]
-        cols, data, op_id = drop_columns_with_cache(file.file, columns_list, rows)
-        logger.info(f"/drop_columns_with_cache success: columns={cols}, op_id={op_id}")
-        return {"columns": cols, "data": data, "operation_id": op_id}
+        cols, data, op_id = await run_blocking(drop_columns_with_cache, _upload(file), columns_list, rows, session_id=session_id)
+        logger.info(f"/drop_columns_with_cache success: {len(cols)} columns, op_id={op_id}")
+        return json_response({"columns": cols, "data": data, "operation_id": op_id})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/drop_columns_with_cache error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/restore_dropped_columns")
 async def restore_dropped_columns_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
     operation_id: str = Form(...),
     rows: int = 5
 ):
-    logger.info(f"/restore_dropped_columns called with file={file.filename}, operation_id={operation_id}, rows={rows}")
+    logger.info(f"/restore_dropped_columns called with file={_filename(file)}, session_id={session_id}, operation_id={operation_id}, rows={rows}")
     try:
-        cols, data = restore_dropped_columns(file.file, operation_id, rows)
-        logger.info(f"/restore_dropped_columns success: columns={cols}")
-        return {"columns": cols, "data": data}
+        cols, data = await run_blocking(restore_dropped_columns, _upload(file), operation_id, rows, session_id=session_id)
+        logger.info(f"/restore_dropped_columns success: {len(cols)} columns")
+        return json_response({"columns": cols, "data": data})
+    except WorkerPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"/restore_dropped_columns error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/create_session")
-async def create_session(file: UploadFile = File(...)):
-    session_id = generate_session_id(file.file)
-    return {"session_id": session_id}
+async def create_session(file: UploadFile = File(...), chunked: bool = False, lazy: bool = False):
+    logger.info(f"/create_session called with file={file.filename}, chunked={chunked}, lazy={lazy}")
+    try:
+        session_id, ingest = await run_blocking(create_session_from_file, file.file, chunked, lazy)
+    except WorkerPoolBusy:
+        raise
+    except Exception as e:
+        logger.error(f"/create_session error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"session_id": session_id, "ingest": ingest}
 
 @app.post("/apply_transformation")
 async def apply_transformation_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
     session_id: str = Form(...),
     action: str = Form(...),
     columns: str = Form(...),
     params: str = Form('{}'),
     rows: int = 5
 ):
-    import json
-    columns_list = json.loads(columns) if columns.startswith('[') else [columns]
-    params_dict = json.loads(params) if params else {}
-    cols, data, can_undo = apply_transformation(file.file, session_id, action, columns_list, params_dict, rows)
-    return {"columns": cols, "data": data, "can_undo": can_undo}
+    logger.info(f"/apply_transformation called with session_id={session_id}, action={action}, columns={columns}, params={params}, rows={rows}")
+    try:
+        import json
+        columns_list = json.loads(columns) if columns.startswith('[') else [columns]
+        params_dict = json.loads(params) if params else {}
+        cols, data, can_undo = await run_blocking(apply_transformation, _upload(file), session_id, action, columns_list, params_dict, rows)
+    except WorkerPoolBusy:
+        raise
+    except Exception as e:
+        logger.error(f"/apply_transformation error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    return json_response({"columns": cols, "data": data, "can_undo": can_undo})
+
+@app.post("/apply_recipe")
+async def apply_recipe_endpoint(
+    file: UploadFile = File(None),
+    session_id: str = Form(...),
+    recipe: str = Form(None),
+    recipe_name: str = Form(None),
+    save_as: str = Form(None),
+    include_stats: bool = Form(False),
+    save_fitted: bool = Form(False),
+    rows: int = 5
+):
+    logger.info(f"/apply_recipe called with session_id={session_id}, recipe_name={recipe_name}, save_as={save_as}, rows={rows}")
+    try:
+        cols, data, can_undo, stats = await run_blocking(
+            apply_recipe, _upload(file), session_id, recipe, recipe_name, save_as, rows, include_stats, save_fitted
+        )
+    except WorkerPoolBusy:
+        raise
+    except Exception as e:
+        logger.error(f"/apply_recipe error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    response = {"columns": cols, "data": data, "can_undo": can_undo}
+    if include_stats:
+        response["stats"] = stats
+    return json_response(response)
+
+@app.get("/recipes")
+async def recipes_endpoint():
+    return {"recipes": list_recipes()}
 
 @app.post("/undo")
 async def undo_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
     session_id: str = Form(...),
     rows: int = 5
 ):
-    cols, data, can_undo = undo_last_transformation(file.file, session_id, rows)
-    return {"columns": cols, "data": data, "can_undo": can_undo}
+    logger.info(f"/undo called with session_id={session_id}, rows={rows}")
+    try:
+        cols, data, can_undo = await run_blocking(undo_last_transformation, _upload(file), session_id, rows)
+    except WorkerPoolBusy:
+        raise
+    except Exception as e:
+        logger.error(f"/undo error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    return json_response({"columns": cols, "data": data, "can_undo": can_undo})
 
 @app.post("/column_stats")
 async def column_stats_endpoint(
-    file: UploadFile = File(...),
-    session_id: str = Form(None)
+    request: Request,
+    response: Response,
+    file: UploadFile = File(None),
+    session_id: str = Form(None),
+    approximate: bool = Form(False)
 ):
-    stats = get_column_stats(file.file, session_id=session_id)
+    response.headers["Vary"] = "Accept"
+    try:
+        if wants_arrow(request.headers.get("accept")):
+            return _arrow_response(await run_blocking(column_stats_arrow, _upload(file), session_id=session_id, approximate=approximate))
+        stats = await run_blocking(get_column_stats, _upload(file), session_id=session_id, approximate=approximate)
+    except WorkerPoolBusy:
+        raise
+    except Exception as e:
+        logger.error(f"/column_stats error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     return {"stats": stats}
+
+@app.post("/session_memory")
+async def session_memory_endpoint(session_id: str = Form(None)):
+    try:
+        return session_memory(session_id) if session_id else memory_report()
+    except Exception as e:
+        logger.error(f"/session_memory error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/export")
+async def export_endpoint(
+    session_id: str = Form(...),
+    format: str = Form('csv'),
+    chunk_rows: int = EXPORT_CHUNK_ROWS
+):
+    logger.info(f"/export called with session_id={session_id}, format={format}, chunk_rows={chunk_rows}")
+    try:
+        # Materializing a lazy plan or reloading spilled versions is blocking work
+        media_type, filename, chunks = await run_blocking(export_dataset, session_id, format, chunk_rows)
+    except WorkerPoolBusy:
+        raise
+    except Exception as e:
+        logger.error(f"/export error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    # Starlette pulls the chunks from its thread pool, so serialization stays off the event loop
+    return StreamingResponse(chunks, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    summary = history_summary()
+    gauges = {f"dataprepper_{name}": value for name, value in summary.items()}
+    gauges["dataprepper_pending_requests"] = pending()
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/profiles/{profile_id}")
+async def profile_endpoint(profile_id: str):
+    try:
+        return PlainTextResponse(metrics.get_profile(profile_id))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/jobs", status_code=202)
+async def submit_job_endpoint(
+    kind: str = Form(...),
+    session_id: str = Form(...),
+    action: str = Form(None),
+    columns: str = Form('[]'),
+    params: str = Form('{}'),
+    approximate: bool = Form(False),
+    detach: bool = Form(False),
+    rows: int = 5
+):
+    logger.info(f"/jobs called with kind={kind}, session_id={session_id}, action={action}, detach={detach}")
+    try:
+        import json
+        options = {
+            'action': action,
+            'columns': json.loads(columns) if columns.startswith('[') else [columns],
+            'params': json.loads(params) if params else {},
+            'approximate': approximate,
+            'rows': rows,
+        }
+        return submit_job(kind, session_id, options, detach)
+    except WorkerPoolBusy:
+        raise
+    except Exception as e:
+        logger.error(f"/jobs error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+async def job_endpoint(job_id: str):
+    try:
+        return json_response(snapshot(get_job(job_id)))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job_endpoint(job_id: str):
+    try:
+        return cancel_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# Server-Sent Events; closing the stream before the job ends cancels it (unless detached)
+@app.get("/jobs/{job_id}/events")
+async def job_events_endpoint(job_id: str):
+    try:
+        job = get_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return StreamingResponse(sse_events(job), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/jobs/{job_id}/ws")
+async def job_socket(websocket: WebSocket, job_id: str):
+    await serve_socket(websocket, job_id)
@@ -5,6 +5,13 @@ class PreviewResponse(BaseModel):
     columns: List[str]
     data: List[List[Any]]
 
+class PageResponse(BaseModel):
+    columns: List[str]
+    data: List[List[Any]]
+    offset: int
+    limit: int
+    total_rows: int
+
 class ImputeRequest(BaseModel):
     method: str  # 'mean', 'median', 'mode', or 'constant'
     columns: List[str]
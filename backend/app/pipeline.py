@@ -0,0 +1,72 @@
+from typing import List, Optional
+
+from .transforms import apply_steps, needs_fit
+
+# Lazy plans: a list of steps (transforms.make_step) recorded on top of a
+# materialized frame and only run when something needs their result. A preview
+# runs the plan over a growing prefix of the rows until the window is full;
+# stats and exports run the whole plan once, fused (transforms.apply_steps).
+
+# First prefix tried for a preview, as a multiple of the rows requested
+PREVIEW_PREFIX_FACTOR = 4
+PREVIEW_MIN_PREFIX = 1024
+
+def required_columns(steps, available) -> Optional[List[str]]:
+    """Base columns needed to fit every step and decide every filter, or None for all.
+
+    Names are traced back through earlier renames. If a step mentions a column
+    that is not a base column (for example a one-hot output), every column is
+    needed.
+    """
+    needed = set()
+    for i, step in enumerate(steps):
+        action, params = step['action'], step['params']
+        if action not in ('filter', 'dedupe') and not needs_fit(action, params):
+            continue
+        if action == 'dedupe' and not step['columns']:
+            return None
+        names = list(step['columns'])
+        for earlier in reversed(steps[:i]):
+            if earlier['action'] == 'rename':
+                inverse = {new: old for old, new in earlier['params'].get('rename_map', {}).items()}
+                names = [inverse.get(name, name) for name in names]
+        needed.update(names)
+    if not needed <= set(available):
+        return None
+    return [col for col in available if col in needed]
+
+def fit_plan(df, steps, fits=None):
+    """Fit every unfitted step, reading only the columns the fits depend on.
+
+    `fits` is the fit cache of the version `df` is (see transforms.cached_fit).
+    """
+    if all(step['fitted'] is not None or not needs_fit(step['action'], step['params']) for step in steps):
+        return
+    columns = required_columns(steps, df.columns.tolist())
+    if columns is None:
+        apply_steps(df, steps, fits=fits)
+    else:
+        apply_steps(df[columns], steps, partial=True, fits=fits)
+
+def preview_plan(df, steps, rows, fits=None):
+    """First `rows` rows of the plan's output, computed from as few input rows as possible.
+
+    Once every step is fitted, each step decides a row from that row alone
+    (dedupe from the rows before it), so the output's first rows only depend
+    on a prefix of the input.
+    """
+    fit_plan(df, steps, fits)
+    prefix = max(rows * PREVIEW_PREFIX_FACTOR, PREVIEW_MIN_PREFIX)
+    while True:
+        result, _ = apply_steps(df.iloc[:prefix], steps)
+        if len(result) >= rows or prefix >= len(df):
+            return result.head(rows)
+        prefix *= 2
+
+def run_plan(df, steps, indexes=None, progress=None, fits=None):
+    """Run the whole plan; returns the new frame and the columns it changed.
+
+    `indexes` and `fits` are the filter index and fit caches of the version
+    `df` is, if any; `progress` is passed on to apply_steps.
+    """
+    return apply_steps(df, steps, indexes=indexes, progress=progress, fits=fits)
@@ -0,0 +1,306 @@
+import json
+import operator
+import os
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from .metrics import stage, cache_lookup
+
+# Row predicates for filters. A predicate is a condition on one column,
+#   {"column": "Beat", "op": "between", "value": [100, 200]}
+# or a compound of predicates,
+#   {"and": [...]}, {"or": [...]}, {"not": {...}}
+# Values usually arrive as strings from forms and are coerced to the column's
+# type (numbers, dates, booleans, a category's values) before comparing.
+# Missing values never satisfy a condition other than isnull, negated or not:
+# a 'not' is pushed down to the conditions (De Morgan), where it keeps only
+# the rows with a value that fails the condition.
+#
+# Session versions keep an index per filtered column (version['indexes']):
+#   numbers, dates   row positions sorted by value; ranges and equality are
+#                    two binary searches, O(log n + matches)
+#   categories,      row positions grouped by distinct value; a condition
+#   repetitive text  (regex included) is decided once per distinct value
+# Conditions ANDed after an indexed one are only checked on the rows it kept.
+OPS = ('eq', 'ne', 'lt', 'le', 'gt', 'ge', 'between', 'in', 'not_in', 'regex', 'isnull', 'notnull')
+# Text columns with more distinct values than this share of rows are scanned instead
+CODE_INDEX_MAX_RATIO = float(os.environ.get('DATAPREPPER_CODE_INDEX_MAX_RATIO', 0.5))
+
+_COMPARE = {
+    'eq': operator.eq, 'ne': operator.ne,
+    'lt': operator.lt, 'le': operator.le, 'gt': operator.gt, 'ge': operator.ge,
+}
+
+def parse_predicate(expr) -> Dict[str, Any]:
+    """Validate a predicate (a dict, or its JSON text) and return it normalized."""
+    if isinstance(expr, str):
+        expr = json.loads(expr)
+    if not isinstance(expr, dict):
+        raise ValueError("A filter predicate must be a JSON object.")
+    for key in ('and', 'or'):
+        if key in expr:
+            if len(expr) != 1 or not isinstance(expr[key], list) or not expr[key]:
+                raise ValueError(f"'{key}' takes a non-empty list of predicates.")
+            return {key: [parse_predicate(part) for part in expr[key]]}
+    if 'not' in expr:
+        if len(expr) != 1:
+            raise ValueError("'not' takes a single predicate.")
+        return {'not': parse_predicate(expr['not'])}
+    column, op, value = expr.get('column'), expr.get('op', 'eq'), expr.get('value')
+    if not isinstance(column, str):
+        raise ValueError("Each filter condition needs a 'column'.")
+    if op not in OPS:
+        raise ValueError(f"Unknown filter operator: {op}")
+    if op == 'between' and not (isinstance(value, list) and len(value) == 2):
+        raise ValueError("'between' takes a [low, high] value.")
+    if op in ('in', 'not_in') and not isinstance(value, list):
+        raise ValueError(f"'{op}' takes a list of values.")
+    if op not in ('isnull', 'notnull') and value is None:
+        raise ValueError(f"'{op}' on '{column}' needs a value.")
+    if op == 'regex':
+        try:
+            re.compile(value)
+        except re.error as e:
+            raise ValueError(f"Invalid regex for '{column}': {e}")
+    return {'column': column, 'op': op, 'value': value}
+
+def predicate_columns(expr) -> List[str]:
+    """Columns a predicate reads, in order of first mention."""
+    if 'column' in expr:
+        return [expr['column']]
+    parts = [expr['not']] if 'not' in expr else expr.get('and', expr.get('or'))
+    columns = []
+    for part in parts:
+        columns += [col for col in predicate_columns(part) if col not in columns]
+    return columns
+
+def legacy_predicate(column, params) -> Dict[str, Any]:
+    """The predicate for a single-column filter given as value/min_value/max_value/regex."""
+    conditions = [
+        {'column': column, 'op': op, 'value': params[key]}
+        for key, op in (('value', 'eq'), ('min_value', 'ge'), ('max_value', 'le'), ('regex', 'regex'))
+        if params.get(key) is not None
+    ]
+    # An empty 'and' keeps every row
+    return parse_predicate({'and': conditions}) if conditions else {'and': []}
+
+def coerce_value(series, value):
+    """Convert a form value (usually a string) to something comparable with `series`."""
+    if value is None:
+        return None
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return coerce_value(pd.Series(dtype.categories), value) if len(dtype.categories) else value
+    if pd.api.types.is_bool_dtype(dtype):
+        return value.strip().lower() in ('1', 'true', 'yes') if isinstance(value, str) else bool(value)
+    if pd.api.types.is_numeric_dtype(dtype):
+        try:
+            return pd.to_numeric(value)
+        except (ValueError, TypeError):
+            raise ValueError(f"'{value}' is not a number, but column '{series.name}' is numeric.")
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        try:
+            stamp = pd.Timestamp(value)
+        except (ValueError, TypeError):
+            raise ValueError(f"'{value}' is not a date, but column '{series.name}' holds dates.")
+        tz = getattr(dtype, 'tz', None)
+        if tz is not None and stamp.tzinfo is None:
+            stamp = stamp.tz_localize(tz)
+        return stamp
+    if pd.api.types.is_string_dtype(dtype) and not isinstance(value, str):
+        return str(value)
+    return value
+
+def _is_text(series):
+    return pd.api.types.is_string_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype)
+
+def condition_mask(series, condition) -> np.ndarray:
+    """Boolean array of the rows of `series` meeting one condition, by a full scan."""
+    op, value = condition['op'], condition['value']
+    if op == 'isnull':
+        return series.isna().to_numpy()
+    if op == 'notnull':
+        return series.notna().to_numpy()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Decide each category once, then look rows up by code (-1, missing, never matches)
+        hits = condition_mask(pd.Series(series.cat.categories), condition)
+        return np.append(hits, False)[series.cat.codes.to_numpy()]
+    present = series.notna()
+    if op == 'regex':
+        text = series if _is_text(series) else series.astype(str)
+        result = text.str.contains(value, na=False)
+    elif op in ('in', 'not_in'):
+        result = series.isin([coerce_value(series, item) for item in value])
+        if op == 'not_in':
+            result = ~result
+    elif op == 'between':
+        low, high = (coerce_value(series, item) for item in value)
+        result = (series >= low) & (series <= high)
+    else:
+        result = _COMPARE[op](series, coerce_value(series, value))
+    return (result & present).to_numpy(dtype=bool, na_value=False)
+
+class SortedIndex:
+    """Row positions ordered by value: range and equality lookups by binary search."""
+
+    def __init__(self, series):
+        values = series.to_numpy()
+        # NaN and NaT sort last
+        self.order = np.argsort(values, kind='stable')
+        present = int(series.notna().sum())
+        self.values = values[self.order[:present]]
+        self.present = present
+        self.empty = series.iloc[:0]
+
+    def _range(self, low, high, low_side='left', high_side='right'):
+        start = 0 if low is None else np.searchsorted(self.values, self._key(low), side=low_side)
+        stop = self.present if high is None else np.searchsorted(self.values, self._key(high), side=high_side)
+        return self.order[start:max(start, stop)]
+
+    def _key(self, value):
+        value = coerce_value(self.empty, value)
+        if isinstance(value, pd.Timestamp):
+            value = value.to_datetime64()
+        # A key of another dtype would make searchsorted convert the whole array
+        try:
+            key = np.asarray(value, dtype=self.values.dtype)
+        except (OverflowError, ValueError, TypeError):
+            return value
+        return key if key == value else value
+
+    def select(self, condition) -> Optional[np.ndarray]:
+        """Sorted positions of the rows meeting `condition`, or None if the index cannot tell."""
+        op, value = condition['op'], condition['value']
+        if op == 'isnull':
+            found = self.order[self.present:]
+        elif op == 'notnull':
+            found = self.order[:self.present]
+        elif op == 'eq':
+            found = self._range(value, value)
+        elif op == 'in':
+            found = np.concatenate([self._range(item, item) for item in value] or [np.array([], dtype=np.int64)])
+            found = np.unique(found)
+        elif op == 'between':
+            found = self._range(value[0], value[1])
+        elif op in ('lt', 'le'):
+            found = self._range(None, value, high_side='left' if op == 'lt' else 'right')
+        elif op in ('gt', 'ge'):
+            found = self._range(value, None, low_side='right' if op == 'gt' else 'left')
+        else:
+            return None
+        return np.sort(found)
+
+class CodeIndex:
+    """Row positions grouped by distinct value; conditions are decided per value."""
+
+    def __init__(self, codes, uniques):
+        self.order = np.argsort(codes, kind='stable')
+        # Rows with code c are order[bounds[c + 1]:bounds[c + 2]]; code -1 is missing
+        self.bounds = np.searchsorted(codes[self.order], np.arange(-1, len(uniques) + 1))
+        self.uniques = uniques
+
+    def select(self, condition) -> Optional[np.ndarray]:
+        op = condition['op']
+        if op == 'isnull':
+            return np.sort(self.order[:self.bounds[1]])
+        if op == 'notnull':
+            return np.sort(self.order[self.bounds[1]:])
+        hits = np.flatnonzero(condition_mask(self.uniques, condition))
+        found = [self.order[self.bounds[code + 1]:self.bounds[code + 2]] for code in hits]
+        return np.sort(np.concatenate(found)) if found else np.array([], dtype=np.int64)
+
+def build_index(series):
+    """The index that serves `series` best, or None if a scan is as good."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return CodeIndex(series.cat.codes.to_numpy(), pd.Series(dtype.categories))
+    if isinstance(dtype, np.dtype) and dtype.kind in 'iufM':
+        return SortedIndex(series)
+    codes, uniques = pd.factorize(series)
+    if len(uniques) > CODE_INDEX_MAX_RATIO * max(len(series), 1):
+        return None
+    return CodeIndex(codes, pd.Series(uniques, dtype=dtype, name=series.name))
+
+class Selection:
+    """Rows a predicate keeps: sorted row positions, or a boolean mask over all rows."""
+
+    def __init__(self, n_rows, positions=None, mask=None):
+        self.n_rows = n_rows
+        self.positions = positions
+        self.mask = mask
+
+    def to_mask(self) -> np.ndarray:
+        if self.mask is not None:
+            return self.mask
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.positions] = True
+        return mask
+
+    def to_positions(self) -> np.ndarray:
+        return self.positions if self.positions is not None else np.flatnonzero(self.mask)
+
+def select_rows(expr, columns, n_rows, indexes=None, indexed=(), within=None) -> Selection:
+    """Rows of `columns` (name -> Series) that meet `expr`.
+
+    `indexes` caches one index per column (built on first use) and is only
+    consulted for the columns named in `indexed`. With `within` (sorted row
+    positions), only those rows are looked at.
+    """
+    if 'and' in expr:
+        selection = Selection(n_rows, positions=within) if within is not None else None
+        # Indexed conditions first, so the rest only check the rows those kept
+        parts = sorted(expr['and'], key=lambda part: part.get('column') not in indexed)
+        for part in parts:
+            inner = selection.positions if selection is not None else None
+            found = select_rows(part, columns, n_rows, indexes, indexed, inner)
+            if selection is None or inner is not None:
+                selection = found
+            elif found.positions is not None:
+                selection = Selection(n_rows, positions=found.positions[selection.mask[found.positions]])
+            else:
+                selection = Selection(n_rows, mask=selection.mask & found.mask)
+            if selection.positions is not None and len(selection.positions) == 0:
+                break
+        if selection is None:
+            return Selection(n_rows, mask=np.ones(n_rows, dtype=bool))
+        return selection
+    if 'or' in expr:
+        found = [select_rows(part, columns, n_rows, indexes, indexed, within) for part in expr['or']]
+        if all(part.positions is not None for part in found):
+            return Selection(n_rows, positions=np.unique(np.concatenate([part.positions for part in found])))
+        return Selection(n_rows, mask=np.logical_or.reduce([part.to_mask() for part in found]))
+    if 'not' in expr:
+        inner = expr['not']
+        if 'not' in inner:
+            return select_rows(inner['not'], columns, n_rows, indexes, indexed, within)
+        for key, flipped in (('and', 'or'), ('or', 'and')):
+            if key in inner:
+                negated = {flipped: [{'not': part} for part in inner[key]]}
+                return select_rows(negated, columns, n_rows, indexes, indexed, within)
+        if inner['op'] in ('isnull', 'notnull'):
+            flipped = {**inner, 'op': 'notnull' if inner['op'] == 'isnull' else 'isnull'}
+            return select_rows(flipped, columns, n_rows, indexes, indexed, within)
+        found = select_rows(inner, columns, n_rows, indexes, indexed, within)
+        series = columns[inner['column']]
+        if within is not None:
+            rest = np.setdiff1d(within, found.positions, assume_unique=True)
+            return Selection(n_rows, positions=rest[series.iloc[rest].notna().to_numpy()])
+        return Selection(n_rows, mask=~found.to_mask() & series.notna().to_numpy())
+    column = expr['column']
+    if column not in columns:
+        raise ValueError(f"Unknown filter column: {column}")
+    series = columns[column]
+    if within is not None:
+        # Checking the rows kept so far beats any index lookup
+        return Selection(n_rows, positions=within[condition_mask(series.iloc[within], expr)])
+    if indexes is not None and column in indexed:
+        cache_lookup('index', column in indexes)
+        if column not in indexes:
+            with stage('build_index'):
+                indexes[column] = build_index(series)
+        index = indexes[column]
+        found = index.select(expr) if index is not None else None
+        if found is not None:
+            return Selection(n_rows, positions=found)
+    return Selection(n_rows, mask=condition_mask(series, expr))
@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any
+
+# Upper bound on the float64 scratch matrix built for one batch of numeric
+# columns. Wide frames are profiled in several batches of columns.
+PROFILE_BATCH_BYTES = 256 * 1024 * 1024
+
+HISTOGRAM_BINS = 20
+TOP_VALUE_COUNTS = 20
+
+def profile_columns(df, columns=None, progress=None) -> Dict[str, Dict[str, Any]]:
+    """Compute the /column_stats payload for `columns` (default: all columns of `df`).
+
+    Numeric columns are profiled together: each batch is copied once into a
+    float64 matrix, sorted row-wise, and every metric (count, unique, median,
+    min/max, mode frequency, histogram, mean/std, outliers) is read off the
+    sorted matrix with array operations. Sparse columns are profiled from
+    their stored values and fill count, without densifying. Other columns get
+    one hash-based value_counts pass each.
+
+    `progress`, if given, is called with the stats of each column or numeric
+    batch as soon as they are done.
+    """
+    if columns is None:
+        columns = df.columns.tolist()
+    n_rows = len(df)
+    profiled = {}
+    done = progress or (lambda stats: None)
+    for col in columns:
+        if isinstance(df[col].dtype, pd.SparseDtype):
+            profiled[col] = _profile_sparse(df[col], n_rows)
+            done({col: profiled[col]})
+    numeric = [col for col in columns if col not in profiled and pd.api.types.is_numeric_dtype(df[col])]
+    if numeric:
+        batch_size = max(1, PROFILE_BATCH_BYTES // max(n_rows * 8, 1))
+        for start in range(0, len(numeric), batch_size):
+            batch = numeric[start:start + batch_size]
+            stats = _profile_numeric_batch(df, batch, n_rows)
+            profiled.update(stats)
+            done(stats)
+    for col in columns:
+        if col not in profiled:
+            profiled[col] = _profile_categorical(df[col], n_rows)
+            done({col: profiled[col]})
+    # Keep the frame's column order in the response
+    return {col: profiled[col] for col in columns}
+
+def _profile_numeric_batch(df, columns, n_rows):
+    values = np.empty((len(columns), n_rows), dtype=np.float64)
+    for i, col in enumerate(columns):
+        values[i] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sums = np.where(valid, values, 0.0).sum(axis=1)
+        means = sums / counts
+        sq_dev = np.where(valid, (values - means[:, None]) ** 2, 0.0).sum(axis=1)
+        stds = np.where(counts > 1, np.sqrt(sq_dev / (counts - 1)), np.nan)
+        outlier_hits = (np.abs(values - means[:, None]) > 3 * stds[:, None]).sum(axis=1)
+    # NaN sorts to the end of each row, so the first counts[i] entries are the values
+    values.sort(axis=1)
+    stats = {}
+    for i, col in enumerate(columns):
+        count = int(counts[i])
+        ordered = values[i, :count]
+        if count:
+            boundaries = np.flatnonzero(ordered[1:] != ordered[:-1]) + 1
+            unique = len(boundaries) + 1
+            runs = np.diff(np.concatenate(([0], boundaries, [count])))
+            largest_run = int(runs.max())
+            median = float((ordered[(count - 1) // 2] + ordered[count // 2]) / 2)
+        else:
+            unique = 0
+            largest_run = 0
+            median = None
+        # value_counts(dropna=False) counts NaN as its own value
+        most_common = max(largest_run, n_rows - count)
+        col_stats = {
+            'count': count,
+            'missing_pct': float((n_rows - count) / n_rows * 100) if n_rows else 0.0,
+            'unique': unique,
+        }
+        col_stats.update({
+            'mean': float(means[i]) if count else None,
+            'median': median,
+            'std': float(stds[i]) if count else None,
+            'min': float(ordered[0]) if count else None,
+            'max': float(ordered[-1]) if count else None,
+        })
+        col_stats['histogram'] = _sorted_histogram(ordered)
+        outlier_risk = float(outlier_hits[i] / count) if count and stds[i] > 0 else 0.0
+        stats[col] = _with_issues(col_stats, n_rows, most_common, unique, outlier_risk)
+    return stats
+
+def _profile_sparse(col_data, n_rows):
+    """The numeric profile of a sparse column, from its distinct values and their counts."""
+    array = col_data.array
+    stored = np.asarray(array.sp_values, dtype=np.float64)
+    values, counts = np.unique(stored[~np.isnan(stored)], return_counts=True)
+    fill = float(array.fill_value)
+    n_fill = n_rows - len(stored)
+    if n_fill and not np.isnan(fill):
+        position = np.searchsorted(values, fill)
+        if position < len(values) and values[position] == fill:
+            counts[position] += n_fill
+        else:
+            values = np.insert(values, position, fill)
+            counts = np.insert(counts, position, n_fill)
+    count = int(counts.sum())
+    col_stats = {
+        'count': count,
+        'missing_pct': float((n_rows - count) / n_rows * 100) if n_rows else 0.0,
+        'unique': len(values),
+    }
+    outlier_risk = 0.0
+    if count:
+        mean = float((values * counts).sum() / count)
+        std = float(np.sqrt((counts * (values - mean) ** 2).sum() / (count - 1))) if count > 1 else np.nan
+        cumulative = np.cumsum(counts)
+        # Same as the sorted-array median: average the two middle positions
+        middle = np.searchsorted(cumulative, [(count - 1) // 2 + 1, count // 2 + 1])
+        col_stats.update({
+            'mean': mean,
+            'median': float(values[middle].mean()),
+            'std': std,
+            'min': float(values[0]),
+            'max': float(values[-1]),
+        })
+        if std > 0:
+            outlier_risk = float(counts[np.abs(values - mean) > 3 * std].sum() / count)
+        largest_run = int(counts.max())
+    else:
+        col_stats.update({'mean': None, 'median': None, 'std': None, 'min': None, 'max': None})
+        largest_run = 0
+    col_stats['histogram'] = _weighted_histogram(values, counts)
+    most_common = max(largest_run, n_rows - count)
+    return _with_issues(col_stats, n_rows, most_common, len(values), outlier_risk)
+
+def _weighted_histogram(values, counts):
+    """np.histogram of data given as sorted distinct values and their counts."""
+    if len(values) == 0 or not (np.isfinite(values[0]) and np.isfinite(values[-1])):
+        return {'bin_edges': [], 'counts': []}
+    first, last = float(values[0]), float(values[-1])
+    if first == last:
+        first, last = first - 0.5, last + 0.5
+    edges = np.linspace(first, last, HISTOGRAM_BINS + 1)
+    binned, _ = np.histogram(values, bins=edges, weights=counts)
+    return {'bin_edges': edges.tolist(), 'counts': binned.astype(np.int64).tolist()}
+
+def _sorted_histogram(ordered):
+    """np.histogram(ordered, bins=20) for already sorted, NaN-free data."""
+    if len(ordered) == 0:
+        return {'bin_edges': [], 'counts': []}
+    first, last = float(ordered[0]), float(ordered[-1])
+    if not (np.isfinite(first) and np.isfinite(last)):
+        return {'bin_edges': [], 'counts': []}
+    if first == last:
+        first, last = first - 0.5, last + 0.5
+    edges = np.linspace(first, last, HISTOGRAM_BINS + 1)
+    # Bins are half-open except the last, which includes its right edge
+    positions = np.searchsorted(ordered, edges[:-1], side='left')
+    counts = np.diff(np.append(positions, len(ordered)))
+    return {'bin_edges': edges.tolist(), 'counts': counts.tolist()}
+
+def _profile_categorical(col_data, n_rows):
+    value_counts = col_data.value_counts(dropna=False)
+    is_missing = value_counts.index.isna()
+    # Categories filtered out of the frame still get a zero count; drop them
+    # before picking the top values but keep the missing entry
+    value_counts = value_counts[(value_counts > 0) | is_missing]
+    is_missing = value_counts.index.isna()
+    missing = int(value_counts[is_missing].sum())
+    present = value_counts[~is_missing]
+    count = n_rows - missing
+    unique = len(present)
+    top = _mode(present, col_data.dtype)
+    col_stats = {
+        'count': count,
+        'missing_pct': float(missing / n_rows * 100) if n_rows else 0.0,
+        'unique': unique,
+    }
+    col_stats.update({
+        'top': str(top) if top is not None else None,
+        'freq': int(present[top]) if top is not None else 0,
+    })
+    col_stats['value_counts'] = [
+        {'value': str(idx), 'count': int(cnt)} for idx, cnt in value_counts.head(TOP_VALUE_COUNTS).items()
+    ]
+    most_common = int(value_counts.iloc[0]) if not value_counts.empty else 0
+    return _with_issues(col_stats, n_rows, most_common, unique, None)
+
+def _mode(present, dtype):
+    """Series.mode()[0]: the most frequent value, ties broken by sort order."""
+    if present.empty:
+        return None
+    candidates = present.index[present == present.max()]
+    if isinstance(dtype, pd.CategoricalDtype):
+        return min(candidates, key=dtype.categories.get_loc)
+    try:
+        return sorted(candidates)[0]
+    except TypeError:
+        return candidates[0]
+
+def _with_issues(col_stats, n_rows, most_common, unique, outlier_risk):
+    """Attach data_issues scores and recommendations to a column's stats."""
+    data_issues = {}
+    recommendations = []
+    missingness = float((n_rows - col_stats['count']) / n_rows) if n_rows else 0.0
+    data_issues['missing'] = missingness
+    if missingness > 0.5:
+        recommendations.append('Consider dropping this column due to excessive missing data.')
+    elif 0.1 < missingness <= 0.5:
+        recommendations.append('Consider imputing missing values.')
+    most_common_pct = float(most_common / n_rows) if n_rows else 0.0
+    data_issues['constant'] = most_common_pct
+    if most_common_pct > 0.95:
+        recommendations.append('Consider dropping this column as it is nearly constant.')
+    cardinality = float(unique / n_rows) if n_rows else 0.0
+    data_issues['high_cardinality'] = cardinality
+    if cardinality > 0.8:
+        recommendations.append('Consider dropping or encoding this column due to high cardinality.')
+    data_issues['outlier'] = outlier_risk
+    if outlier_risk is not None and outlier_risk > 0.1:
+        recommendations.append('Consider scaling or transforming this column due to high outlier risk.')
+    col_stats['data_issues'] = data_issues
+    col_stats['recommendations'] = recommendations
+    return col_stats
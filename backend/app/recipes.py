@@ -0,0 +1,74 @@
+import json
+import threading
+from typing import Dict, List, Any
+
+from .transforms import make_step, dump_fitted, load_fitted
+
+# Saved recipes: name -> list of {'action', 'columns', 'params'} specs. By
+# default only the specs are kept, so a recipe refits on every dataset it is
+# replayed on. A spec may also hold 'fitted': the parameters (fill values,
+# scaler ranges, category vocabularies) of the run it was saved from, as
+# plain JSON (see transforms.dump_fitted). Replays then apply those in one
+# pass, so new batches of the same schema are transformed exactly like the
+# first one.
+recipes: Dict[str, List[Dict[str, Any]]] = {}
+_recipes_lock = threading.Lock()
+
+def parse_recipe(recipe) -> List[Dict[str, Any]]:
+    """Validate a recipe (a JSON string or a list of step dicts) into a list of specs."""
+    if isinstance(recipe, str):
+        recipe = json.loads(recipe)
+    if not isinstance(recipe, list) or not recipe:
+        raise ValueError("A recipe is a non-empty list of steps.")
+    specs = []
+    for i, step in enumerate(recipe):
+        if not isinstance(step, dict) or 'action' not in step:
+            raise ValueError(f"Recipe step {i} needs an 'action'.")
+        columns = step.get('columns') or []
+        if isinstance(columns, str):
+            columns = [columns]
+        params = step.get('params') or {}
+        spec = {'action': step['action'], 'columns': list(columns), 'params': dict(params)}
+        try:
+            make_step(step['action'], columns, params)
+            if step.get('fitted') is not None:
+                load_fitted(step['action'], columns, params, step['fitted'])
+                spec['fitted'] = step['fitted']
+        except ValueError as e:
+            raise ValueError(f"Recipe step {i}: {e}")
+        specs.append(spec)
+    return specs
+
+def recipe_steps(specs):
+    """Fresh steps for one replay of a recipe; unfitted unless the specs hold fitted parameters."""
+    return [
+        make_step(spec['action'], spec['columns'], spec['params'], fitted_step(spec))
+        for spec in specs
+    ]
+
+def fitted_step(spec):
+    """A spec's saved parameters in the form apply_steps takes, or None."""
+    if spec.get('fitted') is None:
+        return None
+    return load_fitted(spec['action'], spec['columns'], spec['params'], spec['fitted'])
+
+def fitted_specs(specs, steps):
+    """`specs` with the fitted parameters of `steps`, the steps they ran as."""
+    return [
+        dict(spec, fitted=dump_fitted(step['action'], step['fitted'])) if step['fitted'] is not None else spec
+        for spec, step in zip(specs, steps)
+    ]
+
+def save_recipe(name, specs):
+    with _recipes_lock:
+        recipes[name] = specs
+
+def get_recipe(name):
+    with _recipes_lock:
+        if name not in recipes:
+            raise ValueError(f"Unknown recipe: {name}")
+        return recipes[name]
+
+def list_recipes():
+    with _recipes_lock:
+        return dict(recipes)
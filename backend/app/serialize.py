@@ -0,0 +1,83 @@
+import json
+import numpy as np
+import pandas as pd
+from fastapi import Response
+from .metrics import stage
+
+# JSON bodies for row previews, written column by column. Each column becomes
+# a list of JSON-ready Python values in one vectorized step (NaN, inf and NaT
+# turn into None on the way), rows are zipped from those lists and encoded
+# once. The rendered rows are spliced into the response body as they are, so
+# the frame is never copied for sanitizing and no cell goes through response
+# model validation or jsonable_encoder.
+
+class RawJSON(str):
+    """Already-encoded JSON text, spliced into json_response bodies unchanged."""
+
+def _fallback(value):
+    # Cells json cannot encode natively (numpy scalars, Timestamps in object columns, ...)
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+def dumps(value):
+    # Same settings as Starlette's JSONResponse
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(',', ':'), default=_fallback)
+
+def _with_nulls(values, missing):
+    """`values` (a list) with None at every position `missing` marks."""
+    for position in np.flatnonzero(missing):
+        values[position] = None
+    return values
+
+def column_values(series):
+    """A column as a list of JSON-ready values, with None for NaN, inf and NaT."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.SparseDtype):
+        series = series.sparse.to_dense()
+        dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Convert each category once, then pick by code; code -1 (missing) picks the trailing None
+        categories = column_values(pd.Series(dtype.categories)) + [None]
+        lookup = np.empty(len(categories), dtype=object)
+        lookup[:] = categories
+        return lookup[series.cat.codes.to_numpy()].tolist()
+    # Plain numpy columns; nullable and Arrow-backed extension dtypes take the object path
+    numpy_kind = dtype.kind if isinstance(dtype, np.dtype) else None
+    if numpy_kind in ('b', 'i', 'u'):
+        return series.to_numpy().tolist()
+    if numpy_kind == 'f':
+        array = series.to_numpy()
+        return _with_nulls(array.tolist(), ~np.isfinite(array))
+    if numpy_kind == 'M':
+        array = series.to_numpy().astype('datetime64[us]')
+        missing = np.isnat(array)
+        # Whole seconds print like Timestamp.isoformat(), without a fraction
+        unit = 's' if ((array.view(np.int64) % 1_000_000 == 0) | missing).all() else 'us'
+        return _with_nulls(np.datetime_as_string(array, unit=unit).tolist(), missing)
+    array = series.to_numpy(dtype=object, na_value=None)
+    missing = pd.isna(array)
+    if dtype == object:
+        # Mixed object columns can still hold float infinities
+        missing |= (array == np.inf) | (array == -np.inf)
+    return _with_nulls(array.tolist(), missing)
+
+def rows_json(frame: pd.DataFrame) -> RawJSON:
+    """The frame's rows as an encoded JSON array of arrays."""
+    if len(frame.columns) == 0:
+        return RawJSON(dumps([[]] * len(frame)))
+    with stage('sanitize'):
+        columns = [column_values(frame.iloc[:, i]) for i in range(len(frame.columns))]
+    with stage('serialize'):
+        return RawJSON(dumps(list(zip(*columns))))
+
+def json_response(content: dict, status_code: int = 200, headers=None) -> Response:
+    """A JSON response for `content`; RawJSON values are inserted without re-encoding."""
+    parts = [
+        f"{dumps(key)}:{value if isinstance(value, RawJSON) else dumps(value)}"
+        for key, value in content.items()
+    ]
+    body = '{' + ','.join(parts) + '}'
+    return Response(content=body.encode('utf-8'), status_code=status_code, headers=headers, media_type='application/json')
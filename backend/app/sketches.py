@@ -0,0 +1,308 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any
+
+from .profiling import HISTOGRAM_BINS, TOP_VALUE_COUNTS, _mode, _with_issues
+
+# Approximate /column_stats for very large columns. Each column gets one pass
+# of small, mergeable sketches instead of sorts and full value_counts:
+#   HyperLogLog       distinct count (relative standard error 1.04 / sqrt(2**p))
+#   KLL               median, histogram and outlier share (rank error ~ 2.3 / k**0.97)
+#   Misra-Gries       top values and the mode of non-numeric columns (counts
+#                     are lower bounds, short by at most `count_error`);
+#                     numeric columns read their mode frequency off the KLL
+# Counts, missing values, min/max, mean and std stay exact. Sketches of
+# different row ranges (chunks, spill files, workers) merge into the sketch of
+# their union, so a column is never needed whole in memory.
+HLL_PRECISION = 14
+KLL_K = 256
+FREQUENT_CAPACITY = 1024
+SKETCH_CHUNK_ROWS = 1_000_000
+
+def _bit_length(values):
+    """Bit length of each uint64, exactly (float64 holds 32-bit halves without rounding)."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+class HyperLogLog:
+    def __init__(self, p=HLL_PRECISION):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, hashes):
+        """Add 64-bit hashes of values."""
+        if not len(hashes):
+            return
+        tail_bits = 64 - self.p
+        buckets = (hashes >> np.uint64(tail_bits)).astype(np.intp)
+        tails = hashes & np.uint64((1 << tail_bits) - 1)
+        ranks = (tail_bits - _bit_length(tails) + 1).astype(np.intp)
+        # Per-bucket maximum rank via one bincount over (bucket, rank) pairs
+        seen = np.bincount(buckets * 64 + ranks, minlength=len(self.registers) * 64).reshape(-1, 64) > 0
+        highest = np.where(seen.any(axis=1), 63 - np.argmax(seen[:, ::-1], axis=1), 0)
+        np.maximum(self.registers, highest.astype(np.uint8), out=self.registers)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    def relative_error(self):
+        return 1.04 / np.sqrt(len(self.registers))
+
+class KLLSketch:
+    """Karnin-Lang-Liberty quantile sketch: items at level h stand for 2**h values."""
+
+    def __init__(self, k=KLL_K, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        while True:
+            over = [h for h, level in enumerate(self.levels) if len(level) > self._capacity(h)]
+            if not over:
+                return
+            h = over[0]
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            level = np.sort(self.levels[h])
+            # An odd item out stays behind; of each sorted pair one survives, at double weight
+            odd = len(level) % 2
+            offset = int(self._rng.integers(2))
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], level[odd + offset::2]])
+            self.levels[h] = level[:odd]
+
+    def update(self, values):
+        """Add NaN-free float64 values."""
+        if not len(values):
+            return
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self._compress()
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        if not self.n:
+            return None
+        items, cumulative = self._weighted()
+        position = min(int(np.searchsorted(cumulative, q * cumulative[-1])), len(items) - 1)
+        return float(min(max(items[position], self.min), self.max))
+
+    def rank(self, values, inclusive=False):
+        """Estimated number of values below (or at most) each of `values`."""
+        items, cumulative = self._weighted()
+        positions = np.searchsorted(items, values, side='right' if inclusive else 'left')
+        return np.where(positions > 0, cumulative[np.maximum(positions - 1, 0)], 0.0)
+
+    def largest_run(self):
+        """Estimated count of the most frequent value."""
+        if not self.n:
+            return 0
+        items, cumulative = self._weighted()
+        last = np.flatnonzero(np.append(items[1:] != items[:-1], True))
+        per_value = np.diff(np.concatenate(([0.0], cumulative[last])))
+        return int(per_value.max())
+
+    def rank_error(self):
+        # Normalized rank error of KLL at 99% confidence (Apache DataSketches' fit)
+        return 2.296 / self.k ** 0.9723
+
+class FrequentItems:
+    """Misra-Gries summary: counts of at most `capacity` values, each short by at most `error`."""
+
+    def __init__(self, capacity=FREQUENT_CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.float64)
+        self.error = 0.0
+
+    def add(self, counts):
+        """Add value counts (a Series indexed by value) of more rows."""
+        merged = counts if self.counts.empty else self.counts.add(counts, fill_value=0)
+        if len(merged) > self.capacity:
+            merged = merged.sort_values(ascending=False, kind='stable')
+            cut = float(merged.iloc[self.capacity])
+            merged = merged.iloc[:self.capacity] - cut
+            merged = merged[merged > 0]
+            self.error += cut
+        self.counts = merged
+
+    def merge(self, other):
+        self.error += other.error
+        self.add(other.counts)
+
+def _merge_moments(count, mean, m2, other_count, other_mean, other_m2):
+    """Chan et al. pairwise update of (count, mean, sum of squared deviations)."""
+    total = count + other_count
+    if not total:
+        return 0, 0.0, 0.0
+    delta = other_mean - mean
+    return total, mean + delta * other_count / total, m2 + other_m2 + delta ** 2 * count * other_count / total
+
+class ColumnSketch:
+    """All sketches of one column; update() with chunks, merge() with sketches of other rows."""
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self.numeric = pd.api.types.is_numeric_dtype(dtype)
+        self.rows = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.distinct = HyperLogLog()
+        self.frequent = None if self.numeric else FrequentItems()
+        self.quantiles = KLLSketch() if self.numeric else None
+
+    def update(self, series):
+        self.rows += len(series)
+        present = series.dropna()
+        if not len(present):
+            return
+        if self.numeric:
+            self.distinct.update(pd.util.hash_pandas_object(present, index=False).to_numpy())
+            values = present.to_numpy(dtype=np.float64)
+            self.quantiles.update(values)
+            mean = float(values.mean())
+            self.count, self.mean, self.m2 = _merge_moments(
+                self.count, self.mean, self.m2, len(values), mean, float(((values - mean) ** 2).sum())
+            )
+        else:
+            counts = present.value_counts()
+            counts = counts[counts > 0]
+            # Repeats do not change a HyperLogLog, so hashing each distinct value once is enough
+            self.distinct.update(pd.util.hash_pandas_object(counts.index.to_series(), index=False).to_numpy())
+            self.frequent.add(counts.astype(np.float64))
+            self.count += len(present)
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.distinct.merge(other.distinct)
+        if self.numeric:
+            self.quantiles.merge(other.quantiles)
+            self.count, self.mean, self.m2 = _merge_moments(
+                self.count, self.mean, self.m2, other.count, other.mean, other.m2
+            )
+        else:
+            self.frequent.merge(other.frequent)
+            self.count += other.count
+        return self
+
+    def stats(self) -> Dict[str, Any]:
+        """The column's /column_stats entry, with error bounds under 'approximate'."""
+        n_rows, count = self.rows, self.count
+        missing = n_rows - count
+        # Never report more distinct values than there are values
+        unique = min(int(round(self.distinct.estimate())), count)
+        col_stats = {
+            'count': count,
+            'missing_pct': float(missing / n_rows * 100) if n_rows else 0.0,
+            'unique': unique,
+        }
+        outlier_risk = None
+        if self.numeric:
+            most_common = max(self.quantiles.largest_run(), missing)
+            # A value's count is a difference of two ranks
+            count_error = int(np.ceil(2 * self.quantiles.rank_error() * count))
+            std = float(np.sqrt(self.m2 / (count - 1))) if count > 1 else np.nan
+            col_stats.update({
+                'mean': self.mean if count else None,
+                'median': self.quantiles.quantile(0.5),
+                'std': std if count else None,
+                'min': self.quantiles.min if count else None,
+                'max': self.quantiles.max if count else None,
+            })
+            col_stats['histogram'] = self._histogram()
+            outlier_risk = 0.0
+            if count and std > 0:
+                low = self.quantiles.rank(np.array([self.mean - 3 * std]))[0]
+                high = self.quantiles.rank(np.array([self.mean + 3 * std]), inclusive=True)[0]
+                outlier_risk = float((low + count - high) / count)
+        else:
+            counts = self.frequent.counts
+            top = _mode(counts, self.dtype)
+            most_common = max(int(counts.max()) if len(counts) else 0, missing)
+            count_error = int(np.ceil(self.frequent.error))
+            col_stats.update({
+                'top': str(top) if top is not None else None,
+                'freq': int(counts[top]) if top is not None else 0,
+            })
+            entries = [(str(value), int(cnt)) for value, cnt in counts.items()]
+            if missing:
+                entries.append((str(np.nan), missing))
+            entries.sort(key=lambda entry: -entry[1])
+            col_stats['value_counts'] = [{'value': value, 'count': cnt} for value, cnt in entries[:TOP_VALUE_COUNTS]]
+        col_stats['approximate'] = {
+            'unique_relative_error': float(self.distinct.relative_error()),
+            'rank_error': self.quantiles.rank_error() if self.numeric else None,
+            'count_error': count_error,
+        }
+        return _with_issues(col_stats, n_rows, most_common, unique, outlier_risk)
+
+    def _histogram(self):
+        sketch = self.quantiles
+        if not sketch.n or not (np.isfinite(sketch.min) and np.isfinite(sketch.max)):
+            return {'bin_edges': [], 'counts': []}
+        first, last = sketch.min, sketch.max
+        if first == last:
+            first, last = first - 0.5, last + 0.5
+        edges = np.linspace(first, last, HISTOGRAM_BINS + 1)
+        # Same bins as np.histogram: half-open except the last
+        below = np.append(sketch.rank(edges[:-1]), sketch.n)
+        counts = np.diff(np.round(below)).astype(np.int64)
+        return {'bin_edges': edges.tolist(), 'counts': counts.tolist()}
+
+def sketch_columns(df, columns=None, sketches=None, progress=None) -> Dict[str, ColumnSketch]:
+    """Fold `df` into per-column sketches (new ones, or `sketches` to extend).
+
+    Sketches are filled in place, so `sketches` must not be a dict other
+    threads read from (see crud._cached_stats).
+
+    `progress`, if given, is called with each column name once its sketch is complete.
+    """
+    if columns is None:
+        columns = df.columns.tolist()
+    sketches = {} if sketches is None else sketches
+    for col in columns:
+        sketch = sketches.setdefault(col, ColumnSketch(df[col].dtype))
+        for start in range(0, max(len(df), 1), SKETCH_CHUNK_ROWS):
+            sketch.update(df[col].iloc[start:start + SKETCH_CHUNK_ROWS])
+        if progress:
+            progress(col)
+    return sketches
+
+def approximate_profile(df, columns=None) -> Dict[str, Dict[str, Any]]:
+    """profile_columns, approximately, from sketches."""
+    return {col: sketch.stats() for col, sketch in sketch_columns(df, columns).items()}
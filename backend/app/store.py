@@ -0,0 +1,589 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, List, Any
+
+from .backends import make_backend
+from .transforms import densify, sparsify
+
+# Frames are handed out as shallow copies; copy-on-write keeps a caller's
+# column edits from leaking back into a stored version.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Version history: session_id -> list of versions, oldest first. versions[0]
+# is the parsed upload. Each version is a dict with
+#   'id':      unique version id (never reused after undo, unique across workers)
+#   'data':    column name -> Series; unchanged columns are the parent's objects
+#   'frame':   DataFrame assembled from 'data' without copying
+#   'changed': columns this step added or rewrote (None for the upload)
+#   'stats':   column name -> /column_stats entry, filled in lazily
+#   'sketches': column name -> sketches.ColumnSketch for approximate stats, filled in lazily
+#   'sorted':  (column, ascending) -> row positions in sort order, filled in lazily
+#   'indexes': column name -> filter index (predicates.py), or None if scanning is as fast, filled in lazily
+#   'fits':    transforms.fit_key -> one column's fitted step parameters, filled in lazily
+#   'steps':   steps (transforms.make_step) a lazy plan fused into this version
+#   'nbytes':  column name -> bytes held by that column's Series
+#   'spill':   path of the version's Arrow IPC spill file, once written
+#   'remote':  the version's manifest entry in a shared backend (see backends.py)
+# A cold version (any but the current one) may be spilled: 'data' and 'frame'
+# are then None until it is needed again and memory-mapped back in. With a
+# shared backend this process holds a cache of each session: versions written
+# by other workers arrive with 'data' None and are read from the backend when
+# needed.
+sessions: Dict[str, List[Dict[str, Any]]] = {}
+
+# Pending steps of lazy sessions, not yet run: session_id -> list of steps.
+# Only sessions created with lazy=True have an entry.
+plans: Dict[str, List[Dict[str, Any]]] = {}
+
+# Bytes of resident version data allowed across all sessions (0 disables the budget).
+# Over budget, cold versions are spilled first, least recently used sessions
+# first; if that is not enough, whole sessions are dropped in the same order.
+MEMORY_BUDGET = int(os.environ.get('DATAPREPPER_MEMORY_BUDGET', 2 * 1024 ** 3))
+# Sessions idle for longer than this many seconds are dropped (0 keeps them forever)
+SESSION_TTL = float(os.environ.get('DATAPREPPER_SESSION_TTL', 4 * 3600))
+VERSION_SPILL_DIR = os.environ.get(
+    'DATAPREPPER_VERSION_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'dataprepper-versions')
+)
+
+# Last access time per session, least recently used first
+_last_used: "OrderedDict[str, float]" = OrderedDict()
+_last_used_guard = threading.Lock()
+# With a shared backend: when this process last wrote each session's use to its manifest
+_marked_used: Dict[str, float] = {}
+# When this process last swept the shared backend for expired sessions (monotonic time)
+_last_sweep = float('-inf')
+
+backend = make_backend()
+
+def use_backend(new_backend):
+    """Switch session backends, forgetting every session cached in this process."""
+    global backend
+    for session_id in list(sessions):
+        _forget(session_id)
+    backend = new_backend
+
+class _SessionLock:
+    """Per-session lock so concurrent requests cannot interleave history edits.
+
+    `local` serializes this process's threads. With a shared backend the
+    outermost acquire also takes the backend's lock, so other workers wait
+    too, and refreshes this process's copy of the session; the matching
+    release publishes the lazy plan if it changed.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.local = threading.RLock()
+        self.owner = None
+        self.synced = False
+        self._depth = 0
+        self._remote = None
+
+    def acquire(self, blocking=True):
+        if not self.local.acquire(blocking):
+            return False
+        self._depth += 1
+        if self._depth == 1:
+            self.owner = threading.get_ident()
+            if backend.shared:
+                try:
+                    self._remote = backend.lock(self.session_id)
+                    self._remote.__enter__()
+                    _sync(self.session_id)
+                    self.synced = True
+                except Exception:
+                    self._release_remote()
+                    self._depth -= 1
+                    self.owner = None
+                    self.local.release()
+                    raise
+        return True
+
+    def _release_remote(self):
+        if self._remote is not None:
+            remote, self._remote = self._remote, None
+            remote.__exit__(None, None, None)
+
+    def release(self):
+        try:
+            if self._depth == 1 and self._remote is not None:
+                try:
+                    _publish_plan(self.session_id)
+                finally:
+                    self._release_remote()
+        finally:
+            if self._depth == 1:
+                self.owner = None
+                self.synced = False
+            self._depth -= 1
+            self.local.release()
+
+    def held(self):
+        return self.owner == threading.get_ident()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+# Weak values: a session's lock lives exactly as long as some thread holds,
+# waits on or is about to take it, so every caller gets the same object and
+# locks of forgotten sessions are pruned once they are no longer in use
+_locks: 'weakref.WeakValueDictionary[str, _SessionLock]' = weakref.WeakValueDictionary()
+_locks_guard = threading.Lock()
+
+def session_lock(session_id):
+    with _locks_guard:
+        lock = _locks.get(session_id)
+        if lock is None:
+            lock = _locks[session_id] = _SessionLock(session_id)
+        return lock
+
+def _snapshot(df, parent=None, changed=None, steps=None):
+    """Build a version that reuses the parent's Series for every unchanged column."""
+    shared = (
+        parent is not None and changed is not None
+        and df.index.equals(parent['frame'].index)
+    )
+    data, nbytes = {}, {}
+    for col in df.columns:
+        if shared and col not in changed and col in parent['data']:
+            data[col] = parent['data'][col]
+            nbytes[col] = parent['nbytes'][col]
+        else:
+            data[col] = df[col]
+            nbytes[col] = int(df[col].memory_usage(index=False, deep=True))
+    frame = pd.DataFrame(data, index=df.index, copy=False)
+    if not shared:
+        # Rows were added, removed or reordered: every column is new
+        changed = df.columns.tolist()
+    changed = set(changed) if parent is not None else None
+    # Stats and sort orders of shared columns carry over; the rest are rebuilt on demand
+    stats, sketches, sorted_, indexes, fits = {}, {}, {}, {}, {}
+    if parent is not None:
+        stats = {col: parent['stats'][col] for col in data if col not in changed and col in parent['stats']}
+        sketches = {col: parent['sketches'][col] for col in data if col not in changed and col in parent['sketches']}
+        sorted_ = {key: order for key, order in parent['sorted'].items() if key[0] in data and key[0] not in changed}
+        indexes = {col: index for col, index in parent['indexes'].items() if col in data and col not in changed}
+        fits = {key: fit for key, fit in parent['fits'].items() if key[0] in data and key[0] not in changed}
+    return {
+        'id': uuid.uuid4().hex,
+        'data': data,
+        'frame': frame,
+        'changed': changed,
+        'stats': stats,
+        'sketches': sketches,
+        'sorted': sorted_,
+        'indexes': indexes,
+        'fits': fits,
+        'steps': steps,
+        'nbytes': nbytes,
+        'index_bytes': int(df.index.memory_usage()),
+        'index_shared': shared,
+        'spill': None,
+        'remote': None,
+    }
+
+def _remote_version(entry):
+    """A version another worker wrote, to be read from the backend when needed."""
+    return {
+        'id': entry['id'], 'data': None, 'frame': None, 'changed': entry['changed'],
+        'stats': {}, 'sketches': {}, 'sorted': {}, 'indexes': {}, 'fits': {}, 'steps': entry['steps'], 'nbytes': {}, 'index_bytes': 0,
+        'index_shared': False, 'spill': None, 'remote': entry,
+    }
+
+# Last published lazy plan per session (the step objects), to skip unchanged plans
+_published_plans: Dict[str, List[int]] = {}
+
+def _publish(session_id):
+    """Write the session's manifest to the shared backend."""
+    plan = plans.get(session_id)
+    backend.write_manifest(session_id, {
+        'versions': [version['remote'] for version in sessions[session_id]],
+        'lazy': plan is not None,
+        'plan': plan or [],
+        'plan_token': uuid.uuid4().hex,
+        'last_used': time.time(),
+    })
+    _published_plans[session_id] = [id(step) for step in plan or []]
+    with _last_used_guard:
+        _marked_used[session_id] = time.monotonic()
+
+def _publish_plan(session_id):
+    if session_id in sessions and [id(step) for step in plans.get(session_id, [])] != _published_plans.get(session_id, []):
+        _publish(session_id)
+
+def _sync(session_id):
+    """Bring this process's copy of a session up to date with the shared backend.
+
+    Skipped while another thread of this process holds the session: it is
+    changing the session and publishes when done.
+    """
+    if not backend.shared:
+        return
+    lock = session_lock(session_id)
+    if not lock.local.acquire(blocking=False):
+        return
+    try:
+        if lock.held() and lock.synced:
+            # Already synced when this thread took the session lock
+            return
+        manifest = backend.read_manifest(session_id)
+        if manifest is None:
+            if session_id in sessions:
+                _forget(session_id)
+            return
+        local = sessions.get(session_id, [])
+        entries = manifest['versions']
+        keep = 0
+        while keep < min(len(local), len(entries)) and local[keep]['id'] == entries[keep]['id']:
+            keep += 1
+        if keep < len(local) or keep < len(entries):
+            for version in local[keep:]:
+                _discard(version)
+            sessions[session_id] = local[:keep] + [_remote_version(entry) for entry in entries[keep:]]
+        if manifest['lazy']:
+            if _plan_tokens.get(session_id) != manifest['plan_token']:
+                plans.setdefault(session_id, [])[:] = manifest['plan']
+                _published_plans[session_id] = [id(step) for step in plans[session_id]]
+        else:
+            plans.pop(session_id, None)
+        _plan_tokens[session_id] = manifest['plan_token']
+    finally:
+        lock.local.release()
+
+_plan_tokens: Dict[str, str] = {}
+
+def _touch(session_id):
+    now = time.monotonic()
+    with _last_used_guard:
+        _last_used[session_id] = now
+        _last_used.move_to_end(session_id)
+        # Other workers see the use through the manifest, refreshed a few times per TTL
+        stale = backend.shared and SESSION_TTL and now - _marked_used.get(session_id, -SESSION_TTL) > SESSION_TTL / 10
+        if stale:
+            _marked_used[session_id] = now
+    if stale:
+        with session_lock(session_id):
+            manifest = backend.read_manifest(session_id)
+            if manifest is not None:
+                manifest['last_used'] = time.time()
+                backend.write_manifest(session_id, manifest)
+
+def _sweep_backend(keep):
+    """Drop sessions no worker has used for SESSION_TTL from the shared backend.
+
+    Runs at most every SESSION_TTL / 10 seconds per process. Sessions busy in
+    this process are skipped; each one is checked again under its backend lock.
+    """
+    global _last_sweep
+    now = time.monotonic()
+    with _last_used_guard:
+        if now - _last_sweep < SESSION_TTL / 10:
+            return
+        _last_sweep = now
+    for sid in backend.session_ids():
+        if sid == keep:
+            continue
+        manifest = backend.read_manifest(sid)
+        if manifest is None or time.time() - manifest.get('last_used', 0) <= SESSION_TTL:
+            continue
+        lock = session_lock(sid)
+        if not lock.local.acquire(blocking=False):
+            continue
+        try:
+            with backend.lock(sid):
+                manifest = backend.read_manifest(sid)
+                if manifest is None:
+                    continue
+                if 'last_used' not in manifest:
+                    # Written before manifests carried it: start its clock now
+                    manifest['last_used'] = time.time()
+                    backend.write_manifest(sid, manifest)
+                elif time.time() - manifest['last_used'] > SESSION_TTL:
+                    backend.drop_session(sid)
+                    _forget(sid)
+        finally:
+            lock.local.release()
+
+def _resident_bytes(versions):
+    """Bytes held by a session's resident versions; shared Series are counted once."""
+    seen, total = set(), 0
+    for version in versions:
+        if version['data'] is None:
+            continue
+        if id(version['frame'].index) not in seen:
+            seen.add(id(version['frame'].index))
+            total += version['index_bytes']
+        for col, series in version['data'].items():
+            if id(series) not in seen:
+                seen.add(id(series))
+                total += version['nbytes'][col]
+    return total
+
+def _spill(version):
+    """Write a cold version to a memory-mappable Arrow IPC file and release its frame.
+
+    Returns False (and keeps the version resident) when pyarrow is missing or
+    cannot represent the frame.
+    """
+    if version['spill'] is None and version['remote'] is None:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            return False
+        os.makedirs(VERSION_SPILL_DIR, exist_ok=True)
+        path = os.path.join(VERSION_SPILL_DIR, f"v{version['id']}.arrow")
+        try:
+            frame, version['sparse'] = densify(version['frame'])
+            table = pa.Table.from_pandas(frame, preserve_index=True)
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            if os.path.exists(path):
+                os.remove(path)
+            return False
+        version['spill'] = path
+    version['data'] = None
+    version['frame'] = None
+    version['sorted'] = {}
+    version['indexes'] = {}
+    return True
+
+def _load(version):
+    """Bring a spilled version back; the file stays, so spilling it again is free."""
+    if version['data'] is None:
+        if version['spill'] is not None:
+            import pyarrow as pa
+            with pa.memory_map(version['spill']) as source:
+                frame = sparsify(pa.ipc.open_file(source).read_all().to_pandas(), version.get('sparse'))
+            version['data'] = {col: frame[col] for col in frame.columns}
+            version['frame'] = pd.DataFrame(version['data'], index=frame.index, copy=False)
+        else:
+            version['data'], version['frame'] = backend.read_version(version['remote'])
+        if not version['nbytes']:
+            version['nbytes'] = {col: int(values.memory_usage(index=False, deep=True)) for col, values in version['data'].items()}
+            version['index_bytes'] = int(version['frame'].index.memory_usage())
+    return version
+
+def _discard(version):
+    if version['spill'] is not None and os.path.exists(version['spill']):
+        os.remove(version['spill'])
+
+def put_dataset(session_id, df, lazy=False, stats=None, sketches=None, fits=None):
+    """Start a session's history with a freshly parsed upload.
+
+    `stats`, `sketches` and `fits` seed the upload's caches; pass the parse
+    cache's dicts to share them with every session opened on the same content.
+    """
+    with session_lock(session_id):
+        for version in sessions.get(session_id, []):
+            _discard(version)
+        sessions[session_id] = [_snapshot(df)]
+        if stats is not None:
+            sessions[session_id][0]['stats'] = stats
+        if sketches is not None:
+            sessions[session_id][0]['sketches'] = sketches
+        if fits is not None:
+            sessions[session_id][0]['fits'] = fits
+        if lazy:
+            plans[session_id] = []
+        else:
+            plans.pop(session_id, None)
+        if backend.shared:
+            backend.drop_session(session_id)
+            sessions[session_id][0]['remote'] = backend.write_version(session_id, sessions[session_id][0])
+            _publish(session_id)
+    _touch(session_id)
+    enforce_budget(keep=session_id)
+
+def is_lazy(session_id):
+    return session_id in plans
+
+def pending_steps(session_id):
+    """The lazy plan of a session, oldest step first (empty for eager sessions)."""
+    return plans.get(session_id, [])
+
+def has_dataset(session_id):
+    if session_id is None:
+        return False
+    _sync(session_id)
+    return session_id in sessions
+
+def _versions(session_id, touch=True):
+    """The session's versions; `touch` counts this as use (for LRU order and the TTL)."""
+    _sync(session_id)
+    versions = sessions.get(session_id)
+    if versions is None:
+        raise ValueError(f"Unknown session ID: {session_id}")
+    if touch:
+        _touch(session_id)
+    return versions
+
+def get_original(session_id):
+    return _load(_versions(session_id)[0])['frame'].copy(deep=False)
+
+def get_current(session_id):
+    return _load(_versions(session_id)[-1])['frame'].copy(deep=False)
+
+def current_version(session_id):
+    return _load(_versions(session_id)[-1])
+
+def push_version(session_id, df, changed=None, steps=None):
+    """Record `df` as the session's new current version.
+
+    `changed` names the columns the step added or rewrote; all other columns
+    are shared with the previous version. Leave it as None when unknown.
+    `steps` lists the plan steps when several were fused into this version.
+    """
+    with session_lock(session_id):
+        versions = _versions(session_id)
+        parent = _load(versions[-1])
+        versions.append(_snapshot(df, parent, changed, steps))
+        if backend.shared:
+            versions[-1]['remote'] = backend.write_version(session_id, versions[-1], parent['remote'])
+            _publish(session_id)
+    enforce_budget(keep=session_id)
+    return versions[-1]
+
+def pop_version(session_id):
+    """Discard the current version and return the one before it."""
+    with session_lock(session_id):
+        versions = _versions(session_id)
+        if len(versions) <= 1:
+            raise ValueError("No history to undo.")
+        popped = versions.pop()
+        _discard(popped)
+        if backend.shared:
+            _publish(session_id)
+            backend.drop_version(session_id, popped['remote'])
+        return _load(versions[-1])
+
+def history_depth(session_id):
+    """Number of transformations that can still be undone."""
+    versions = sessions.get(session_id, [None])[1:]
+    return sum(len(version['steps'] or [None]) for version in versions) + len(pending_steps(session_id))
+
+def _forget(session_id):
+    """Drop this process's copy of a session (all of it, for the in-process backend)."""
+    for version in sessions.pop(session_id, []):
+        _discard(version)
+    plans.pop(session_id, None)
+    _published_plans.pop(session_id, None)
+    _plan_tokens.pop(session_id, None)
+    with _last_used_guard:
+        _last_used.pop(session_id, None)
+        _marked_used.pop(session_id, None)
+
+def drop_dataset(session_id):
+    if backend.shared:
+        with session_lock(session_id):
+            backend.drop_session(session_id)
+    _forget(session_id)
+
+def session_memory(session_id):
+    """Memory accounting for one session; reading it does not count as use."""
+    with _last_used_guard:
+        last_used = _last_used.get(session_id, time.monotonic())
+    versions = _versions(session_id, touch=False)
+    released = [version for version in versions if version['data'] is None]
+    # Released versions are either in a local spill file or only in the shared backend
+    spilled = [version for version in released if version['spill'] is not None and os.path.exists(version['spill'])]
+    return {
+        'versions': len(versions),
+        'resident_versions': len(versions) - len(released),
+        'spilled_versions': len(spilled),
+        'backend_versions': len(released) - len(spilled),
+        'resident_bytes': _resident_bytes(versions),
+        'spilled_bytes': sum(os.path.getsize(version['spill']) for version in spilled),
+        'idle_seconds': time.monotonic() - last_used,
+    }
+
+def memory_report():
+    """Memory accounting for every session, plus the budget."""
+    report = {sid: session_memory(sid) for sid in list(sessions)}
+    return {
+        'budget_bytes': MEMORY_BUDGET,
+        'ttl_seconds': SESSION_TTL,
+        'resident_bytes': sum(entry['resident_bytes'] for entry in report.values()),
+        'sessions': report,
+    }
+
+def history_summary():
+    """Totals across this process's sessions for /metrics; reading them does not count as use."""
+    versions = {sid: sessions.get(sid, []) for sid in list(sessions)}
+    depths = [history_depth(sid) for sid in versions]
+    return {
+        'sessions': len(versions),
+        'versions': sum(len(history) for history in versions.values()),
+        'history_depth_max': max(depths, default=0),
+        'history_depth_total': sum(depths),
+        'resident_bytes': sum(_resident_bytes(history) for history in versions.values()),
+        'budget_bytes': MEMORY_BUDGET,
+    }
+
+def _least_recently_used(keep):
+    with _last_used_guard:
+        return [sid for sid in _last_used if sid != keep]
+
+def enforce_budget(keep=None):
+    """Expire idle sessions, then spill or drop cold data until under budget.
+
+    `keep` is the session being worked on; its current version is never
+    spilled and it is never dropped. Sessions busy in another request are
+    skipped rather than waited for.
+    """
+    now = time.monotonic()
+    if SESSION_TTL:
+        with _last_used_guard:
+            idle = [sid for sid, used in _last_used.items() if sid != keep and now - used > SESSION_TTL]
+        for sid in idle:
+            lock = session_lock(sid)
+            if lock.local.acquire(blocking=False):
+                try:
+                    _forget(sid)
+                finally:
+                    lock.local.release()
+        if backend.shared:
+            _sweep_backend(keep)
+    if not MEMORY_BUDGET:
+        return
+    total = sum(_resident_bytes(versions) for versions in list(sessions.values()))
+    # Spill cold versions, least recently used sessions first, the active session last
+    for sid in _least_recently_used(keep) + ([keep] if keep in sessions else []):
+        if total <= MEMORY_BUDGET:
+            return
+        lock = session_lock(sid)
+        if not lock.local.acquire(blocking=False):
+            continue
+        try:
+            versions = sessions.get(sid, [])
+            before = _resident_bytes(versions)
+            for version in versions[:-1]:
+                if version['data'] is not None:
+                    _spill(version)
+            total -= before - _resident_bytes(versions)
+        finally:
+            lock.local.release()
+    # Still over: drop whole sessions
+    for sid in _least_recently_used(keep):
+        if total <= MEMORY_BUDGET:
+            return
+        lock = session_lock(sid)
+        if not lock.local.acquire(blocking=False):
+            continue
+        try:
+            total -= _resident_bytes(sessions.get(sid, []))
+            _forget(sid)
+        finally:
+            lock.local.release()
@@ -0,0 +1,489 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Tuple, Set
+from .dedupe import first_occurrences
+from .dtypes import cast_series
+from .predicates import parse_predicate, predicate_columns, legacy_predicate, select_rows
+
+# Transformation steps shared by session history, chunked execution and batches.
+# A step is (action, columns, params), the same triple /apply_transformation takes:
+#   drop     columns to remove
+#   impute   params: method ('mean', 'median', 'mode', 'constant'), value
+#   encode   params: method ('onehot', 'ordinal'); for onehot also sparse,
+#            max_categories, min_frequency, other_label (see onehot_frame)
+#   scale    params: method ('minmax', 'standard')
+#   filter   columns[0]; params: value, min_value, max_value, regex
+#   rename   params: rename_map
+#   dtype    params: dtype_map
+#   dedupe   columns: subset (empty for all columns)
+#
+# Steps whose parameters depend on the data (mean/median/mode fill values,
+# scaler ranges, category vocabularies) are fitted first. Fitting is split into
+# partial_fit over any number of chunks and finish_fit, so the same code fits
+# a whole in-memory frame or a file streamed in pieces. Each column's fit is
+# independent of the others, so fitted parameters are cached per column with
+# the session version they were fitted on (version['fits'], see cached_fit).
+ACTIONS = ('drop', 'impute', 'encode', 'scale', 'filter', 'rename', 'dtype', 'dedupe')
+
+def _capped(params):
+    """Whether a onehot step limits its categories (rarer values go to an 'other' column)."""
+    return params.get('max_categories') is not None or params.get('min_frequency') is not None
+
+def _compact(params):
+    """Whether a onehot step builds uint8 (and possibly sparse) indicators instead of get_dummies."""
+    return bool(params.get('sparse')) or _capped(params)
+
+def needs_fit(action, params):
+    if action == 'impute':
+        return params.get('method', 'mean') != 'constant'
+    return action in ('encode', 'scale')
+
+def validate_step(action, columns, params):
+    if action not in ACTIONS:
+        raise ValueError(f"Unsupported action: {action}")
+    method = params.get('method')
+    if action == 'impute' and params.get('method', 'mean') not in ('mean', 'median', 'mode', 'constant'):
+        raise ValueError(f"Unknown imputation method: {method}")
+    if action == 'encode' and params.get('method', 'onehot') not in ('onehot', 'ordinal'):
+        raise ValueError(f"Unknown encoding method: {method}")
+    if action == 'scale' and params.get('method', 'minmax') not in ('minmax', 'standard'):
+        raise ValueError(f"Unknown scaling method: {method}")
+    if action == 'filter' and params.get('where') is not None:
+        if any(params.get(key) is not None for key in ('value', 'min_value', 'max_value', 'regex')):
+            raise ValueError("A filter takes either 'where' or value/min_value/max_value/regex, not both.")
+        parse_predicate(params['where'])
+    elif action == 'filter' and len(columns) != 1:
+        raise ValueError("filter takes exactly one column, or a 'where' predicate.")
+    if action == 'encode':
+        max_categories = params.get('max_categories')
+        if max_categories is not None and (not isinstance(max_categories, int) or max_categories < 1):
+            raise ValueError("max_categories must be a positive integer.")
+        min_frequency = params.get('min_frequency')
+        if min_frequency is not None and (not isinstance(min_frequency, (int, float)) or min_frequency < 0):
+            raise ValueError("min_frequency must be a count, or a fraction of the rows below 1.")
+
+def new_fit_state(action, columns, params):
+    return {col: None for col in columns}
+
+def _value_counts(values):
+    counts = values.value_counts()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Plain values, and only the categories some row uses
+        counts = counts[counts > 0]
+        counts.index = counts.index.astype(values.cat.categories.dtype)
+    return counts
+
+def _uniques(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        return values.cat.categories[np.unique(codes[codes >= 0])]
+    return pd.Index(values.dropna().unique())
+
+def partial_fit(state, action, columns, params, chunk):
+    """Fold one chunk of rows into the fit state of a step."""
+    method = params.get('method')
+    for col in columns:
+        values = chunk[col]
+        acc = state[col]
+        if action == 'impute' and (method or 'mean') == 'mean':
+            acc = acc or {'sum': 0.0, 'count': 0}
+            # Summed in float64: downcast float32 columns would lose precision
+            acc['sum'] += float(values.astype(np.float64).sum())
+            acc['count'] += int(values.count())
+        elif action == 'impute' and method == 'median':
+            acc = acc or []
+            acc.append(values.dropna().to_numpy(dtype=np.float64))
+        elif action == 'impute' and method == 'mode':
+            counts = _value_counts(values)
+            acc = counts if acc is None else acc.add(counts, fill_value=0)
+        elif action == 'scale' and (method or 'minmax') == 'minmax':
+            acc = acc or {'min': np.inf, 'max': -np.inf}
+            if values.count():
+                acc['min'] = min(acc['min'], float(values.min()))
+                acc['max'] = max(acc['max'], float(values.max()))
+        elif action == 'scale':
+            # Chan et al. pairwise update keeps the variance stable across chunks
+            acc = acc or {'count': 0, 'mean': 0.0, 'm2': 0.0}
+            x = values.dropna().to_numpy(dtype=np.float64)
+            if len(x):
+                n, mean, m2 = len(x), float(x.mean()), float(((x - x.mean()) ** 2).sum())
+                total = acc['count'] + n
+                delta = mean - acc['mean']
+                acc['m2'] += m2 + delta ** 2 * acc['count'] * n / total
+                acc['mean'] += delta * n / total
+                acc['count'] = total
+        elif action == 'encode' and _capped(params):
+            counts = _value_counts(values)
+            acc = counts if acc is None else acc.add(counts, fill_value=0)
+        elif action == 'encode':
+            uniques = _uniques(values)
+            acc = uniques if acc is None else acc.union(uniques, sort=False)
+        state[col] = acc
+    return state
+
+def finish_fit(state, action, columns, params) -> Dict[str, Any]:
+    """Turn a fit state into the parameters apply_step needs."""
+    method = params.get('method')
+    if action == 'impute':
+        fill = {}
+        for col, acc in state.items():
+            if (method or 'mean') == 'mean':
+                fill[col] = acc['sum'] / acc['count'] if acc and acc['count'] else np.nan
+            elif method == 'median':
+                values = np.concatenate(acc) if acc else np.array([])
+                fill[col] = float(np.median(values)) if len(values) else np.nan
+            else:
+                if acc is None or acc.empty:
+                    raise ValueError(f"Cannot impute mode of empty column '{col}'.")
+                top = acc[acc == acc.max()].index
+                # Series.mode() breaks ties by sort order
+                try:
+                    fill[col] = sorted(top)[0]
+                except TypeError:
+                    fill[col] = top[0]
+        return {'fill': fill}
+    if action == 'scale':
+        scale = {}
+        for col, acc in state.items():
+            if (method or 'minmax') == 'minmax':
+                low, high = acc['min'], acc['max']
+                span = high - low
+                # Constant columns map to 0, as scikit-learn's scalers do
+                scale[col] = (low, span if span > 0 else 1.0)
+            else:
+                std = float(np.sqrt(acc['m2'] / acc['count'])) if acc['count'] else 0.0
+                scale[col] = (acc['mean'], std if std > 0 else 1.0)
+        return {'scale': scale}
+    if action == 'encode':
+        categories, other = {}, {}
+        for col, acc in state.items():
+            if _capped(params):
+                acc, other[col] = _frequent_categories(acc, params)
+            acc = acc if acc is not None else pd.Index([])
+            try:
+                categories[col] = acc.sort_values()
+            except TypeError:
+                categories[col] = acc
+        return {'categories': categories, 'other': other}
+    return {}
+
+def _frequent_categories(counts, params):
+    """Categories a capped onehot keeps, and whether any were left out."""
+    if counts is None or counts.empty:
+        return pd.Index([]), False
+    counts = counts[counts > 0]
+    # Most frequent first, ties broken by value so the choice is deterministic
+    try:
+        counts = counts.sort_index()
+    except TypeError:
+        pass
+    kept = counts.sort_values(ascending=False, kind='stable')
+    min_frequency = params.get('min_frequency')
+    if min_frequency is not None:
+        threshold = min_frequency * counts.sum() if min_frequency < 1 else min_frequency
+        kept = kept[kept >= threshold]
+    if params.get('max_categories') is not None:
+        kept = kept.head(params['max_categories'])
+    return kept.index, len(kept) < len(counts)
+
+def fit_step(df, action, columns, params) -> Dict[str, Any]:
+    """Fit a step on a whole in-memory frame."""
+    if not needs_fit(action, params):
+        return {}
+    state = partial_fit(new_fit_state(action, columns, params), action, columns, params, df)
+    return finish_fit(state, action, columns, params)
+
+# What a column's fitted parameters depend on besides its values
+_FIT_FIELDS = {'impute': ('fill',), 'scale': ('scale',), 'encode': ('categories', 'other')}
+_DEFAULT_METHODS = {'impute': 'mean', 'scale': 'minmax', 'encode': 'onehot'}
+
+def fit_key(col, action, params):
+    """Key of a column's fitted parameters in a fit cache."""
+    return (col, action, params.get('method') or _DEFAULT_METHODS[action], params.get('max_categories'), params.get('min_frequency'))
+
+def cached_fit(fits, df, action, columns, params) -> Dict[str, Any]:
+    """fit_step, taking each column's parameters from the cache `fits` and fitting only the columns it lacks."""
+    if not needs_fit(action, params):
+        return {}
+    missing = [col for col in columns if fit_key(col, action, params) not in fits]
+    if missing:
+        fitted = fit_step(df, action, missing, params)
+        for col in missing:
+            fits[fit_key(col, action, params)] = {field: fitted[field][col] for field in _FIT_FIELDS[action] if col in fitted[field]}
+    cached = [fits[fit_key(col, action, params)] for col in columns]
+    return {field: {col: fit[field] for col, fit in zip(columns, cached) if field in fit} for field in _FIT_FIELDS[action]}
+
+def _plain(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return value.isoformat()
+    return value
+
+def dump_fitted(action, fitted) -> Dict[str, Any]:
+    """Fitted parameters as plain JSON values, for saving with a recipe (missing fill values become None)."""
+    if action == 'impute':
+        return {'fill': {col: _plain(value) for col, value in fitted['fill'].items()}}
+    if action == 'scale':
+        return {'scale': {col: [float(offset), float(scale)] for col, (offset, scale) in fitted['scale'].items()}}
+    if action == 'encode':
+        return {
+            'categories': {col: [_plain(value) for value in categories] for col, categories in fitted['categories'].items()},
+            'other': {col: bool(other) for col, other in fitted.get('other', {}).items()},
+        }
+    return {}
+
+def load_fitted(action, columns, params, data) -> Dict[str, Any]:
+    """Parameters saved by dump_fitted, back in the form apply_steps takes."""
+    if not needs_fit(action, params):
+        return {}
+    field = _FIT_FIELDS[action][0]
+    if not isinstance(data, dict) or not isinstance(data.get(field), dict):
+        raise ValueError(f"Fitted parameters of a {action} step need a '{field}' mapping.")
+    unfitted = [col for col in columns if col not in data[field]]
+    if unfitted:
+        raise ValueError(f"No fitted parameters for columns {unfitted}.")
+    if action == 'impute':
+        return {'fill': {col: np.nan if value is None else value for col, value in data['fill'].items()}}
+    if action == 'scale':
+        return {'scale': {col: (float(offset), float(scale)) for col, (offset, scale) in data['scale'].items()}}
+    return {'categories': {col: pd.Index(values) for col, values in data['categories'].items()}, 'other': dict(data.get('other') or {})}
+
+def step_predicate(columns, params):
+    """The predicates.py predicate a filter step keeps rows by."""
+    if params.get('where') is not None:
+        return parse_predicate(params['where'])
+    return legacy_predicate(columns[0], params)
+
+def fill_missing(series, value):
+    """series.fillna(value), adding `value` to a category column's categories first."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and not pd.isna(value) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
+
+def category_codes(values, categories):
+    """Position of each value in `categories`; -1 for missing values and values not in it."""
+    categories = pd.Index(categories)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Look up each category once instead of every row
+        lookup = np.append(categories.get_indexer(values.cat.categories), -1)
+        return lookup[values.cat.codes.to_numpy()]
+    return categories.get_indexer(values)
+
+def onehot_frame(values, index, categories, other, params, prefix):
+    """uint8 indicator columns for `values`, one per category (plus 'other').
+
+    Values outside `categories` set the 'other' column when `other` is true;
+    missing values set none. With params['sparse'] the columns are sparse
+    (fill value 0), so memory grows with the rows rather than rows x categories.
+    """
+    codes = category_codes(values, categories).astype(np.int64)
+    names = [f"{prefix}_{category}" for category in categories]
+    if other:
+        label = f"{prefix}_{params.get('other_label', 'other')}"
+        if label in names:
+            raise ValueError(f"Column '{label}' would clash with a category; set other_label.")
+        codes = np.where((codes < 0) & values.notna().to_numpy(), len(names), codes)
+        names.append(label)
+    rows = np.flatnonzero(codes >= 0)
+    if params.get('sparse'):
+        try:
+            import scipy.sparse
+        except ImportError:
+            raise ValueError("Sparse one-hot encoding requires scipy to be installed.")
+        ones = np.ones(len(rows), dtype=np.uint8)
+        matrix = scipy.sparse.csc_matrix((ones, (rows, codes[rows])), shape=(len(codes), len(names)))
+        return pd.DataFrame.sparse.from_spmatrix(matrix, index=index, columns=names)
+    # One contiguous uint8 row per indicator column
+    indicators = np.zeros((len(names), len(codes)), dtype=np.uint8)
+    indicators[codes[rows], rows] = 1
+    return pd.DataFrame(dict(zip(names, indicators)), index=index, copy=False)
+
+def densify(frame):
+    """Sparse columns made dense, for writers (Arrow) without sparse support.
+
+    Returns the frame and {column: fill value} for sparsify to undo it.
+    """
+    fills = {col: frame[col].dtype.fill_value for col in frame.columns if isinstance(frame[col].dtype, pd.SparseDtype)}
+    if fills:
+        frame = frame.astype({col: frame[col].dtype.subtype for col in fills})
+    return frame, fills
+
+def sparsify(frame, fills):
+    if fills:
+        frame = frame.astype({col: pd.SparseDtype(frame[col].dtype, fill) for col, fill in fills.items()})
+    return frame
+
+def make_step(action, columns, params, fitted=None):
+    validate_step(action, columns, params)
+    if action == 'filter' and params.get('where') is not None:
+        # A predicate names its own columns
+        params = dict(params, where=parse_predicate(params['where']))
+        columns = predicate_columns(params['where'])
+    return {'action': action, 'columns': list(columns), 'params': dict(params), 'fitted': fitted}
+
+# Steps that report progress once per column; the others report once per step
+COLUMN_ACTIONS = ('impute', 'encode', 'scale', 'dtype')
+
+def progress_units(steps):
+    """How many times apply_steps calls its `progress` callback for `steps`."""
+    units = 0
+    for step in steps:
+        if step['action'] == 'dtype':
+            units += len(step['params'].get('dtype_map', {}))
+        elif step['action'] in COLUMN_ACTIONS:
+            units += len(step['columns'])
+        else:
+            units += 1
+    return units
+
+def _assemble(cols, index, mask):
+    frame = pd.DataFrame(cols, index=index, copy=False)
+    if mask is not None:
+        frame = frame[mask.to_numpy()]
+    return frame
+
+def apply_steps(df, steps, partial=False, indexes=None, progress=None, fits=None) -> Tuple[pd.DataFrame, Set[str]]:
+    """Run a list of steps (see make_step) over `df` in as few passes as possible.
+
+    The frame is taken apart into a column dict once. Column steps replace
+    dict entries, drops and renames only edit the dict, and filters AND their
+    masks together, so the rows are cut once at the end rather than after
+    every step. Steps fitted on the data see only rows that earlier filters
+    kept; dedupe hashes the rows kept so far into one more mask (see
+    dedupe.py). Fitted parameters are stored on each step and reused
+    on later runs.
+
+    With `partial`, the frame may hold just some of the columns the steps
+    mention (a projection); work on absent columns is skipped and fits over
+    an incomplete column set are not cached.
+
+    `indexes` is the filter index cache (see predicates.py) of the version
+    `df` is; filters use it for columns no earlier step has touched. `fits`
+    is that version's fit cache (see cached_fit); steps fitted on columns no
+    earlier step has touched, over all rows, read and fill it.
+
+    `progress`, if given, is called with a label after each column of an
+    impute/encode/scale/dtype step and after each other step (see
+    progress_units). An exception it raises abandons the run.
+
+    Returns the new frame and the set of columns added or rewritten.
+    """
+    cols = {name: df[name] for name in df.columns}
+    original = dict(cols)
+    # Columns whose rows and values are still those of `df`
+    base = set(df.columns) if indexes is not None else set()
+    index = df.index
+    mask = None
+    changed = set()
+    rows_changed = False
+    tick = progress or (lambda label: None)
+    for step in steps:
+        action, columns, params = step['action'], step['columns'], step['params']
+        method = params.get('method')
+        present = [col for col in columns if col in cols] if partial else columns
+        if action == 'filter' and partial and len(present) < len(columns):
+            # Cannot tell which rows go without the columns; keep them all
+            tick(action)
+            continue
+        fitted = step['fitted']
+        if fitted is None and needs_fit(action, params):
+            if fits is not None and mask is None and all(col in original and cols.get(col) is original[col] for col in present):
+                fitted = cached_fit(fits, df, action, present, params)
+            else:
+                sample = pd.DataFrame({col: cols[col] if mask is None else cols[col][mask] for col in present})
+                fitted = fit_step(sample, action, present, params)
+            if len(present) == len(columns):
+                step['fitted'] = fitted
+        fitted = fitted or {}
+        if action == 'drop':
+            for col in present:
+                if col not in cols:
+                    raise KeyError(f"{[col]} not found in axis")
+                del cols[col]
+        elif action == 'impute':
+            fill = fitted.get('fill') or {col: params.get('value') for col in present}
+            for col in present:
+                cols[col] = fill_missing(cols[col], fill[col])
+                tick(col)
+            changed.update(present)
+        elif action == 'encode' and (method or 'onehot') == 'onehot':
+            for col in present:
+                if _compact(params):
+                    other = fitted.get('other', {}).get(col, False)
+                    dummies = onehot_frame(cols.pop(col), index, fitted['categories'][col], other, params, col)
+                else:
+                    codes = category_codes(cols.pop(col), fitted['categories'][col])
+                    values = pd.Categorical.from_codes(codes, categories=fitted['categories'][col])
+                    dummies = pd.get_dummies(pd.Series(values, index=index), prefix=col)
+                for name in dummies.columns:
+                    cols[name] = dummies[name]
+                    changed.add(name)
+                tick(col)
+        elif action == 'encode':
+            for col in present:
+                codes = category_codes(cols[col], fitted['categories'][col])
+                # Narrowest integer width, as Categorical codes are
+                cols[col] = pd.to_numeric(pd.Series(codes, index=index, name=col), downcast='integer')
+                tick(col)
+            changed.update(present)
+        elif action == 'scale':
+            for col in present:
+                offset, scale = fitted['scale'][col]
+                values = cols[col]
+                # One owned buffer, updated in place; float32 columns stay float32
+                dtype = np.float32 if values.dtype == np.float32 else np.float64
+                scaled = values.to_numpy(dtype=dtype, na_value=np.nan, copy=True)
+                np.subtract(scaled, dtype(offset), out=scaled)
+                np.divide(scaled, dtype(scale), out=scaled)
+                cols[col] = pd.Series(scaled, index=index, name=col, copy=False)
+                tick(col)
+            changed.update(present)
+        elif action == 'filter':
+            indexed = {col for col in columns if col in base and col not in changed}
+            # Later filters only look at the rows earlier ones kept
+            within = np.flatnonzero(mask.to_numpy()) if mask is not None else None
+            kept = select_rows(step_predicate(columns, params), cols, len(index), indexes, indexed, within)
+            mask = pd.Series(kept.to_mask(), index=index)
+            rows_changed = True
+        elif action == 'rename':
+            rename_map = {old: new for old, new in params.get('rename_map', {}).items() if old in cols}
+            cols = {rename_map.get(name, name): values for name, values in cols.items()}
+            changed = {rename_map.get(name, name) for name in changed}
+            changed.update(rename_map.values())
+        elif action == 'dtype':
+            for col, dtype in params.get('dtype_map', {}).items():
+                if partial and col not in cols:
+                    tick(col)
+                    continue
+                cols[col] = cast_series(cols[col], dtype)
+                changed.add(col)
+                tick(col)
+        elif action == 'dedupe':
+            # Only the subset columns of the rows kept so far are hashed; the
+            # result is one more row mask, so no intermediate frame is built
+            missing = [col for col in present if col not in cols]
+            if missing:
+                raise KeyError(f"{missing} not found in axis")
+            rows = np.flatnonzero(mask.to_numpy()) if mask is not None else np.arange(len(index))
+            subset = pd.DataFrame({i: cols[col].iloc[rows] for i, col in enumerate(present or list(cols))}, copy=False)
+            keep = np.zeros(len(index), dtype=bool)
+            keep[rows[first_occurrences(subset)]] = True
+            mask = pd.Series(keep, index=index)
+            rows_changed = True
+        if action not in COLUMN_ACTIONS:
+            tick(action)
+    result = _assemble(cols, index, mask)
+    if rows_changed:
+        changed = set(result.columns)
+    return result, changed & set(result.columns)
+
+def apply_step(df, action, columns, params, fitted=None, indexes=None) -> Tuple[pd.DataFrame, Set[str]]:
+    """Apply one step to `df` (a whole frame or a chunk).
+
+    Returns the new frame and the set of columns the step added or rewrote;
+    every other column is passed through untouched.
+    """
+    return apply_steps(df, [make_step(action, columns, params, fitted)], indexes=indexes)
@@ -0,0 +1,290 @@
+"""Time and memory of the crud.py operations over synthetic datasets.
+
+Every case runs against each dataset profile (see synthetic.py) and row
+count, both as a direct call into app/crud.py and through the FastAPI test
+client. A case gets a fresh session for every run, built outside the timed
+region. The best and median of `--repeats` runs are recorded, plus the peak
+allocation of one more run under tracemalloc (NumPy and pandas buffers are
+traced; Arrow's own allocator is not).
+
+    cd backend && python -m benchmarks.bench_crud [--rows 10000 100000] [--profiles narrow-mixed]
+    cd backend && python -m benchmarks.bench_crud --compare base.json head.json
+
+Results are written as JSON (by default to benchmarks/results/<commit>.json);
+--compare lists the cases that got slower or bigger between two such files
+and exits with status 1 if any moved past --threshold.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import io
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+import uuid
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from app import crud, store
+from app.datasets import clear_parse_cache
+from app.main import app
+from benchmarks.synthetic import PROFILES, profile_frame, columns_of
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+# Datasets above this many cells are skipped (10M rows x 200 columns will not fit)
+MAX_CELLS = 200_000_000
+PREVIEW_ROWS = 5
+ONEHOT_MAX_CATEGORIES = 32
+CHAIN = ['impute_mean', 'scale_minmax', 'encode_ordinal', 'filter_range', 'drop']
+
+client = TestClient(app)
+# Per-request INFO lines would drown the results
+logging.getLogger("dataprepper").setLevel(logging.WARNING)
+
+def transform_specs(frame):
+    """(action, columns, params) for each transform case the frame has columns for."""
+    ints, floats, texts = columns_of(frame, 'int'), columns_of(frame, 'float'), columns_of(frame, 'text')
+    numeric = (ints + floats)[:4]
+    specs = {
+        'drop': ('drop', [frame.columns[-1]], {}),
+        'rename': ('rename', [], {'rename_map': {frame.columns[0]: f"{frame.columns[0]}_renamed"}}),
+        'dedupe': ('dedupe', [], {}),
+    }
+    if floats:
+        specs['impute_mean'] = ('impute', floats[:4], {'method': 'mean'})
+    if numeric:
+        specs['scale_minmax'] = ('scale', numeric, {'method': 'minmax'})
+        specs['scale_standard'] = ('scale', numeric, {'method': 'standard'})
+    if texts:
+        specs['impute_mode'] = ('impute', texts[:1], {'method': 'mode'})
+        specs['encode_onehot'] = ('encode', texts[:1], {'method': 'onehot', 'max_categories': ONEHOT_MAX_CATEGORIES})
+        specs['encode_ordinal'] = ('encode', texts[:1], {'method': 'ordinal'})
+        specs['dtype_category'] = ('dtype', [], {'dtype_map': {texts[0]: 'category'}})
+    if ints:
+        in_range = {'column': ints[0], 'op': 'between', 'value': [2_500, 7_500]}
+        specs['filter_range'] = ('filter', [], {'where': in_range})
+        if texts:
+            labels = frame[texts[0]].dropna().unique()[:3].tolist()
+            specs['filter_compound'] = ('filter', [], {'where': {'and': [in_range, {'column': texts[0], 'op': 'in', 'value': labels}]}})
+    return specs
+
+class Dataset:
+    """A generated frame and, on first use, its CSV upload."""
+
+    def __init__(self, profile, rows):
+        self.profile, self.rows = profile, rows
+        self.frame = profile_frame(profile, rows)
+        self.specs = transform_specs(self.frame)
+        self._csv = None
+
+    @property
+    def csv(self):
+        if self._csv is None:
+            self._csv = self.frame.to_csv(index=False).encode()
+        return self._csv
+
+    def session(self):
+        session_id = f"bench-{uuid.uuid4().hex}"
+        store.put_dataset(session_id, self.frame.copy(deep=False))
+        return session_id
+
+# Direct calls into crud.py and the matching requests. Each runner takes the
+# dataset and the state its setup returned.
+
+def _direct_apply(data, session_id, name):
+    action, columns, params = data.specs[name]
+    crud.apply_transformation(None, session_id, action, columns, params, PREVIEW_ROWS)
+
+def _http_apply(data, session_id, name):
+    action, columns, params = data.specs[name]
+    _ok(client.post(f"/apply_transformation?rows={PREVIEW_ROWS}", data={
+        "session_id": session_id, "action": action, "columns": json.dumps(columns), "params": json.dumps(params),
+    }))
+
+def _ok(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.status_code}: {response.text[:200]}")
+    return response
+
+def _chain(data):
+    return [name for name in CHAIN if name in data.specs]
+
+def _chained_session(data, apply):
+    session_id = data.session()
+    for name in _chain(data):
+        apply(data, session_id, name)
+    return session_id
+
+def _fresh_upload(data):
+    clear_parse_cache()
+    return None
+
+RUNNERS = {
+    'direct': {
+        'create_session': (_fresh_upload, lambda data, _: crud.create_session(io.BytesIO(data.csv))),
+        'preview_upload': (lambda data: None, lambda data, _: crud.preview_csv(io.BytesIO(data.csv), PREVIEW_ROWS)),
+        'preview_session': (Dataset.session, lambda data, sid: crud.preview_csv(None, PREVIEW_ROWS, session_id=sid)),
+        'column_stats': (Dataset.session, lambda data, sid: crud.get_column_stats(None, sid)),
+        'column_stats_approximate': (Dataset.session, lambda data, sid: crud.get_column_stats(None, sid, approximate=True)),
+        'chain_apply': (Dataset.session, lambda data, sid: [_direct_apply(data, sid, name) for name in _chain(data)]),
+        'chain_undo': (lambda data: _chained_session(data, _direct_apply),
+                       lambda data, sid: [crud.undo_last_transformation(None, sid, PREVIEW_ROWS) for _ in _chain(data)]),
+    },
+    'http': {
+        'create_session': (_fresh_upload, lambda data, _: _ok(client.post("/create_session", files={"file": ("bench.csv", io.BytesIO(data.csv), "text/csv")}))),
+        'preview_upload': (lambda data: None, lambda data, _: _ok(client.post(f"/preview?rows={PREVIEW_ROWS}", files={"file": ("bench.csv", io.BytesIO(data.csv), "text/csv")}))),
+        'preview_session': (Dataset.session, lambda data, sid: _ok(client.post(f"/preview?rows={PREVIEW_ROWS}", data={"session_id": sid}))),
+        'column_stats': (Dataset.session, lambda data, sid: _ok(client.post("/column_stats", data={"session_id": sid}))),
+        'column_stats_approximate': (Dataset.session, lambda data, sid: _ok(client.post("/column_stats", data={"session_id": sid, "approximate": "true"}))),
+        'chain_apply': (Dataset.session, lambda data, sid: [_http_apply(data, sid, name) for name in _chain(data)]),
+        'chain_undo': (lambda data: _chained_session(data, _http_apply),
+                       lambda data, sid: [_ok(client.post(f"/undo?rows={PREVIEW_ROWS}", data={"session_id": sid})) for _ in _chain(data)]),
+    },
+}
+
+def case_names(data):
+    """Every case for a dataset: the fixed ones, then one per transform."""
+    return list(RUNNERS['direct']) + [f"transform:{name}" for name in data.specs]
+
+def _runner(mode, case):
+    if case.startswith('transform:'):
+        name = case.split(':', 1)[1]
+        apply = _direct_apply if mode == 'direct' else _http_apply
+        return Dataset.session, lambda data, sid: apply(data, sid, name)
+    return RUNNERS[mode][case]
+
+def _teardown(before):
+    # Drop every session the setup and run opened (create_session makes its own)
+    for session_id in set(store.sessions) - before:
+        store.drop_dataset(session_id)
+
+def measure(data, mode, case, repeats):
+    setup, run = _runner(mode, case)
+    timings = []
+    for _ in range(repeats):
+        before = set(store.sessions)
+        state = setup(data)
+        began = time.perf_counter()
+        run(data, state)
+        timings.append(time.perf_counter() - began)
+        _teardown(before)
+    before = set(store.sessions)
+    state = setup(data)
+    tracemalloc.start()
+    try:
+        run(data, state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        _teardown(before)
+    return {
+        'seconds_min': min(timings),
+        'seconds_median': statistics.median(timings),
+        'runs': repeats,
+        'peak_bytes': peak,
+    }
+
+def _commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(__file__))
+        return out.stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+def run_suite(rows, profiles, modes, cases=None, repeats=3, max_cells=MAX_CELLS, log=print):
+    """Run the suite; returns the JSON-ready report."""
+    report = {
+        'meta': {
+            'commit': _commit(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'repeats': repeats,
+        },
+        'results': [],
+    }
+    for profile in profiles:
+        for n_rows in rows:
+            key = {'profile': profile, 'rows': n_rows}
+            if n_rows * PROFILES[profile]['columns'] > max_cells:
+                report['results'].append({**key, 'skipped': f"more than {max_cells} cells"})
+                log(f"{profile:>15} {n_rows:>10}  skipped (more than {max_cells} cells)")
+                continue
+            data = Dataset(profile, n_rows)
+            frame_bytes = int(data.frame.memory_usage(deep=True).sum())
+            for mode in modes:
+                for case in case_names(data):
+                    if cases and case not in cases and case.split(':')[-1] not in cases:
+                        continue
+                    result = {**key, 'columns': len(data.frame.columns), 'frame_bytes': frame_bytes, 'mode': mode, 'case': case}
+                    try:
+                        result.update(measure(data, mode, case, repeats))
+                    except Exception as e:
+                        result['error'] = f"{type(e).__name__}: {e}"
+                    report['results'].append(result)
+                    log(_format(result))
+    return report
+
+def _format(result):
+    head = f"{result['profile']:>15} {result['rows']:>10} {result['mode']:>6} {result['case']:<32}"
+    if 'error' in result:
+        return f"{head} error: {result['error']}"
+    return f"{head} {result['seconds_min'] * 1e3:>10.2f} ms {result['peak_bytes'] / 2 ** 20:>9.1f} MiB"
+
+def _key(result):
+    return (result['profile'], result['rows'], result.get('mode'), result.get('case'))
+
+def compare(base, head, threshold=1.25):
+    """Ratios head/base per case present in both reports; the second value lists regressions."""
+    before = {_key(result): result for result in base['results'] if 'seconds_min' in result}
+    rows, regressions = [], []
+    for result in head['results']:
+        old = before.get(_key(result))
+        if old is None or 'seconds_min' not in result:
+            continue
+        time_ratio = result['seconds_min'] / max(old['seconds_min'], 1e-9)
+        memory_ratio = result['peak_bytes'] / max(old['peak_bytes'], 1)
+        row = {**dict(zip(('profile', 'rows', 'mode', 'case'), _key(result))), 'time_ratio': time_ratio, 'memory_ratio': memory_ratio}
+        rows.append(row)
+        if time_ratio > threshold or memory_ratio > threshold:
+            regressions.append(row)
+    return rows, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--modes', nargs='+', default=['direct', 'http'], choices=['direct', 'http'])
+    parser.add_argument('--cases', nargs='+', help="Case names, or transform names such as filter_range")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--max-cells', type=int, default=MAX_CELLS)
+    parser.add_argument('--output', help="Report path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help="Compare two reports instead of running")
+    parser.add_argument('--threshold', type=float, default=1.25, help="Ratio above which --compare reports a regression")
+    args = parser.parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as f_base, open(args.compare[1]) as f_head:
+            rows, regressions = compare(json.load(f_base), json.load(f_head), args.threshold)
+        for row in rows:
+            flag = '  <-- regression' if row in regressions else ''
+            print(f"{row['profile']:>15} {row['rows']:>10} {row['mode']:>6} {row['case']:<32} "
+                  f"time x{row['time_ratio']:.2f}  memory x{row['memory_ratio']:.2f}{flag}")
+        return 1 if regressions else 0
+    report = run_suite(args.rows, args.profiles, args.modes, args.cases, args.repeats, args.max_cells)
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Per-row cost of rendering a preview window as JSON.
+
+Compares the previous response path (df.replace sanitizing, .values.tolist(),
+PreviewResponse validation, jsonable_encoder, json.dumps) with the
+column-by-column serializer in app/serialize.py.
+
+    cd backend && python -m benchmarks.bench_serialize [rows ...]
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import time
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from app.models import PreviewResponse
+from app.serialize import rows_json, json_response
+
+REPEATS = 5
+
+def crime_frame(n, seed=0):
+    """A frame shaped like the crimes extract: ids, text, categories, dates, floats with gaps."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'ID': np.arange(n) + 10_000_000,
+        'Case Number': pd.Series([f"JA{i:06d}" for i in range(n)], dtype='str'),
+        'Date': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 3e7, n), unit='s'),
+        'Primary Type': pd.Categorical(rng.choice(['THEFT', 'BATTERY', 'ASSAULT', 'NARCOTICS'], n)),
+        'Arrest': rng.choice([True, False], n),
+        'Beat': rng.integers(100, 2500, n).astype(np.int16),
+        'Latitude': rng.normal(41.8, 0.1, n),
+        'Longitude': rng.normal(-87.7, 0.1, n),
+    })
+    df.loc[::9, 'Latitude'] = np.nan
+    df.loc[::13, 'Longitude'] = np.inf
+    return df
+
+def previous_path(window):
+    # What every preview endpoint did before app/serialize.py
+    sanitized = window.replace([np.nan, np.inf, -np.inf], None)
+    model = PreviewResponse(columns=sanitized.columns.tolist(), data=sanitized.values.tolist())
+    return json.dumps(jsonable_encoder(model), ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+def serializer_path(window):
+    return json_response({"columns": window.columns.tolist(), "data": rows_json(window)}).body
+
+def best_of(fn, window):
+    timings = []
+    for _ in range(REPEATS):
+        began = time.perf_counter()
+        fn(window)
+        timings.append(time.perf_counter() - began)
+    return min(timings)
+
+def main(sizes):
+    print(f"{'rows':>8} {'previous us/row':>16} {'serializer us/row':>18} {'speedup':>8}")
+    for rows in sizes:
+        window = crime_frame(rows)
+        previous = best_of(previous_path, window)
+        current = best_of(serializer_path, window)
+        print(f"{rows:>8} {previous / rows * 1e6:>16.2f} {current / rows * 1e6:>18.2f} {previous / current:>7.1f}x")
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100, 1_000, 10_000, 100_000])
@@ -0,0 +1,45 @@
+"""Synthetic datasets for the benchmarks, deterministic for a given seed.
+
+A frame has `columns` columns split between integers, floats and text.
+Every column type gets at least one column unless its share is zero, so the
+column-specific cases always find a target. Floats and text carry missing
+values at the `missing` rate; text columns draw from `cardinality` labels.
+"""
+import numpy as np
+import pandas as pd
+
+# Named dataset shapes; `rows` is given separately
+PROFILES = {
+    'narrow-mixed': dict(columns=8, text_share=0.375, missing=0.05, cardinality=12),
+    'narrow-numeric': dict(columns=8, text_share=0.0, missing=0.05, cardinality=12),
+    'narrow-text': dict(columns=8, text_share=0.75, missing=0.05, cardinality=20_000),
+    'wide-mixed': dict(columns=200, text_share=0.25, missing=0.05, cardinality=50),
+    'sparse-missing': dict(columns=8, text_share=0.375, missing=0.6, cardinality=12),
+}
+
+def synthetic_frame(rows, columns=8, text_share=0.375, missing=0.05, cardinality=12, seed=0):
+    """A frame of `rows` rows; columns are named int_<i>, float_<i> and text_<i>."""
+    rng = np.random.default_rng(seed)
+    n_text = round(columns * text_share)
+    n_numeric = columns - n_text
+    n_int = n_numeric // 2 if n_numeric > 1 else n_numeric
+    labels = np.array([f"label_{i:05d}" for i in range(max(cardinality, 1))], dtype=object)
+    data = {}
+    for i in range(n_int):
+        data[f"int_{i}"] = rng.integers(0, 10_000, rows)
+    for i in range(n_numeric - n_int):
+        values = rng.normal(50.0, 15.0, rows)
+        values[rng.random(rows) < missing] = np.nan
+        data[f"float_{i}"] = values
+    for i in range(n_text):
+        values = labels[rng.integers(0, len(labels), rows)]
+        values[rng.random(rows) < missing] = None
+        data[f"text_{i}"] = pd.Series(values, dtype='str')
+    return pd.DataFrame(data)
+
+def profile_frame(profile, rows, seed=0):
+    return synthetic_frame(rows, seed=seed, **PROFILES[profile])
+
+def columns_of(frame, kind):
+    """Columns of one generated kind ('int', 'float' or 'text'), in order."""
+    return [col for col in frame.columns if col.startswith(f"{kind}_")]
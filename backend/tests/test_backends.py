@@ -0,0 +1,120 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import subprocess
+import time
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app import store
+from app import backends
+from app.backends import DirectoryBackend, KeyValueBackend, LocalKV, InProcessBackend, LockLost
+
+client = TestClient(app)
+
+SAMPLE_CSV = b"ID,Primary Type,Score\n1,THEFT,1.0\n2,BATTERY,\n3,THEFT,3.0\n"
+
+@pytest.fixture(params=["directory", "kv"])
+def shared_backend(request, tmp_path):
+    if request.param == "directory":
+        store.use_backend(DirectoryBackend(str(tmp_path)))
+    else:
+        store.use_backend(KeyValueBackend(LocalKV()))
+    yield store.backend
+    store.use_backend(InProcessBackend())
+
+def _apply(session_id, action, columns, params=None):
+    return client.post("/apply_transformation?rows=10", data={
+        "session_id": session_id, "action": action, "columns": json.dumps(columns), "params": json.dumps(params or {}),
+    })
+
+def test_other_worker_picks_up_session(shared_backend):
+    session_id = client.post("/create_session", files={"file": ("data.csv", io.BytesIO(SAMPLE_CSV), "text/csv")}).json()["session_id"]
+    assert _apply(session_id, "impute", ["Score"], {"method": "mean"}).status_code == 200
+    # A fresh worker only has the backend to go on
+    store._forget(session_id)
+    response = _apply(session_id, "drop", ["ID"])
+    assert response.status_code == 200, response.text
+    assert response.json()["columns"] == ["Primary Type", "Score"]
+    store._forget(session_id)
+    response = client.post("/undo?rows=10", data={"session_id": session_id})
+    assert response.json()["columns"] == ["ID", "Primary Type", "Score"]
+    assert [row[2] for row in response.json()["data"]] == [1.0, 2.0, 3.0]
+    store._forget(session_id)
+    response = client.post("/undo?rows=10", data={"session_id": session_id})
+    assert response.json()["can_undo"] is False
+    assert response.json()["data"][1][2] is None
+    store.drop_dataset(session_id)
+    assert shared_backend.read_manifest(session_id) is None
+    assert not store.has_dataset(session_id)
+
+def test_unchanged_columns_are_not_rewritten(shared_backend):
+    store.put_dataset("backend-share", pd.read_csv(io.BytesIO(SAMPLE_CSV)))
+    df = store.get_current("backend-share")
+    store.push_version("backend-share", df.assign(Score=df["Score"].fillna(0)), {"Score"})
+    original, current = shared_backend.read_manifest("backend-share")["versions"]
+    assert dict(current["columns"])["ID"] == dict(original["columns"])["ID"]
+    assert dict(current["columns"])["Score"] != dict(original["columns"])["Score"]
+    assert current["index"] == original["index"]
+    store.drop_dataset("backend-share")
+
+def test_session_memory_counts_versions_held_by_the_backend(shared_backend):
+    session_id = client.post("/create_session", files={"file": ("data.csv", io.BytesIO(SAMPLE_CSV), "text/csv")}).json()["session_id"]
+    assert _apply(session_id, "impute", ["Score"], {"method": "mean"}).status_code == 200
+    # As another worker sees it: every version is only in the backend
+    store._forget(session_id)
+    response = client.post("/session_memory", data={"session_id": session_id})
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["versions"], report["backend_versions"], report["spilled_versions"], report["spilled_bytes"]) == (2, 2, 0, 0)
+    store.drop_dataset(session_id)
+
+def test_idle_sessions_expire_from_the_backend(shared_backend, monkeypatch):
+    idle = client.post("/create_session", files={"file": ("data.csv", io.BytesIO(SAMPLE_CSV), "text/csv")}).json()["session_id"]
+    manifest = shared_backend.read_manifest(idle)
+    assert idle in shared_backend.session_ids()
+    # Last used by some worker two hours ago
+    manifest["last_used"] -= 7200
+    shared_backend.write_manifest(idle, manifest)
+    monkeypatch.setattr(store, "SESSION_TTL", 3600)
+    monkeypatch.setattr(store, "_last_sweep", float("-inf"))
+    active = client.post("/create_session", files={"file": ("other.csv", io.BytesIO(SAMPLE_CSV + b"4,THEFT,4.0\n"), "text/csv")}).json()["session_id"]
+    assert shared_backend.read_manifest(idle) is None
+    assert idle not in shared_backend.session_ids() and not store.has_dataset(idle)
+    assert shared_backend.read_manifest(active) is not None
+    store.drop_dataset(active)
+
+def test_kv_lock_is_renewed_while_held(monkeypatch):
+    monkeypatch.setattr(backends, "LOCK_TIMEOUT", 0.1)
+    kv = LocalKV()
+    with backends._KeyLock(kv, "s/lock") as held:
+        time.sleep(0.4)
+        # Still ours, well past the timeout
+        assert kv.get("s/lock") == held.token
+        assert not kv.set("s/lock", b"other", nx=True, px=100)
+    assert kv.get("s/lock") is None
+
+def test_kv_lock_release_leaves_a_takeover_alone(monkeypatch):
+    monkeypatch.setattr(backends, "LOCK_TIMEOUT", 0.1)
+    kv = LocalKV()
+    with pytest.raises(LockLost):
+        with backends._KeyLock(kv, "s/lock"):
+            # The lock expired and another worker took it
+            kv.set("s/lock", b"other", px=10_000)
+            time.sleep(0.1)
+    assert kv.get("s/lock") == b"other"
+
+def test_directory_backend_across_processes(tmp_path):
+    store.use_backend(DirectoryBackend(str(tmp_path)))
+    try:
+        session_id = client.post("/create_session", files={"file": ("data.csv", io.BytesIO(SAMPLE_CSV), "text/csv")}).json()["session_id"]
+        env = dict(os.environ, DATAPREPPER_SESSION_BACKEND="directory", DATAPREPPER_SESSION_DIR=str(tmp_path))
+        script = f"from app.crud import apply_transformation; apply_transformation(None, {session_id!r}, 'drop', ['ID'], {{}})"
+        subprocess.run([sys.executable, "-c", script], cwd=os.path.join(os.path.dirname(__file__), '..'), env=env, check=True)
+        response = client.post("/page", data={"session_id": session_id})
+        assert response.json()["columns"] == ["Primary Type", "Score"], response.text
+    finally:
+        store.use_backend(InProcessBackend())
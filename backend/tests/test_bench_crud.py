@@ -0,0 +1,37 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+from app import store
+from benchmarks.synthetic import synthetic_frame, columns_of
+from benchmarks.bench_crud import main, run_suite, compare
+
+def test_synthetic_frame_shape():
+    df = synthetic_frame(5_000, columns=10, text_share=0.3, missing=0.2, cardinality=7)
+    assert df.shape == (5_000, 10)
+    assert len(columns_of(df, 'text')) == 3 and columns_of(df, 'int') and columns_of(df, 'float')
+    assert df[columns_of(df, 'text')[0]].nunique() == 7
+    assert 0.15 < df[columns_of(df, 'float')[0]].isna().mean() < 0.25
+    assert df[columns_of(df, 'int')[0]].notna().all()
+    assert synthetic_frame(100, seed=3).equals(synthetic_frame(100, seed=3))
+
+def test_suite_runs_every_case_and_compares(tmp_path):
+    sessions = set(store.sessions)
+    report = run_suite([300], ['narrow-mixed'], ['direct', 'http'], repeats=1, log=lambda line: None)
+    results = report['results']
+    assert not [result for result in results if 'error' in result], results
+    cases = {result['case'] for result in results}
+    assert {'create_session', 'preview_upload', 'column_stats', 'chain_apply', 'chain_undo', 'transform:filter_compound'} <= cases
+    assert all(result['seconds_min'] > 0 and result['peak_bytes'] > 0 for result in results)
+    assert set(store.sessions) == sessions, "Runs drop the sessions they open"
+    skipped = run_suite([10_000_000], ['wide-mixed'], ['direct'], log=lambda line: None)['results']
+    assert skipped == [{'profile': 'wide-mixed', 'rows': 10_000_000, 'skipped': 'more than 200000000 cells'}]
+    slower = json.loads(json.dumps(report))
+    slower['results'][0]['seconds_min'] *= 2
+    rows, regressions = compare(report, slower)
+    assert len(rows) == len(results) and [row['case'] for row in regressions] == [results[0]['case']]
+    base, head = tmp_path / 'base.json', tmp_path / 'head.json'
+    base.write_text(json.dumps(report))
+    head.write_text(json.dumps(slower))
+    assert main(['--compare', str(base), str(head)]) == 1
+    assert main(['--compare', str(base), str(base)]) == 0
@@ -0,0 +1,103 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+pytest.importorskip("pyarrow")
+client = TestClient(app)
+
+def sample_csv(n=1000):
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        'ID': np.arange(n),
+        'Primary Type': rng.choice(['THEFT', 'BATTERY', 'ASSAULT'], n),
+        'Score': rng.normal(10, 2, n),
+    })
+    df.loc[::10, 'Score'] = np.nan
+    return df, df.to_csv(index=False).encode()
+
+def create_chunked_session(csv_bytes):
+    response = client.post(
+        "/create_session?chunked=true",
+        files={"file": ("sample.csv", io.BytesIO(csv_bytes), "text/csv")}
+    )
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    return response.json()["session_id"]
+
+def apply(session_id, action, columns, params=None):
+    response = client.post(
+        "/apply_transformation?rows=5",
+        data={"session_id": session_id, "action": action, "columns": json.dumps(columns), "params": json.dumps(params or {})}
+    )
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    return response.json()
+
+def test_chunked_two_pass_steps_match_in_memory(monkeypatch):
+    import app.chunked
+    monkeypatch.setattr(app.chunked, "CHUNK_ROWS", 128)
+    df, csv_bytes = sample_csv()
+    session_id = create_chunked_session(csv_bytes)
+    assert app.chunked.chunked_sessions[session_id]['chunk_rows'] == 128
+    apply(session_id, "impute", ["Score"], {"method": "median"})
+    apply(session_id, "scale", ["Score"], {"method": "standard"})
+    apply(session_id, "encode", ["Primary Type"], {"method": "ordinal"})
+    apply(session_id, "filter", ["Primary Type"], {"min_value": "1"})
+    response = client.post("/export", data={"session_id": session_id, "format": "csv"})
+    result = pd.read_csv(io.BytesIO(response.content))
+
+    expected = df.copy()
+    expected['Score'] = expected['Score'].fillna(expected['Score'].median())
+    expected['Score'] = (expected['Score'] - expected['Score'].mean()) / expected['Score'].std(ddof=0)
+    expected['Primary Type'] = expected['Primary Type'].astype('category').cat.codes
+    expected = expected[expected['Primary Type'] >= 1]
+    assert len(result) == len(expected)
+    assert np.allclose(result['Score'], expected['Score'])
+    assert (result['Primary Type'].to_numpy() == expected['Primary Type'].to_numpy()).all()
+
+def test_chunked_preview_page_stats_and_undo():
+    df, csv_bytes = sample_csv()
+    session_id = create_chunked_session(csv_bytes)
+    data = apply(session_id, "drop", ["ID"])
+    assert data["columns"] == ["Primary Type", "Score"]
+    assert data["can_undo"] is True
+    response = client.post("/page?offset=998&limit=5", data={"session_id": session_id})
+    page = response.json()
+    assert page["total_rows"] == 1000
+    assert len(page["data"]) == 2
+    response = client.post("/column_stats", data={"session_id": session_id})
+    stats = response.json()["stats"]
+    assert stats["Score"]["count"] == df["Score"].count()
+    assert stats["Primary Type"]["unique"] == 3
+    response = client.post("/undo?rows=5", data={"session_id": session_id})
+    assert response.json()["columns"] == ["ID", "Primary Type", "Score"]
+    assert response.json()["can_undo"] is False
+
+def test_chunked_dedupe_streams_across_chunks(monkeypatch):
+    import app.chunked
+    monkeypatch.setattr(app.chunked, "CHUNK_ROWS", 64)
+    df, csv_bytes = sample_csv()
+    session_id = create_chunked_session(csv_bytes)
+    apply(session_id, "dedupe", ["Primary Type"])
+    response = client.post("/export", data={"session_id": session_id, "format": "csv"})
+    result = pd.read_csv(io.BytesIO(response.content))
+    expected = df.drop_duplicates(subset=["Primary Type"])
+    assert result["ID"].tolist() == expected["ID"].tolist()
+
+def test_idle_chunked_session_expires_with_its_spills(monkeypatch):
+    import app.chunked
+    _, csv_bytes = sample_csv(10)
+    idle = create_chunked_session(csv_bytes)
+    directory = app.chunked.chunked_sessions[idle]['dir']
+    monkeypatch.setattr(app.chunked, "SESSION_TTL", 60)
+    app.chunked.chunked_sessions[idle]['last_used'] -= 120
+    create_chunked_session(csv_bytes)
+    assert idle not in app.chunked.chunked_sessions
+    assert not os.path.exists(directory)
+    response = client.post("/page?offset=0&limit=5", data={"session_id": idle})
+    assert response.status_code == 400
@@ -0,0 +1,62 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from fastapi.testclient import TestClient
+from app.main import app
+from app.columnar import ARROW_STREAM, wants_arrow
+
+client = TestClient(app)
+
+def _session(n=1_000):
+    rng = np.random.default_rng(11)
+    df = pd.DataFrame({
+        'ID': np.arange(n),
+        'Primary Type': rng.choice(['THEFT', 'BATTERY'], n),
+        'Latitude': rng.normal(41.8, 0.1, n),
+    })
+    df.loc[::7, 'Latitude'] = np.nan
+    csv = df.to_csv(index=False).encode()
+    response = client.post("/create_session", files={"file": ("data.csv", io.BytesIO(csv), "text/csv")})
+    return response.json()["session_id"], df
+
+def _read(response):
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == ARROW_STREAM
+    return pa.ipc.open_stream(response.content).read_all()
+
+def test_accept_negotiation():
+    assert not wants_arrow(None)
+    assert not wants_arrow("application/json, */*")
+    assert wants_arrow(ARROW_STREAM)
+    assert wants_arrow(f"application/json;q=0.5, {ARROW_STREAM}")
+    assert not wants_arrow(f"{ARROW_STREAM};q=0.5, application/json")
+    assert not wants_arrow(f"{ARROW_STREAM};q=0")
+
+def test_arrow_preview_and_page():
+    session_id, df = _session()
+    headers = {"Accept": ARROW_STREAM}
+    table = _read(client.post("/preview?rows=10", data={"session_id": session_id}, headers=headers))
+    assert table.column_names == ['ID', 'Primary Type', 'Latitude'] and table.num_rows == 10
+    assert table.column('Latitude').null_count == 2, "NaN travels as Arrow nulls"
+    response = client.post("/page?offset=100&limit=50", data={"session_id": session_id, "sort_by": "ID", "ascending": "false"}, headers=headers)
+    assert "Accept" in response.headers["vary"]
+    table = _read(response)
+    assert table.column('ID').to_pylist() == list(range(899, 849, -1))
+    assert table.schema.metadata[b'total_rows'] == b'1000'
+    json_page = client.post("/page?offset=100&limit=50", data={"session_id": session_id, "sort_by": "ID", "ascending": "false"}).json()
+    assert [row[0] for row in json_page["data"]] == table.column('ID').to_pylist(), "JSON stays the default"
+
+def test_arrow_column_stats():
+    session_id, df = _session()
+    expected = client.post("/column_stats", data={"session_id": session_id}).json()["stats"]
+    table = _read(client.post("/column_stats", data={"session_id": session_id}, headers={"Accept": ARROW_STREAM}))
+    rows = {row['column']: row for row in table.to_pylist()}
+    assert list(rows) == list(expected)
+    assert rows['Latitude']['mean'] == expected['Latitude']['mean']
+    assert rows['Latitude']['histogram']['counts'] == expected['Latitude']['histogram']['counts']
+    assert rows['Primary Type']['mean'] is None
+    assert rows['Primary Type']['value_counts'] == expected['Primary Type']['value_counts']
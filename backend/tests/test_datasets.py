@@ -0,0 +1,43 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+from fastapi.testclient import TestClient
+from app.main import app
+from app import datasets, crud
+
+client = TestClient(app)
+
+def _upload(csv):
+    response = client.post("/create_session", files={"file": ("daily.csv", io.BytesIO(csv), "text/csv")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_reupload_skips_parse_and_profiling(monkeypatch):
+    datasets.clear_parse_cache()
+    csv = b"ID,Primary Type,Score\n1,THEFT,1.5\n2,BATTERY,\n3,THEFT,3.0\n"
+    first = _upload(csv)
+    assert first["ingest"]["cached"] is False
+    client.post("/column_stats", data={"session_id": first["session_id"]})
+    def fail(*args, **kwargs):
+        raise AssertionError("Known content should not be parsed or profiled again")
+    monkeypatch.setattr(datasets, "read_csv_with_report", fail)
+    monkeypatch.setattr(crud, "profile_columns", fail)
+    second = _upload(csv)
+    assert second["ingest"]["cached"] is True
+    assert second["ingest"]["content_hash"] == first["ingest"]["content_hash"]
+    assert second["session_id"] != first["session_id"]
+    response = client.post("/column_stats", data={"session_id": second["session_id"]})
+    assert response.status_code == 200, response.text
+
+def test_sessions_on_same_content_stay_independent():
+    csv = b"ID,Score\n1,1.0\n2,\n"
+    first, second = _upload(csv)["session_id"], _upload(csv)["session_id"]
+    client.post("/apply_transformation", data={"session_id": first, "action": "drop", "columns": "Score"})
+    response = client.post("/preview", data={"session_id": second})
+    assert response.json()["columns"] == ["ID", "Score"]
+
+def test_hash_covers_whole_file():
+    head = b"ID,Score\n" + b"1,1.0\n" * 300_000
+    assert len(head) > datasets.HASH_BLOCK_BYTES
+    assert datasets.content_hash(io.BytesIO(head + b"2,2.0\n")) != datasets.content_hash(io.BytesIO(head + b"3,3.0\n"))
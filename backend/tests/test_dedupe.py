@@ -0,0 +1,81 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.dedupe import FingerprintSet, first_occurrences
+from app.transforms import apply_steps, make_step
+
+client = TestClient(app)
+
+def sample_frame(n=2000):
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        'city': pd.Series(rng.choice(['Oslo', 'Lima', 'Pune', None], n), dtype='str'),
+        'score': rng.choice([0.0, -0.0, 1.5, np.nan], n),
+        'count': rng.integers(0, 3, n),
+    })
+    df['kind'] = df['city'].astype('category')
+    return df
+
+@pytest.mark.parametrize("subset", [None, ['city'], ['score'], ['kind', 'count'], ['city', 'score', 'count']])
+def test_first_occurrences_match_pandas(subset):
+    df = sample_frame()
+    keep = first_occurrences(df[subset] if subset else df)
+    expected = ~df.duplicated(subset=subset).to_numpy()
+    assert (keep == expected).all()
+
+def test_fingerprint_set_carries_over_batches():
+    df = sample_frame()
+    seen = FingerprintSet(track=True)
+    keep = np.concatenate([first_occurrences(df.iloc[start:start + 97], seen) for start in range(0, len(df), 97)])
+    assert (keep == ~df.duplicated().to_numpy()).all()
+    assert seen.rows == len(df)
+    assert len(seen) == (~df.duplicated()).sum()
+    groups = df.groupby(list(df.columns), dropna=False, observed=True).ngroup()
+    first, count = seen.top_groups(1)[0]
+    assert count == groups.value_counts().max()
+    assert (groups == groups.iloc[first]).sum() == count
+
+def test_dedupe_step_after_filter():
+    df = sample_frame()
+    steps = [make_step('filter', ['count'], {'min_value': 1}), make_step('dedupe', ['city', 'count'], {})]
+    result, _ = apply_steps(df, steps)
+    expected = df[df['count'] >= 1].drop_duplicates(subset=['city', 'count'])
+    assert result.index.tolist() == expected.index.tolist()
+
+def test_drop_duplicates_endpoint_reports_duplicates():
+    df = pd.DataFrame({'a': [1, 1, 2, 1, 2, 3], 'b': ['x', 'x', 'y', 'z', 'y', 'w']})
+    response = client.post(
+        "/drop_duplicates?rows=10",
+        files={"file": ("dupes.csv", io.BytesIO(df.to_csv(index=False).encode()), "text/csv")},
+        data={"subset": json.dumps(['a', 'b'])},
+    )
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    body = response.json()
+    assert body["data"] == [[1, 'x'], [2, 'y'], [1, 'z'], [3, 'w']]
+    report = body["duplicates"]
+    assert (report["rows"], report["unique_rows"], report["duplicate_rows"]) == (6, 4, 2)
+    assert report["top_groups"] == [{"values": {"a": 1, "b": "x"}, "count": 2}, {"values": {"a": 2, "b": "y"}, "count": 2}]
+
+def test_drop_duplicates_chunked_session(monkeypatch):
+    pytest.importorskip("pyarrow")
+    import app.chunked
+    monkeypatch.setattr(app.chunked, "CHUNK_ROWS", 50)
+    df = pd.DataFrame({'id': np.arange(400), 'group': np.arange(400) % 7})
+    response = client.post(
+        "/create_session?chunked=true",
+        files={"file": ("groups.csv", io.BytesIO(df.to_csv(index=False).encode()), "text/csv")}
+    )
+    session_id = response.json()["session_id"]
+    response = client.post("/drop_duplicates?rows=3", data={"session_id": session_id, "subset": json.dumps(['group'])})
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    body = response.json()
+    assert body["data"] == [[0, 0], [1, 1], [2, 2]]
+    assert body["duplicates"]["unique_rows"] == 7
+    assert body["duplicates"]["top_groups"][0] == {"values": {"group": 0}, "count": 58}
@@ -0,0 +1,71 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app.dtypes import optimize_frame, cast_series
+
+client = TestClient(app)
+
+def _crimes(n=4_000):
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        'ID': np.arange(n) + 10_000_000,
+        'Date': pd.date_range('2020-01-01', periods=n, freq='h').strftime('%m/%d/%Y %I:%M:%S %p'),
+        'Primary Type': rng.choice(['THEFT', 'BATTERY', 'ASSAULT', None], n),
+        'Beat': rng.integers(100, 2500, n),
+        'Score': rng.integers(0, 400, n) / 4,
+        'Latitude': rng.normal(41.8, 0.1, n),
+        'Case Number': [f"JA{i:06d}" for i in range(n)],
+    })
+
+def test_optimize_frame_keeps_values():
+    df = _crimes().astype({'Primary Type': 'str', 'Case Number': 'str'})
+    optimized, report = optimize_frame(df)
+    dtypes = {col: str(dtype) for col, dtype in optimized.dtypes.items()}
+    assert dtypes['ID'] == 'int32' and dtypes['Beat'] == 'int16'
+    assert dtypes['Score'] == 'float32', "Quarters round-trip through float32"
+    assert dtypes['Latitude'] == 'float64', "Arbitrary doubles keep full precision"
+    assert dtypes['Primary Type'] == 'category'
+    assert dtypes['Date'].startswith('datetime64')
+    assert optimized['Case Number'].dtype == df['Case Number'].dtype, "Identifiers stay text"
+    assert optimized['Date'].iloc[13] == pd.Timestamp('2020-01-01 13:00')
+    for col in ('ID', 'Beat', 'Score', 'Latitude', 'Primary Type', 'Case Number'):
+        pd.testing.assert_series_equal(optimized[col].astype(df[col].dtype), df[col], check_dtype=False)
+    assert report['bytes_after'] < report['bytes_before'] / 2
+    assert report['columns']['Primary Type']['bytes_after'] < report['columns']['Primary Type']['bytes_before']
+
+def test_cast_series():
+    series = pd.Series(['b', 'a', 'b'])
+    category = cast_series(series, 'category')
+    assert isinstance(category.dtype, pd.CategoricalDtype)
+    assert cast_series(category, 'category') is category, "No-op casts return the column itself"
+    dates = cast_series(pd.Series(['03/01/2021 01:30:00 PM', None]), 'datetime')
+    assert dates.iloc[0] == pd.Timestamp('2021-03-01 13:30') and pd.isna(dates.iloc[1])
+    assert cast_series(pd.Series([1, 2, 3]), 'auto').dtype == np.int8
+
+def test_ingest_reports_memory_and_transforms_work_on_categories():
+    csv = _crimes().to_csv(index=False).encode()
+    response = client.post("/create_session", files={"file": ("crimes.csv", io.BytesIO(csv), "text/csv")})
+    assert response.status_code == 200, response.text
+    ingest = response.json()["ingest"]
+    assert ingest["dtypes"]["columns"]["Primary Type"]["dtype_after"] == "category"
+    assert ingest["memory_bytes"] < ingest["dtypes"]["bytes_before"] / 2
+    session_id = response.json()["session_id"]
+    response = client.post("/apply_transformation", data={
+        "session_id": session_id, "action": "impute", "columns": "Primary Type",
+        "params": json.dumps({"method": "constant", "value": "UNKNOWN"}),
+    })
+    assert response.status_code == 200, response.text
+    response = client.post("/apply_transformation", data={
+        "session_id": session_id, "action": "encode", "columns": "Primary Type", "params": json.dumps({"method": "onehot"}),
+    })
+    assert response.json()["columns"][-4:] == [f"Primary Type_{value}" for value in ('ASSAULT', 'BATTERY', 'THEFT', 'UNKNOWN')]
+    response = client.post("/apply_transformation", data={
+        "session_id": session_id, "action": "filter", "columns": "Date", "params": json.dumps({"min_value": "2020-03-01"}),
+    })
+    assert response.json()["data"][0][1] == "2020-03-01T00:00:00"
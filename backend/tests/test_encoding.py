@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app.profiling import profile_columns
+from app.transforms import apply_step
+
+client = TestClient(app)
+
+def _blocks(n=20_000, blocks=2_000):
+    rng = np.random.default_rng(5)
+    # A few common blocks and a long tail
+    common = rng.choice(['001XX N STATE ST', '002XX W MADISON ST', '003XX S CLARK ST'], n // 2)
+    tail = rng.integers(0, blocks, n - n // 2).astype(str)
+    return pd.DataFrame({'ID': np.arange(n), 'Block': np.concatenate([common, tail])})
+
+def test_capped_onehot_keeps_top_categories():
+    df = _blocks()
+    out, _ = apply_step(df, 'encode', ['Block'], {'method': 'onehot', 'max_categories': 3})
+    assert out.columns.tolist() == ['ID', 'Block_001XX N STATE ST', 'Block_002XX W MADISON ST', 'Block_003XX S CLARK ST', 'Block_other']
+    assert (out.drop(columns='ID').sum(axis=1) == 1).all(), "Every row lands in exactly one indicator"
+    assert all(dtype == np.uint8 for dtype in out.dtypes.iloc[1:])
+    frequent, _ = apply_step(df, 'encode', ['Block'], {'method': 'onehot', 'min_frequency': 0.1})
+    assert len(frequent.columns) == 5
+
+def test_sparse_onehot_profiles_without_densifying(monkeypatch):
+    df = _blocks()
+    dense, _ = apply_step(df, 'encode', ['Block'], {'method': 'onehot', 'max_categories': 50})
+    sparse, _ = apply_step(df, 'encode', ['Block'], {'method': 'onehot', 'max_categories': 50, 'sparse': True})
+    indicators = dense.columns[1:]
+    assert sparse[indicators].memory_usage(index=False).sum() < dense[indicators].memory_usage(index=False).sum() / 5
+    def densified(*args, **kwargs):
+        raise AssertionError("Sparse columns should not be densified")
+    monkeypatch.setattr(pd.arrays.SparseArray, "to_dense", densified)
+    sparse_stats = profile_columns(sparse)
+    monkeypatch.undo()
+    dense_stats = profile_columns(dense)
+    for col in dense.columns[1:]:
+        for key in ('count', 'unique', 'mean', 'median', 'min', 'max', 'histogram', 'data_issues'):
+            expected, actual = dense_stats[col][key], sparse_stats[col][key]
+            if key in ('mean', 'data_issues'):
+                assert json.dumps(actual, sort_keys=True)[:12] == json.dumps(expected, sort_keys=True)[:12], f"{col} {key}"
+            else:
+                assert actual == expected, f"{col} {key}: {actual} != {expected}"
+
+def test_sparse_encoding_in_session_and_export():
+    csv = _blocks(2_000, 50).to_csv(index=False).encode()
+    session_id = client.post("/create_session", files={"file": ("blocks.csv", io.BytesIO(csv), "text/csv")}).json()["session_id"]
+    response = client.post("/apply_transformation", data={
+        "session_id": session_id, "action": "encode", "columns": "Block",
+        "params": json.dumps({"method": "onehot", "sparse": True, "max_categories": 10}),
+    })
+    assert response.status_code == 200, response.text
+    assert len(response.json()["columns"]) == 12
+    assert response.json()["data"][0][1] in (0, 1)
+    stats = client.post("/column_stats", data={"session_id": session_id}).json()["stats"]
+    assert stats['Block_other']['count'] == 2_000
+    exported = client.post("/export", data={"session_id": session_id, "format": "parquet"})
+    assert exported.status_code == 200
+    assert pd.read_parquet(io.BytesIO(exported.content))['Block_other'].dtype == np.uint8
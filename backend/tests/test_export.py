@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import gzip
+import io
+import json
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+SAMPLE_CSV = (
+    "ID,Primary Type,Score\n"
+    "1,THEFT,1.5\n"
+    "2,BATTERY,\n"
+    "3,THEFT,3.0\n"
+    "4,ASSAULT,4.0\n"
+    "5,THEFT,5.0\n"
+).encode()
+
+def create_session():
+    response = client.post(
+        "/create_session",
+        files={"file": ("sample.csv", io.BytesIO(SAMPLE_CSV), "text/csv")}
+    )
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    session_id = response.json()["session_id"]
+    client.post(
+        "/apply_transformation",
+        data={"session_id": session_id, "action": "drop", "columns": json.dumps(["Primary Type"])}
+    )
+    return session_id
+
+def test_export_csv_in_chunks():
+    session_id = create_session()
+    response = client.post("/export?chunk_rows=2", data={"session_id": session_id, "format": "csv"})
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    assert 'filename="processed_data.csv"' in response.headers["content-disposition"]
+    df = pd.read_csv(io.BytesIO(response.content))
+    assert df.columns.tolist() == ["ID", "Score"]
+    assert df["ID"].tolist() == [1, 2, 3, 4, 5]
+    assert df["Score"].isnull().sum() == 1
+
+def test_export_gzip_csv():
+    session_id = create_session()
+    response = client.post("/export?chunk_rows=2", data={"session_id": session_id, "format": "csv.gz"})
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    df = pd.read_csv(io.BytesIO(gzip.decompress(response.content)))
+    assert df["ID"].tolist() == [1, 2, 3, 4, 5]
+
+def test_export_parquet():
+    pytest.importorskip("pyarrow")
+    session_id = create_session()
+    response = client.post("/export?chunk_rows=2", data={"session_id": session_id, "format": "parquet"})
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    df = pd.read_parquet(io.BytesIO(response.content))
+    assert df.columns.tolist() == ["ID", "Score"]
+    assert df["ID"].tolist() == [1, 2, 3, 4, 5]
+
+def test_export_rejects_unknown_format():
+    session_id = create_session()
+    response = client.post("/export", data={"session_id": session_id, "format": "xlsx"})
+    assert response.status_code == 400, f"Status code: {response.status_code}, Response: {response.text}"
+
+def test_export_prepares_on_the_worker_pool(monkeypatch):
+    import threading
+    import app.main
+    threads = []
+    export_dataset = app.main.export_dataset
+
+    def spy(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return export_dataset(*args, **kwargs)
+    monkeypatch.setattr(app.main, "export_dataset", spy)
+    session_id = create_session()
+    response = client.post("/export", data={"session_id": session_id, "format": "csv"})
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    assert len(threads) == 1 and threads[0].startswith("dataprepper")
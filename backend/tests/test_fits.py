@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app.store import current_version
+from app.transforms import apply_steps, make_step
+
+client = TestClient(app)
+
+def _session(n=500):
+    rng = np.random.default_rng(n)
+    df = pd.DataFrame({'ID': np.arange(n), 'Score': rng.normal(10, 2, n), 'Kind': rng.choice(['a', 'b', 'c'], n)})
+    df.loc[::9, 'Score'] = np.nan
+    response = client.post("/create_session", files={"file": ("fits.csv", io.BytesIO(df.to_csv(index=False).encode()), "text/csv")})
+    return df, response.json()["session_id"]
+
+def test_previews_fit_once_per_version(monkeypatch):
+    import app.transforms
+    fitted = []
+    fit_step = app.transforms.fit_step
+
+    def spy(df, action, columns, params):
+        fitted.append((action, tuple(columns)))
+        return fit_step(df, action, columns, params)
+    monkeypatch.setattr(app.transforms, "fit_step", spy)
+    df, session_id = _session()
+    for _ in range(2):
+        response = client.post("/scale?rows=3", data={"session_id": session_id, "method": "standard", "columns": '["Score"]'})
+        assert response.status_code == 200, response.text
+    score = df['Score']
+    expected = (score.iloc[:3] - score.mean()) / score.std(ddof=0)
+    assert np.allclose([np.nan if row[1] is None else row[1] for row in response.json()["data"]], expected, equal_nan=True)
+    client.post("/impute?rows=3", data={"session_id": session_id, "method": "median", "columns": '["Score"]'})
+    assert fitted == [("scale", ("Score",)), ("impute", ("Score",))]
+    # Applying the step reuses the preview's fit; the encoded column's fit carries over to the new version
+    client.post("/encode?rows=3", data={"session_id": session_id, "method": "ordinal", "columns": '["Kind"]'})
+    response = client.post(
+        "/apply_transformation",
+        data={"session_id": session_id, "action": "scale", "columns": '["Score"]', "params": json.dumps({"method": "standard"})},
+    )
+    assert response.status_code == 200, response.text
+    assert fitted == [("scale", ("Score",)), ("impute", ("Score",)), ("encode", ("Kind",))]
+    assert [key[0] for key in current_version(session_id)['fits']] == ["Kind"]
+
+def test_scale_keeps_float32():
+    df = pd.DataFrame({'x': np.array([1.0, 2.0, np.nan, 5.0], dtype=np.float32), 'y': [1, 2, 3, 4]})
+    result, _ = apply_steps(df, [make_step('scale', ['x', 'y'], {'method': 'minmax'})])
+    assert result['x'].dtype == np.float32 and result['y'].dtype == np.float64
+    assert np.allclose(result['x'], [0.0, 0.25, np.nan, 1.0], equal_nan=True)
+    assert df['x'].iloc[0] == 1.0
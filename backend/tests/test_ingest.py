@@ -0,0 +1,34 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import pytest
+from app import ingest
+
+SAMPLE_CSV = b"ID,Primary Type,Score\n1,THEFT,1.5\n2,BATTERY,\n3,THEFT,3.0\n"
+
+def test_report_describes_parse():
+    df, report = ingest.read_csv_with_report(io.BytesIO(SAMPLE_CSV))
+    assert df.shape == (3, 3)
+    assert report['rows'] == 3 and report['columns'] == 3
+    assert report['engine'] in ingest.ENGINES
+    assert report['parse_seconds'] >= 0
+    assert report['memory_bytes'] > 0
+
+def test_falls_back_when_engine_fails(monkeypatch):
+    def broken(file, **kwargs):
+        file.read()
+        raise ValueError("unsupported")
+    monkeypatch.setattr(ingest, "CSV_ENGINE", "auto")
+    monkeypatch.setattr(ingest, "ENGINE_ORDER", ["broken", "c"])
+    monkeypatch.setitem(ingest.ENGINES, "broken", broken)
+    monkeypatch.setattr(ingest, "_arrow_string_dtype", lambda: object)
+    df, report = ingest.read_csv_with_report(io.BytesIO(SAMPLE_CSV))
+    assert report['engine'] == 'c'
+    assert df['Primary Type'].tolist() == ['THEFT', 'BATTERY', 'THEFT']
+
+def test_preview_rows_use_c_engine(monkeypatch):
+    monkeypatch.setattr(ingest, "CSV_ENGINE", "auto")
+    df, report = ingest.read_csv_with_report(io.BytesIO(SAMPLE_CSV), nrows=2)
+    assert report['engine'] == 'c'
+    assert len(df) == 2
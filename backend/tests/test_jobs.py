@@ -0,0 +1,102 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import time
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app import crud, jobs
+from app.profiling import profile_columns
+
+def _session(client, n=2000):
+    # Distinct content per call, so sessions do not share the parse cache's stats
+    start = time.time_ns() % 10 ** 9
+    df = pd.DataFrame({'ID': range(start, start + n), 'Score': [float(i % 7) for i in range(n)], 'Type': ['THEFT', 'BATTERY'] * (n // 2), 'Beat': [i % 300 for i in range(n)]})
+    return client.post("/create_session", files={"file": ("jobs.csv", io.BytesIO(df.to_csv(index=False).encode()), "text/csv")}).json()["session_id"]
+
+def _wait(client, job_id, until=lambda state: state["status"] in jobs.FINISHED, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = client.get(f"/jobs/{job_id}").json()
+        if until(state):
+            return state
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not get there: {state}")
+
+@pytest.fixture
+def slow_profile(monkeypatch):
+    # One column every 50 ms, reported as it finishes
+    def profile(df, columns=None, progress=None):
+        for col in columns:
+            time.sleep(0.05)
+            progress(profile_columns(df, [col]))
+    monkeypatch.setattr(crud, "profile_columns", profile)
+
+def test_stats_job_streams_progress_and_caches_result():
+    # The context manager keeps one event loop alive across requests, as a server does
+    with TestClient(app) as client:
+        session_id = _session(client)
+        response = client.post("/jobs", data={"kind": "column_stats", "session_id": session_id})
+        assert response.status_code == 202 and response.json()["status"] in ("queued", "running")
+        job_id = response.json()["job_id"]
+        with client.stream("GET", f"/jobs/{job_id}/events") as stream:
+            events = [line for line in stream.iter_lines() if line]
+        names = [line.split(": ", 1)[1] for line in events if line.startswith("event:")]
+        states = [json.loads(line.split(": ", 1)[1]) for line in events if line.startswith("data:")]
+        assert names[-1] == "done" and set(names[:-1]) <= {"progress"}
+        assert states[-1]["done"] == states[-1]["total"] == 4
+        stats = client.post("/column_stats", data={"session_id": session_id}).json()["stats"]
+        assert states[-1]["result"]["stats"] == stats
+
+def test_transformation_job_pushes_a_version():
+    with TestClient(app) as client:
+        session_id = _session(client)
+        job_id = client.post("/jobs", data={
+            "kind": "apply_transformation", "session_id": session_id, "action": "scale",
+            "columns": '["Score", "Beat"]', "params": '{"method": "minmax"}',
+        }).json()["job_id"]
+        state = _wait(client, job_id)
+        assert state["status"] == "done" and state["done"] == state["total"] == 2, state
+        assert state["result"]["can_undo"] and state["result"]["columns"] == ["ID", "Score", "Type", "Beat"]
+        page = client.post("/page?limit=5", data={"session_id": session_id}).json()
+        assert max(row[1] for row in page["data"]) <= 1.0
+        failed = _wait(client, client.post("/jobs", data={"kind": "apply_transformation", "session_id": session_id, "action": "scale", "columns": '["Nope"]'}).json()["job_id"])
+        assert failed["status"] == "failed" and "Nope" in failed["error"]
+        assert client.post("/jobs", data={"kind": "export", "session_id": session_id}).status_code == 400
+        assert client.get("/jobs/unknown").status_code == 404
+
+def test_cancel_keeps_finished_columns(slow_profile):
+    with TestClient(app) as client:
+        session_id = _session(client)
+        job_id = client.post("/jobs", data={"kind": "column_stats", "session_id": session_id}).json()["job_id"]
+        _wait(client, job_id, lambda state: state["done"] >= 1)
+        client.post(f"/jobs/{job_id}/cancel")
+        state = _wait(client, job_id)
+        assert state["status"] == "cancelled" and 1 <= state["done"] < 4 and "result" not in state
+        cached = crud.current_version(session_id)['stats']
+        assert 1 <= len(cached) < 4, "Columns finished before the cancel stay cached"
+
+def test_websocket_cancel_and_disconnect(slow_profile):
+    with TestClient(app) as client:
+        session_id = _session(client)
+        job_id = client.post("/jobs", data={"kind": "column_stats", "session_id": session_id}).json()["job_id"]
+        with client.websocket_connect(f"/jobs/{job_id}/ws") as socket:
+            assert socket.receive_json()["job_id"] == job_id
+            socket.send_text("not json")
+            socket.send_json({"action": "cancel"})
+            states = []
+            while not states or states[-1]["status"] not in jobs.FINISHED:
+                states.append(socket.receive_json())
+        assert states[-1]["status"] == "cancelled"
+        # A watcher leaving cancels the job; a detached job keeps running
+        crud.current_version(session_id)['stats'].clear()
+        abandoned = client.post("/jobs", data={"kind": "column_stats", "session_id": session_id}).json()["job_id"]
+        detached = client.post("/jobs", data={"kind": "column_stats", "session_id": session_id, "detach": "true"}).json()["job_id"]
+        for job_id in (abandoned, detached):
+            with client.websocket_connect(f"/jobs/{job_id}/ws") as socket:
+                socket.receive_json()
+        assert _wait(client, abandoned)["status"] == "cancelled"
+        assert _wait(client, detached)["status"] == "done"
@@ -0,0 +1,100 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import threading
+import time
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app import store, crud
+
+client = TestClient(app)
+
+def _frame(n=1000):
+    return pd.DataFrame({'ID': range(n), 'Score': [float(i % 7) for i in range(n)], 'Type': ['THEFT', 'BATTERY'] * (n // 2)})
+
+def test_cold_versions_spill_and_reload(monkeypatch, tmp_path):
+    monkeypatch.setattr(store, "VERSION_SPILL_DIR", str(tmp_path))
+    monkeypatch.setattr(store, "MEMORY_BUDGET", 0)
+    store.put_dataset("mem-spill", _frame())
+    original = store.get_current("mem-spill")
+    scaled = original.assign(Score=original['Score'] / 7)
+    store.push_version("mem-spill", scaled, {'Score'})
+    before = store.session_memory("mem-spill")
+    monkeypatch.setattr(store, "MEMORY_BUDGET", 1)
+    store.enforce_budget(keep="mem-spill")
+    after = store.session_memory("mem-spill")
+    assert after['spilled_versions'] == 1 and after['spilled_bytes'] > 0
+    assert after['resident_bytes'] < before['resident_bytes'], f"{after} vs {before}"
+    # The current version stays resident; undo maps the original back in
+    pd.testing.assert_frame_equal(store.get_current("mem-spill"), scaled)
+    store.pop_version("mem-spill")
+    pd.testing.assert_frame_equal(store.get_current("mem-spill"), original)
+    store.drop_dataset("mem-spill")
+    assert not os.listdir(tmp_path), "Spill files should go with the session"
+
+def test_idle_and_over_budget_sessions_are_dropped(monkeypatch, tmp_path):
+    monkeypatch.setattr(store, "VERSION_SPILL_DIR", str(tmp_path))
+    monkeypatch.setattr(store, "MEMORY_BUDGET", 0)
+    store.put_dataset("mem-idle", _frame())
+    store.put_dataset("mem-old", _frame())
+    store.put_dataset("mem-new", _frame())
+    store._last_used["mem-idle"] -= 3600
+    monkeypatch.setattr(store, "SESSION_TTL", 60)
+    monkeypatch.setattr(store, "MEMORY_BUDGET", store.session_memory("mem-new")['resident_bytes'] + 1)
+    store.enforce_budget(keep="mem-new")
+    assert not store.has_dataset("mem-idle"), "Idle session outlived its TTL"
+    assert not store.has_dataset("mem-old"), "Least recently used session should be evicted"
+    assert store.has_dataset("mem-new")
+    store.drop_dataset("mem-new")
+
+def test_memory_report_is_not_use():
+    store.put_dataset("mem-watched", _frame(10))
+    store._last_used["mem-watched"] -= 100
+    assert store.session_memory("mem-watched")['idle_seconds'] >= 100
+    store.memory_report()
+    assert store.session_memory("mem-watched")['idle_seconds'] >= 100, "Reading memory use refreshed the TTL"
+    store.drop_dataset("mem-watched")
+
+def test_forgotten_session_keeps_one_lock_for_waiters_and_new_callers():
+    sid = "forget-while-locked"
+    held = store.session_lock(sid)
+    held.acquire()
+    inside, overlaps = [], []
+
+    def use():
+        with store.session_lock(sid):
+            inside.append(None)
+            overlaps.append(len(inside))
+            time.sleep(0.2)
+            inside.pop()
+    waiter = threading.Thread(target=use)
+    waiter.start()
+    time.sleep(0.05)
+    # Expiry drops the session while its lock is held and a request waits on it
+    store._forget(sid)
+    newcomer = threading.Thread(target=use)
+    newcomer.start()
+    time.sleep(0.05)
+    held.release()
+    waiter.join()
+    newcomer.join()
+    assert overlaps == [1, 1]
+    del held
+    assert sid not in store._locks
+
+def test_memory_report_and_bounded_drop_cache(monkeypatch):
+    monkeypatch.setattr(crud, "DROPPED_CACHE_ENTRIES", 2)
+    csv = _frame(10).to_csv(index=False).encode()
+    session_id = client.post("/create_session", files={"file": ("data.csv", io.BytesIO(csv), "text/csv")}).json()["session_id"]
+    report = client.post("/session_memory", data={"session_id": session_id}).json()
+    assert report['versions'] == 1 and report['resident_bytes'] > 0
+    assert session_id in client.post("/session_memory").json()['sessions']
+    op_ids = [
+        client.post("/drop_columns_with_cache", data={"session_id": session_id, "columns": "Type"}).json()["operation_id"]
+        for _ in range(3)
+    ]
+    assert list(crud.dropped_columns_cache) == op_ids[1:]
+    response = client.post("/restore_dropped_columns", data={"session_id": session_id, "operation_id": op_ids[-1]})
+    assert response.status_code == 200, response.text
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import re
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app import metrics
+
+client = TestClient(app)
+
+def _csv(n=2000):
+    return pd.DataFrame({'ID': range(n), 'Score': [float(i % 7) for i in range(n)], 'Type': ['THEFT', 'BATTERY'] * (n // 2)}).to_csv(index=False).encode()
+
+def _samples(text, name):
+    return {line.split(' ')[0]: float(line.split(' ')[1]) for line in text.splitlines() if line.startswith(name)}
+
+def test_stage_breakdown_and_metrics():
+    metrics.reset()
+    response = client.post("/create_session", files={"file": ("metrics.csv", io.BytesIO(_csv()), "text/csv")})
+    stages = dict(re.findall(r'(\w+);dur=([\d.]+)', response.headers["server-timing"]))
+    assert {'upload_read', 'parse', 'total'} <= set(stages)
+    session_id = response.json()["session_id"]
+    response = client.post("/apply_transformation", data={"session_id": session_id, "action": "scale", "columns": '["Score"]', "params": '{"method": "minmax"}'})
+    assert {'transform', 'sanitize', 'serialize'} <= set(re.findall(r'(\w+);dur=', response.headers["server-timing"]))
+    for _ in range(2):
+        client.post("/column_stats", data={"session_id": session_id})
+    client.post("/create_session", files={"file": ("again.csv", io.BytesIO(_csv()), "text/csv")})
+    text = client.get("/metrics").text
+    lookups = _samples(text, 'dataprepper_cache_lookups_total')
+    assert lookups['dataprepper_cache_lookups_total{cache="parse",result="miss"}'] == 1
+    assert lookups['dataprepper_cache_lookups_total{cache="parse",result="hit"}'] == 1
+    assert lookups['dataprepper_cache_lookups_total{cache="stats",result="hit"}'] == 3
+    assert lookups['dataprepper_cache_lookups_total{cache="stats",result="miss"}'] == 3
+    requests = _samples(text, 'dataprepper_requests_total')
+    assert requests['dataprepper_requests_total{path="/create_session",status="200"}'] == 2
+    assert _samples(text, 'dataprepper_stage_seconds_count')['dataprepper_stage_seconds_count{stage="transform"}'] == 1
+    buckets = _samples(text, 'dataprepper_request_seconds_bucket{path="/column_stats"')
+    assert list(buckets.values()) == sorted(buckets.values()) and buckets['dataprepper_request_seconds_bucket{path="/column_stats",le="+Inf"}'] == 2
+    assert _samples(text, 'dataprepper_stage_frame_bytes')['dataprepper_stage_frame_bytes{stage="parse"}'] > 0
+    assert _samples(text, 'dataprepper_history_depth_max')['dataprepper_history_depth_max'] >= 1
+    assert _samples(text, 'dataprepper_process_rss_peak_bytes')['dataprepper_process_rss_peak_bytes'] > 0
+
+def test_profile_header(monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_REQUESTS", True)
+    monkeypatch.setattr(metrics, "PROFILE_INTERVAL", 0.001)
+    session_id = client.post("/create_session", files={"file": ("profile.csv", io.BytesIO(_csv(200_000)), "text/csv")}).json()["session_id"]
+    response = client.post("/column_stats", data={"session_id": session_id}, headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    assert int(response.headers["x-profile-samples"]) > 0 and response.headers["x-profile"]
+    stacks = client.get(f"/profiles/{response.headers['x-profile-id']}").text
+    assert "get_column_stats (crud.py:" in stacks
+    assert "x-profile-id" not in client.post("/column_stats", data={"session_id": session_id}).headers
+    assert client.get("/profiles/unknown").status_code == 404
@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app import pipeline
+from app.transforms import apply_step, make_step
+
+client = TestClient(app)
+
+def _frame(n=5000):
+    rng = np.random.default_rng(0)
+    score = rng.normal(size=n)
+    score[::7] = np.nan
+    return pd.DataFrame({
+        'ID': np.arange(n),
+        'Score': score,
+        'Type': rng.choice(['THEFT', 'BATTERY', 'ASSAULT'], size=n),
+    })
+
+STEPS = [
+    ('filter', ['Type'], {'regex': 'T'}),
+    ('impute', ['Score'], {'method': 'median'}),
+    ('scale', ['Score'], {'method': 'standard'}),
+    ('rename', [], {'rename_map': {'Type': 'Kind'}}),
+    ('encode', ['Kind'], {'method': 'ordinal'}),
+]
+
+def test_fused_plan_matches_steps_one_by_one():
+    df = _frame()
+    expected = df
+    for action, columns, params in STEPS:
+        expected, _ = apply_step(expected, action, columns, params)
+    fused, changed = pipeline.run_plan(df, [make_step(*step) for step in STEPS])
+    pd.testing.assert_frame_equal(fused, expected)
+    assert {'Score', 'Kind'} <= changed, f"Unexpected changed set: {changed}"
+
+def test_preview_reads_only_a_prefix(monkeypatch):
+    df = _frame()
+    steps = [make_step(*step) for step in STEPS]
+    seen = []
+    original = pipeline.apply_steps
+    def spy(frame, plan, partial=False, **kwargs):
+        seen.append((len(frame), len(frame.columns), partial))
+        return original(frame, plan, partial, **kwargs)
+    monkeypatch.setattr(pipeline, "apply_steps", spy)
+    preview = pipeline.preview_plan(df, steps, 10)
+    assert len(preview) == 10
+    # One projected fit pass over the full rows, then a short prefix for the window
+    assert seen[0] == (len(df), 2, True), f"Fit pass read {seen[0]}"
+    assert all(rows < len(df) for rows, _, _ in seen[1:]), f"Preview passes read {seen[1:]}"
+    full, _ = pipeline.run_plan(df, steps)
+    pd.testing.assert_frame_equal(preview, full.head(10))
+
+def test_lazy_session_defers_until_stats():
+    csv = _frame(200).to_csv(index=False).encode()
+    response = client.post("/create_session?lazy=true", files={"file": ("data.csv", io.BytesIO(csv), "text/csv")})
+    session_id = response.json()["session_id"]
+    for action, columns, params in STEPS[:3]:
+        response = client.post(
+            "/apply_transformation",
+            data={"session_id": session_id, "action": action, "columns": ",".join(columns), "params": json.dumps(params)},
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()["can_undo"]
+    from app.store import history_depth, pending_steps, current_version
+    assert len(pending_steps(session_id)) == 3 and len(current_version(session_id)['data']) == 3
+    stats = client.post("/column_stats", data={"session_id": session_id}).json()["stats"]
+    assert not pending_steps(session_id), "Stats should run the pending plan"
+    assert stats['Score']['missing_pct'] == 0
+    assert current_version(session_id)['steps'] and history_depth(session_id) == 3
+    # Undoing a fused version puts the earlier steps back in the plan
+    response = client.post("/undo", data={"session_id": session_id})
+    assert response.status_code == 200, response.text
+    assert len(pending_steps(session_id)) == 2 and history_depth(session_id) == 2
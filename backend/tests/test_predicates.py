@@ -0,0 +1,100 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app import predicates
+from app.predicates import parse_predicate, select_rows, SortedIndex, CodeIndex
+
+client = TestClient(app)
+
+def _crimes(n=20_000):
+    rng = np.random.default_rng(13)
+    df = pd.DataFrame({
+        'Beat': rng.integers(100, 2500, n).astype(np.int16),
+        'Latitude': rng.normal(41.8, 0.1, n),
+        'Primary Type': pd.Categorical(rng.choice(['THEFT', 'BATTERY', 'ASSAULT'], n)),
+        'Description': pd.Series(rng.choice(['RETAIL THEFT', 'SIMPLE', 'AGG: HANDGUN'], n), dtype='str'),
+        'Date': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 3e7, n), unit='s'),
+    })
+    df.loc[::7, 'Latitude'] = np.nan
+    df.loc[::11, 'Description'] = None
+    return df
+
+PREDICATES = [
+    ({'column': 'Beat', 'op': 'between', 'value': ['999.5', '1000.5']}, lambda df: df['Beat'] == 1000),
+    ({'and': [{'column': 'Primary Type', 'op': 'eq', 'value': 'THEFT'}, {'column': 'Latitude', 'op': 'gt', 'value': '41.9'}]},
+     lambda df: (df['Primary Type'] == 'THEFT') & (df['Latitude'] > 41.9)),
+    ({'or': [{'column': 'Description', 'op': 'regex', 'value': 'THEFT|HAND'}, {'column': 'Beat', 'op': 'lt', 'value': 150}]},
+     lambda df: df['Description'].str.contains('THEFT|HAND', na=False) | (df['Beat'] < 150)),
+    ({'and': [{'column': 'Date', 'op': 'ge', 'value': '2020-06-01'}, {'not': {'column': 'Description', 'op': 'in', 'value': ['SIMPLE']}}]},
+     lambda df: (df['Date'] >= '2020-06-01') & df['Description'].notna() & (df['Description'] != 'SIMPLE')),
+    ({'and': [{'column': 'Latitude', 'op': 'isnull'}, {'column': 'Primary Type', 'op': 'ne', 'value': 'ASSAULT'}]},
+     lambda df: df['Latitude'].isna() & (df['Primary Type'] != 'ASSAULT')),
+    # Negations never keep a missing value, except where they negate notnull
+    ({'not': {'column': 'Latitude', 'op': 'gt', 'value': '41.8'}}, lambda df: df['Latitude'] <= 41.8),
+    ({'not': {'or': [{'column': 'Description', 'op': 'eq', 'value': 'SIMPLE'}, {'column': 'Latitude', 'op': 'notnull'}]}},
+     lambda df: df['Description'].notna() & (df['Description'] != 'SIMPLE') & df['Latitude'].isna()),
+    ({'not': {'not': {'column': 'Primary Type', 'op': 'in', 'value': ['THEFT']}}}, lambda df: df['Primary Type'] == 'THEFT'),
+]
+
+@pytest.mark.parametrize("expr, expected", PREDICATES)
+def test_indexed_and_scanned_selections_agree(expr, expected):
+    df = _crimes()
+    columns = {col: df[col] for col in df.columns}
+    want = np.flatnonzero(expected(df).to_numpy(dtype=bool, na_value=False))
+    predicate = parse_predicate(expr)
+    indexes = {}
+    scanned = select_rows(predicate, columns, len(df)).to_positions()
+    indexed = select_rows(predicate, columns, len(df), indexes, set(df.columns)).to_positions()
+    assert np.array_equal(scanned, want) and np.array_equal(indexed, want)
+    assert all(isinstance(indexes[col], (SortedIndex, CodeIndex)) for col in indexes)
+
+def test_negation_matches_ne_on_missing_values():
+    df = pd.DataFrame({'x': pd.Series(['1', None, '2', None], dtype='str')})
+    columns = {'x': df['x']}
+    negated = select_rows(parse_predicate({'not': {'column': 'x', 'op': 'eq', 'value': '1'}}), columns, len(df))
+    ne = select_rows(parse_predicate({'column': 'x', 'op': 'ne', 'value': '1'}), columns, len(df))
+    assert negated.to_positions().tolist() == ne.to_positions().tolist() == [2]
+
+def test_invalid_predicates():
+    for expr, message in (
+        ({'column': 'Beat', 'op': 'like', 'value': 1}, 'Unknown filter operator'),
+        ({'and': []}, 'non-empty list'),
+        ({'column': 'Beat', 'op': 'between', 'value': 5}, '[low, high]'),
+        ({'column': 'Description', 'op': 'regex', 'value': '('}, 'Invalid regex'),
+    ):
+        with pytest.raises(ValueError, match=message):
+            parse_predicate(expr)
+    df = _crimes(10)
+    with pytest.raises(ValueError, match='not a number'):
+        select_rows(parse_predicate({'column': 'Beat', 'op': 'gt', 'value': 'abc'}), {'Beat': df['Beat']}, 10)
+
+def test_session_filters_reuse_indexes(monkeypatch):
+    df = _crimes()
+    csv = df.to_csv(index=False).encode()
+    session_id = client.post("/create_session", files={"file": ("crimes.csv", io.BytesIO(csv), "text/csv")}).json()["session_id"]
+    built = []
+    original = predicates.build_index
+    monkeypatch.setattr(predicates, "build_index", lambda series: built.append(series.name) or original(series))
+    where = {'and': [{'column': 'Beat', 'op': 'ge', 'value': '2000'}, {'column': 'Primary Type', 'op': 'in', 'value': ['THEFT', 'ASSAULT']}]}
+    expected = df[(df['Beat'] >= 2000) & df['Primary Type'].isin(['THEFT', 'ASSAULT'])]
+    for _ in range(3):
+        response = client.post("/filter_rows?rows=20", data={"session_id": session_id, "where": json.dumps(where)})
+        assert response.status_code == 200, response.text
+        assert [row[0] for row in response.json()["data"]] == expected['Beat'].head(20).tolist()
+    assert built == ['Beat'], "Only the first indexed condition is looked up; the index is built once"
+    response = client.post("/apply_transformation", data={
+        "session_id": session_id, "action": "filter", "columns": "[]", "params": json.dumps({"where": where}),
+    })
+    assert response.status_code == 200, response.text
+    page = client.post(f"/page?limit={len(df)}", data={"session_id": session_id}).json()
+    assert page["total_rows"] == len(expected)
+    assert built == ['Beat']
+    response = client.post("/filter_rows", data={"session_id": session_id, "column": "Beat", "min_value": "x"})
+    assert response.status_code == 400 and "not a number" in response.json()["detail"]
@@ -2,152 +2,133 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import io
+import json
+import numpy as np
+import pandas as pd
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app import store
 
 client = TestClient(app)
 
-def test_preview_endpoint():
-    # Use a small sample of the real CSV for testing
-    csv_path = os.path.join(os.path.dirname(__file__), '../../chicago_crime_data.csv')
-    assert os.path.exists(csv_path), f"Test CSV not found: {csv_path}"
-    with open(csv_path, 'rb') as f:
-        response = client.post(
-            "/preview?rows=3",
-            files={"file": ("chicago_crime_data.csv", f, "text/csv")}
-        )
+def crime_csv(n=60):
+    """A small upload shaped like the Chicago crime extract."""
+    rng = np.random.default_rng(11)
+    df = pd.DataFrame({
+        'ID': np.arange(n) + 10_000,
+        'Case Number': [f"JA{100_000 + i}" for i in range(n)],
+        'Primary Type': rng.choice(['THEFT', 'BATTERY', 'ASSAULT'], n),
+        'Beat': rng.integers(100, 2500, n),
+        'Arrest': rng.choice([True, False], n),
+        'Latitude': rng.normal(41.8, 0.1, n).round(6),
+    })
+    df.loc[::5, 'Latitude'] = np.nan
+    # A few repeated reports, for drop_duplicates
+    return pd.concat([df, df.head(4)], ignore_index=True).to_csv(index=False).encode()
+
+@pytest.fixture
+def session_id():
+    response = client.post("/create_session", files={"file": ("chicago_crime_data.csv", io.BytesIO(crime_csv()), "text/csv")})
     assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
-    data = response.json()
+    session_id = response.json()["session_id"]
+    yield session_id
+    store.drop_dataset(session_id)
+
+def _preview(session_id, rows=3):
+    response = client.post(f"/preview?rows={rows}", data={"session_id": session_id})
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    return response.json()
+
+def _apply(session_id, action, columns, params):
+    response = client.post("/apply_transformation?rows=3", data={
+        "session_id": session_id, "action": action, "columns": json.dumps(columns), "params": json.dumps(params),
+    })
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    return response.json()
+
+def test_preview_endpoint(session_id):
+    data = _preview(session_id)
     assert "columns" in data, f"Response missing columns: {data}"
     assert "data" in data, f"Response missing data: {data}"
     assert len(data["data"]) <= 3, f"Returned too many rows: {len(data['data'])}"
-    assert isinstance(data["columns"], list), f"Columns is not a list: {data['columns']}"
+    assert data["columns"] == ['ID', 'Case Number', 'Primary Type', 'Beat', 'Arrest', 'Latitude']
     assert isinstance(data["data"], list), f"Data is not a list: {data['data']}"
 
-def test_impute_endpoint():
-    import json
-    csv_path = os.path.join(os.path.dirname(__file__), '../../chicago_crime_data.csv')
-    assert os.path.exists(csv_path)
-    with open(csv_path, 'rb') as f:
-        response = client.post(
-            "/impute?rows=3",
-            files={"file": ("chicago_crime_data.csv", f, "text/csv")},
-            data={"method": "mean", "columns": json.dumps(["ID"]), "value": ""}
-        )
+def test_impute_endpoint(session_id):
+    response = client.post(
+        "/impute?rows=3",
+        data={"session_id": session_id, "method": "mean", "columns": json.dumps(["Latitude"]), "value": ""}
+    )
     assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
     data = response.json()
-    assert "columns" in data, f"Response missing columns: {data}"
-    assert "data" in data, f"Response missing data: {data}"
     assert len(data["data"]) <= 3, f"Returned too many rows: {len(data['data'])}"
+    col_idx = data["columns"].index("Latitude")
+    assert all(row[col_idx] is not None for row in data["data"]), f"Missing values left: {data['data']}"
+    # A preview leaves the session as it was; applying the step changes it
+    assert _preview(session_id)["data"][0][col_idx] is None
+    _apply(session_id, "impute", ["Latitude"], {"method": "mean"})
+    assert _preview(session_id)["data"][0][col_idx] is not None
 
-def test_encode_endpoint():
-    import json
-    csv_path = os.path.join(os.path.dirname(__file__), '../../chicago_crime_data.csv')
-    assert os.path.exists(csv_path)
-    with open(csv_path, 'rb') as f:
-        response = client.post(
-            "/encode?rows=3",
-            files={"file": ("chicago_crime_data.csv", f, "text/csv")},
-            data={"method": "onehot", "columns": json.dumps(["Primary Type"])}
-        )
+def test_encode_endpoint(session_id):
+    response = client.post(
+        "/encode?rows=3",
+        data={"session_id": session_id, "method": "onehot", "columns": json.dumps(["Primary Type"])}
+    )
     assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
     data = response.json()
-    assert "columns" in data, f"Response missing columns: {data}"
-    assert "data" in data, f"Response missing data: {data}"
     assert len(data["data"]) <= 3, f"Returned too many rows: {len(data['data'])}"
+    assert "Primary Type" not in data["columns"]
+    assert any(col.startswith("Primary Type_") for col in data["columns"]), f"No one-hot columns: {data['columns']}"
 
-def test_scale_endpoint():
-    import json
-    csv_path = os.path.join(os.path.dirname(__file__), '../../chicago_crime_data.csv')
-    assert os.path.exists(csv_path)
-    with open(csv_path, 'rb') as f:
-        response = client.post(
-            "/scale?rows=3",
-            files={"file": ("chicago_crime_data.csv", f, "text/csv")},
-            data={"method": "minmax", "columns": json.dumps(["ID"])}
-        )
+def test_scale_endpoint(session_id):
+    response = client.post(
+        "/scale?rows=3",
+        data={"session_id": session_id, "method": "minmax", "columns": json.dumps(["ID"])}
+    )
     assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
     data = response.json()
-    assert "columns" in data, f"Response missing columns: {data}"
-    assert "data" in data, f"Response missing data: {data}"
     assert len(data["data"]) <= 3, f"Returned too many rows: {len(data['data'])}"
+    col_idx = data["columns"].index("ID")
+    assert all(0 <= row[col_idx] <= 1 for row in data["data"]), f"Values not scaled: {data['data']}"
 
-def test_drop_columns_endpoint():
-    import json
-    csv_path = os.path.join(os.path.dirname(__file__), '../../chicago_crime_data.csv')
-    assert os.path.exists(csv_path)
-    with open(csv_path, 'rb') as f:
-        response = client.post(
-            "/drop_columns?rows=3",
-            files={"file": ("chicago_crime_data.csv", f, "text/csv")},
-            data={"columns": json.dumps(["ID"])}
-        )
+def test_drop_columns_endpoint(session_id):
+    response = client.post("/drop_columns?rows=3", data={"session_id": session_id, "columns": json.dumps(["ID"])})
     assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
     data = response.json()
-    assert "columns" in data, f"Response missing columns: {data}"
-    assert "data" in data, f"Response missing data: {data}"
     assert len(data["data"]) <= 3, f"Returned too many rows: {len(data['data'])}"
     assert "ID" not in data["columns"], f"Column 'ID' was not dropped: {data['columns']}"
+    _apply(session_id, "drop", ["ID"], {})
+    assert "ID" not in _preview(session_id)["columns"]
 
-def test_filter_rows_endpoint():
-    csv_path = os.path.join(os.path.dirname(__file__), '../../chicago_crime_data.csv')
-    assert os.path.exists(csv_path)
+def test_filter_rows_endpoint(session_id):
     # Use a value from the first row for a deterministic test
-    import pandas as pd
-    df = pd.read_csv(csv_path, nrows=1)
-    test_col = df.columns[0]
-    test_val = df.iloc[0, 0]
-    with open(csv_path, 'rb') as f:
-        response = client.post(
-            "/filter_rows?rows=3",
-            files={"file": ("chicago_crime_data.csv", f, "text/csv")},
-            data={"column": test_col, "value": str(test_val)}
-        )
+    test_col, test_val = "Primary Type", _preview(session_id, rows=1)["data"][0][2]
+    response = client.post("/filter_rows?rows=3", data={"session_id": session_id, "column": test_col, "value": str(test_val)})
     assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
     data = response.json()
-    assert "columns" in data, f"Response missing columns: {data}"
-    assert "data" in data, f"Response missing data: {data}"
     assert len(data["data"]) <= 3, f"Returned too many rows: {len(data['data'])}"
     # All returned rows should have the filtered value in the specified column
     col_idx = data["columns"].index(test_col)
     for row in data["data"]:
         assert str(row[col_idx]) == str(test_val), f"Row does not match filter: {row}"
+    _apply(session_id, "filter", [test_col], {"value": test_val})
+    assert all(row[col_idx] == test_val for row in _preview(session_id, rows=100)["data"])
 
-def test_rename_columns_endpoint():
-    import json
-    csv_path = os.path.join(os.path.dirname(__file__), '../../chicago_crime_data.csv')
-    assert os.path.exists(csv_path)
-    # Use the first column and rename it
-    import pandas as pd
-    df = pd.read_csv(csv_path, nrows=1)
-    old_col = df.columns[0]
-    new_col = old_col + "_renamed"
-    with open(csv_path, 'rb') as f:
-        response = client.post(
-            "/rename_columns?rows=3",
-            files={"file": ("chicago_crime_data.csv", f, "text/csv")},
-            data={"rename_map": json.dumps({old_col: new_col})}
-        )
+def test_rename_columns_endpoint(session_id):
+    old_col, new_col = "Beat", "Beat_renamed"
+    response = client.post("/rename_columns?rows=3", data={"session_id": session_id, "rename_map": json.dumps({old_col: new_col})})
     assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
     data = response.json()
     assert new_col in data["columns"], f"Renamed column not found: {data['columns']}"
     assert old_col not in data["columns"], f"Old column still present: {data['columns']}"
+    _apply(session_id, "rename", [], {"rename_map": {old_col: new_col}})
+    assert new_col in _preview(session_id)["columns"]
 
-def test_change_dtypes_endpoint():
-    import json
-    csv_path = os.path.join(os.path.dirname(__file__), '../../chicago_crime_data.csv')
-    assert os.path.exists(csv_path)
-    import pandas as pd
-    df = pd.read_csv(csv_path, nrows=1)
-    # Try to convert the first column to string (should always succeed)
-    col = df.columns[0]
-    with open(csv_path, 'rb') as f:
-        response = client.post(
-            "/change_dtypes?rows=3",
-            files={"file": ("chicago_crime_data.csv", f, "text/csv")},
-            data={"dtype_map": json.dumps({col: "str"})}
-        )
+def test_change_dtypes_endpoint(session_id):
+    # Converting to string should always succeed
+    col = "ID"
+    response = client.post("/change_dtypes?rows=3", data={"session_id": session_id, "dtype_map": json.dumps({col: "str"})})
     assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
     data = response.json()
     assert col in data["columns"], f"Column missing after dtype change: {data['columns']}"
@@ -156,32 +137,14 @@ def test_change_dtypes_endpoint():
     for row in data["data"]:
         assert isinstance(row[col_idx], str) or row[col_idx] is None, f"Value is not string: {row[col_idx]}"
 
-def test_drop_duplicates_endpoint():
-    import json
-    csv_path = os.path.join(os.path.dirname(__file__), '../../chicago_crime_data.csv')
-    assert os.path.exists(csv_path)
+def test_drop_duplicates_endpoint(session_id):
     # No subset: drop all duplicate rows
-    with open(csv_path, 'rb') as f:
-        response = client.post(
-            "/drop_duplicates?rows=10",
-            files={"file": ("chicago_crime_data.csv", f, "text/csv")},
-            data={"subset": ""}
-        )
+    response = client.post("/drop_duplicates?rows=100", data={"session_id": session_id, "subset": ""})
     assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
     data = response.json()
-    assert "columns" in data, f"Response missing columns: {data}"
-    assert "data" in data, f"Response missing data: {data}"
-    # Subset: drop duplicates based on the first column only
-    import pandas as pd
-    df = pd.read_csv(csv_path, nrows=1)
-    col = df.columns[0]
-    with open(csv_path, 'rb') as f:
-        response = client.post(
-            "/drop_duplicates?rows=10",
-            files={"file": ("chicago_crime_data.csv", f, "text/csv")},
-            data={"subset": json.dumps([col])}
-        )
+    assert len(data["data"]) == 60, f"Duplicates were kept: {len(data['data'])} rows"
+    # Subset: drop duplicates based on one column only
+    response = client.post("/drop_duplicates?rows=100", data={"session_id": session_id, "subset": json.dumps(["Primary Type"])})
     assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
     data = response.json()
-    assert "columns" in data, f"Response missing columns: {data}"
-    assert "data" in data, f"Response missing data: {data}"
+    assert len(data["data"]) == 3, f"Expected one row per type: {data['data']}"
@@ -0,0 +1,71 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pandas as pd
+import pytest
+from app.profiling import profile_columns
+
+def sample_frame():
+    rng = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame({
+        'value': rng.normal(size=n),
+        'count': rng.integers(0, 20, n),
+        'constant': np.ones(n),
+        'label': rng.choice(['a', 'b', 'c', None], n),
+        'ties': ['p', 'q'] * (n // 2),
+    })
+    df.loc[::7, 'value'] = np.nan
+    return df
+
+def test_numeric_stats_match_pandas():
+    df = sample_frame()
+    stats = profile_columns(df)
+    col = df['value']
+    s = stats['value']
+    assert list(s) == ['count', 'missing_pct', 'unique', 'mean', 'median', 'std', 'min', 'max', 'histogram', 'data_issues', 'recommendations']
+    assert s['count'] == col.count()
+    assert s['unique'] == col.nunique()
+    assert s['mean'] == pytest.approx(col.mean())
+    assert s['median'] == pytest.approx(col.median())
+    assert s['std'] == pytest.approx(col.std())
+    counts, edges = np.histogram(col.dropna(), bins=20)
+    assert s['histogram']['counts'] == counts.tolist(), f"Histogram mismatch: {s['histogram']}"
+    assert s['histogram']['bin_edges'] == pytest.approx(edges.tolist())
+    assert stats['constant']['data_issues']['constant'] == 1.0
+    assert 'Consider dropping this column as it is nearly constant.' in stats['constant']['recommendations']
+
+def test_categorical_stats_match_pandas():
+    df = sample_frame()
+    stats = profile_columns(df)
+    col = df['label']
+    s = stats['label']
+    assert list(s) == ['count', 'missing_pct', 'unique', 'top', 'freq', 'value_counts', 'data_issues', 'recommendations']
+    assert s['top'] == col.mode().iloc[0]
+    assert s['freq'] == int((col == col.mode().iloc[0]).sum())
+    expected = [{'value': str(k), 'count': int(v)} for k, v in col.value_counts(dropna=False).head(20).items()]
+    assert s['value_counts'] == expected
+    assert s['data_issues']['outlier'] is None
+    # Ties resolve to the smallest value, as Series.mode() does
+    assert stats['ties']['top'] == 'p'
+
+def test_subset_and_empty_columns():
+    df = sample_frame()
+    df['empty'] = np.nan
+    stats = profile_columns(df, ['empty', 'label'])
+    assert list(stats) == ['empty', 'label']
+    assert stats['empty']['count'] == 0
+    assert stats['empty']['mean'] is None
+    assert stats['empty']['histogram'] == {'bin_edges': [], 'counts': []}
+
+def test_filtered_categorical_skips_unused_categories():
+    df = sample_frame()
+    df['kind'] = pd.Series([f'k{i % 30}' for i in range(len(df))], dtype='category')
+    df.loc[::11, 'kind'] = None
+    filtered = df[df['kind'].isin(['k1', 'k2', 'k3']) | df['kind'].isna()]
+    s = profile_columns(filtered)['kind']
+    assert all(entry['count'] > 0 for entry in s['value_counts'])
+    assert s['unique'] == filtered['kind'].nunique()
+    expected = filtered['kind'].value_counts(dropna=False)
+    assert s['value_counts'] == [{'value': str(k), 'count': int(v)} for k, v in expected[expected > 0].items()]
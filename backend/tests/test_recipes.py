@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+SAMPLE_CSV = b"ID,Primary Type,Score\n1,THEFT,1.0\n2,BATTERY,\n3,THEFT,3.0\n3,THEFT,3.0\n4,ASSAULT,5.0\n"
+
+RECIPE = [
+    {"action": "dedupe", "columns": []},
+    {"action": "impute", "columns": ["Score"], "params": {"method": "mean"}},
+    {"action": "scale", "columns": ["Score"], "params": {"method": "minmax"}},
+    {"action": "rename", "params": {"rename_map": {"Primary Type": "Type"}}},
+    {"action": "encode", "columns": ["Type"], "params": {"method": "ordinal"}},
+]
+
+def _session(csv=SAMPLE_CSV):
+    response = client.post("/create_session", files={"file": ("data.csv", io.BytesIO(csv), "text/csv")})
+    return response.json()["session_id"]
+
+def test_recipe_runs_in_one_request():
+    session_id = _session()
+    response = client.post(
+        "/apply_recipe?rows=10",
+        data={"session_id": session_id, "recipe": json.dumps(RECIPE), "include_stats": "true", "save_as": "cleanup"},
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["columns"] == ["ID", "Type", "Score"]
+    assert len(body["data"]) == 4, f"Duplicates should be gone: {body['data']}"
+    assert [row[2] for row in body["data"]] == [0.0, 0.5, 0.5, 1.0]
+    assert body["stats"]["Score"]["missing_pct"] == 0
+    # Undo walks back one step of the recipe at a time
+    response = client.post("/undo?rows=10", data={"session_id": session_id})
+    assert response.json()["columns"] == ["ID", "Type", "Score"]
+    assert body["can_undo"] and response.json()["can_undo"]
+    assert isinstance(response.json()["data"][0][1], str)
+
+def test_saved_recipe_refits_on_another_dataset():
+    session_id = _session()
+    client.post("/apply_recipe", data={"session_id": session_id, "recipe": json.dumps(RECIPE), "save_as": "refit"})
+    assert "refit" in client.get("/recipes").json()["recipes"]
+    other = _session(b"ID,Primary Type,Score\n1,THEFT,10\n2,THEFT,30\n")
+    response = client.post("/apply_recipe?rows=10", data={"session_id": other, "recipe_name": "refit"})
+    assert response.status_code == 200, response.text
+    assert [row[2] for row in response.json()["data"]] == [0.0, 1.0]
+
+def test_recipe_saved_with_fitted_parameters_replays_them():
+    session_id = _session()
+    response = client.post(
+        "/apply_recipe",
+        data={"session_id": session_id, "recipe": json.dumps(RECIPE), "save_as": "frozen", "save_fitted": "true"},
+    )
+    assert response.status_code == 200, response.text
+    saved = client.get("/recipes").json()["recipes"]["frozen"]
+    assert saved[2]["fitted"] == {"scale": {"Score": [1.0, 4.0]}}
+    assert saved[4]["fitted"]["categories"] == {"Type": ["ASSAULT", "BATTERY", "THEFT"]}
+    # A new batch is transformed with the first dataset's fill value, range and vocabulary
+    other = _session(b"ID,Primary Type,Score\n1,THEFT,9\n2,ROBBERY,\n")
+    response = client.post("/apply_recipe?rows=10", data={"session_id": other, "recipe_name": "frozen"})
+    assert response.status_code == 200, response.text
+    assert response.json()["data"] == [[1, 2, 2.0], [2, -1, 0.5]]
+
+def test_invalid_recipe_step_is_rejected():
+    session_id = _session()
+    recipe = json.dumps([{"action": "drop", "columns": ["ID"]}, {"action": "explode"}])
+    response = client.post("/apply_recipe", data={"session_id": session_id, "recipe": recipe})
+    assert response.status_code == 400
+    assert "step 1" in response.json()["detail"]
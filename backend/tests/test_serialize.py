@@ -0,0 +1,36 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from app.serialize import rows_json, json_response, RawJSON
+from benchmarks.bench_serialize import crime_frame, previous_path, serializer_path
+
+def test_rows_match_previous_path():
+    window = crime_frame(2_000)
+    assert json.loads(serializer_path(window)) == json.loads(previous_path(window))
+
+def test_missing_and_special_values():
+    df = pd.DataFrame({
+        'f': [1.5, np.nan, np.inf, -np.inf],
+        'mixed': pd.Series(['a', np.inf, None, 3], dtype=object),
+        'when': pd.to_datetime(['2021-03-01 13:30:00.25', None, '2021-03-02 00:00:00', '2021-03-03 00:00:00'], format='mixed'),
+        'kind': pd.Categorical(['x', None, 'y', 'x']),
+        'n': pd.array([1, None, 3, 4], dtype='Int64'),
+        'flag': pd.arrays.SparseArray([0, 1, 0, 0], fill_value=0),
+    })
+    rows = json.loads(rows_json(df))
+    assert rows[0] == [1.5, 'a', '2021-03-01T13:30:00.250000', 'x', 1, 0]
+    assert rows[1] == [None, None, None, None, None, 1]
+    assert rows[2][:2] == [None, None] and rows[3][:2] == [None, 3]
+    assert rows[2][2] == '2021-03-02T00:00:00.000000', "One fractional value sets the unit for the column"
+    assert json.loads(rows_json(df[['kind']].iloc[:0])) == []
+    assert json.loads(rows_json(df[[]])) == [[], [], [], []]
+
+def test_json_response_splices_raw_rows():
+    response = json_response({"columns": ["a"], "data": RawJSON('[[1],[null]]'), "total_rows": np.int64(2)})
+    assert response.media_type == 'application/json'
+    assert json.loads(response.body) == {"columns": ["a"], "data": [[1], [None]], "total_rows": 2}
+    assert json.loads(response.body) == jsonable_encoder({"columns": ["a"], "data": [[1], [None]], "total_rows": 2})
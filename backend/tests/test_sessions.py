@@ -0,0 +1,171 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import json
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+SAMPLE_CSV = (
+    "ID,Primary Type,District,Score\n"
+    "1,THEFT,10,1.5\n"
+    "2,BATTERY,,2.5\n"
+    "3,THEFT,12,\n"
+    "4,ASSAULT,10,4.0\n"
+    "5,THEFT,11,5.0\n"
+).encode()
+
+def create_session():
+    response = client.post(
+        "/create_session",
+        files={"file": ("sample.csv", io.BytesIO(SAMPLE_CSV), "text/csv")}
+    )
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    return response.json()["session_id"]
+
+def test_preview_by_session_id():
+    session_id = create_session()
+    response = client.post("/preview?rows=3", data={"session_id": session_id})
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    data = response.json()
+    assert data["columns"] == ["ID", "Primary Type", "District", "Score"], f"Unexpected columns: {data['columns']}"
+    assert len(data["data"]) == 3, f"Returned wrong number of rows: {len(data['data'])}"
+
+def test_transform_undo_and_stats_without_file():
+    session_id = create_session()
+    response = client.post(
+        "/apply_transformation?rows=5",
+        data={"session_id": session_id, "action": "impute", "columns": json.dumps(["Score"]), "params": json.dumps({"method": "constant", "value": 0})}
+    )
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    data = response.json()
+    assert data["can_undo"] is True
+    score_idx = data["columns"].index("Score")
+    assert data["data"][2][score_idx] == 0, f"Missing value was not imputed: {data['data'][2]}"
+
+    response = client.post(
+        "/apply_transformation?rows=5",
+        data={"session_id": session_id, "action": "drop", "columns": json.dumps(["District"])}
+    )
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    assert "District" not in response.json()["columns"]
+
+    response = client.post("/column_stats", data={"session_id": session_id})
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    stats = response.json()["stats"]
+    assert "District" not in stats, f"Stats include dropped column: {list(stats)}"
+    assert stats["Score"]["missing_pct"] == 0.0, f"Stats do not reflect imputation: {stats['Score']}"
+
+    response = client.post("/undo?rows=5", data={"session_id": session_id})
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    data = response.json()
+    assert "District" in data["columns"], f"Undo did not restore dropped column: {data['columns']}"
+    assert data["can_undo"] is True
+
+    response = client.post("/undo?rows=5", data={"session_id": session_id})
+    data = response.json()
+    assert data["can_undo"] is False
+    score_idx = data["columns"].index("Score")
+    assert data["data"][2][score_idx] is None, f"Undo did not restore missing value: {data['data'][2]}"
+
+def test_standalone_ops_do_not_modify_session():
+    session_id = create_session()
+    response = client.post(
+        "/impute?rows=5",
+        data={"session_id": session_id, "method": "constant", "columns": json.dumps(["Score"]), "value": "0"}
+    )
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    response = client.post("/preview?rows=5", data={"session_id": session_id})
+    data = response.json()
+    score_idx = data["columns"].index("Score")
+    assert data["data"][2][score_idx] is None, f"Standalone impute leaked into the session: {data['data'][2]}"
+
+def test_unknown_session_without_file():
+    response = client.post("/column_stats", data={"session_id": "missing"})
+    assert response.status_code == 400, f"Status code: {response.status_code}, Response: {response.text}"
+
+def test_versions_share_unchanged_columns():
+    from app.store import sessions
+    session_id = create_session()
+    client.post(
+        "/apply_transformation",
+        data={"session_id": session_id, "action": "impute", "columns": json.dumps(["Score"]), "params": json.dumps({"method": "mean"})}
+    )
+    base, step = sessions[session_id][-2], sessions[session_id][-1]
+    assert step["changed"] == {"Score"}, f"Unexpected changed set: {step['changed']}"
+    for col in ["ID", "Primary Type", "District"]:
+        assert step["data"][col] is base["data"][col], f"Column '{col}' was copied instead of shared"
+    assert step["data"]["Score"] is not base["data"]["Score"]
+    assert base["frame"]["Score"].isnull().sum() == 1, "Impute modified the previous version"
+
+def test_column_stats_reprofile_only_changed_columns(monkeypatch):
+    import app.crud
+    session_id = create_session()
+    client.post("/column_stats", data={"session_id": session_id})
+    profiled = []
+    real_profile = app.crud.profile_columns
+    def spy(df, columns=None, **kwargs):
+        profiled.append(list(columns))
+        return real_profile(df, columns, **kwargs)
+    monkeypatch.setattr(app.crud, "profile_columns", spy)
+    client.post(
+        "/apply_transformation",
+        data={"session_id": session_id, "action": "impute", "columns": json.dumps(["Score"]), "params": json.dumps({"method": "median"})}
+    )
+    response = client.post("/column_stats", data={"session_id": session_id})
+    assert list(response.json()["stats"]) == ["ID", "Primary Type", "District", "Score"]
+    assert profiled == [["Score"]], f"Unexpected columns profiled: {profiled}"
+    client.post("/undo", data={"session_id": session_id})
+    response = client.post("/column_stats", data={"session_id": session_id})
+    assert response.json()["stats"]["Score"]["count"] == 4
+    assert profiled == [["Score"]], f"Undo re-profiled columns: {profiled}"
+
+def test_full_worker_pool_rejects_with_503(monkeypatch):
+    import app.executor
+    session_id = create_session()
+    monkeypatch.setattr(app.executor, "MAX_PENDING", 0)
+    response = client.post("/column_stats", data={"session_id": session_id})
+    assert response.status_code == 503, f"Status code: {response.status_code}, Response: {response.text}"
+    assert "Retry-After" in response.headers
+
+def test_cancelled_request_stays_pending_until_its_work_ends():
+    import asyncio
+    import threading
+    from app.executor import run_blocking, pending
+    release = threading.Event()
+
+    async def cancel_midway():
+        task = asyncio.create_task(run_blocking(release.wait, 5))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        still = pending()
+        release.set()
+        for _ in range(100):
+            if pending() < still:
+                break
+            await asyncio.sleep(0.01)
+        return still, pending()
+
+    before = pending()
+    still, after = asyncio.run(cancel_midway())
+    assert (still, after) == (before + 1, before)
+
+def test_page_window_sort_and_column_subset():
+    session_id = create_session()
+    response = client.post("/page?offset=1&limit=2", data={"session_id": session_id, "columns": json.dumps(["ID", "Score"])})
+    assert response.status_code == 200, f"Status code: {response.status_code}, Response: {response.text}"
+    data = response.json()
+    assert data["columns"] == ["ID", "Score"]
+    assert data["data"] == [[2, 2.5], [3, None]], f"Unexpected window: {data['data']}"
+    assert data["total_rows"] == 5
+    response = client.post("/page?offset=0&limit=5", data={"session_id": session_id, "sort_by": "Score", "ascending": "false"})
+    data = response.json()
+    ids = [row[data["columns"].index("ID")] for row in data["data"]]
+    assert ids == [5, 4, 2, 1, 3], f"Rows not sorted by Score descending with missing last: {ids}"
+    response = client.post("/page?offset=4&limit=5", data={"session_id": session_id, "sort_by": "Score"})
+    assert [row[0] for row in response.json()["data"]] == [3]
@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import io
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app import chunked
+from app.profiling import profile_columns
+from app.sketches import approximate_profile, sketch_columns
+
+client = TestClient(app)
+
+def _frame(n=200_000):
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({
+        'Score': rng.normal(10, 2, n),
+        'Beat': rng.integers(0, 5000, n).astype(float),
+        'Type': pd.Series(rng.choice(['THEFT', 'BATTERY', 'ASSAULT', 'ARSON'], n, p=[0.5, 0.3, 0.15, 0.05])).astype('str'),
+    })
+    df.loc[::10, 'Score'] = np.nan
+    return df
+
+def test_sketch_stats_within_error_bounds():
+    df = _frame()
+    exact, approx = profile_columns(df), approximate_profile(df)
+    for col in df.columns:
+        bounds = approx[col]['approximate']
+        assert approx[col]['count'] == exact[col]['count']
+        # Three standard errors
+        assert abs(approx[col]['unique'] - exact[col]['unique']) <= 3 * bounds['unique_relative_error'] * exact[col]['unique'] + 1
+        assert set(approx[col]['data_issues']) == set(exact[col]['data_issues'])
+    for col in ('Score', 'Beat'):
+        values = df[col].dropna()
+        rank = (values < approx[col]['median']).mean()
+        assert abs(rank - 0.5) <= approx[col]['approximate']['rank_error'], f"{col} median rank {rank}"
+        assert sum(approx[col]['histogram']['counts']) == exact[col]['count']
+        assert approx[col]['mean'] == exact[col]['mean'] and approx[col]['min'] == exact[col]['min']
+    assert approx['Type']['top'] == 'THEFT'
+    assert approx['Type']['value_counts'] == exact['Type']['value_counts'], "Few values: counts are exact"
+
+def test_sketches_merge_across_chunks():
+    df = _frame(50_000)
+    halves = [sketch_columns(df.iloc[:20_000]), sketch_columns(df.iloc[20_000:])]
+    whole = approximate_profile(df)
+    for col in df.columns:
+        merged = halves[0][col].merge(halves[1][col]).stats()
+        assert merged['count'] == whole[col]['count'] and merged['missing_pct'] == whole[col]['missing_pct']
+        assert merged['unique'] == whole[col]['unique'], "HyperLogLog merges are lossless"
+    assert abs(halves[0]['Score'].stats()['std'] - df['Score'].std()) < 1e-9
+
+def test_approximate_stats_endpoint(monkeypatch):
+    monkeypatch.setattr(chunked, "CHUNK_ROWS", 4096)
+    csv = _frame(20_000).to_csv(index=False).encode()
+    for query in ("", "?chunked=true"):
+        response = client.post(f"/create_session{query}", files={"file": ("data.csv", io.BytesIO(csv), "text/csv")})
+        session_id = response.json()["session_id"]
+        response = client.post("/column_stats", data={"session_id": session_id, "approximate": "true"})
+        assert response.status_code == 200, response.text
+        stats = response.json()["stats"]
+        assert stats['Score']['missing_pct'] == 10.0
+        assert stats['Type']['approximate']['count_error'] == 0
+        assert stats['Beat']['approximate']['rank_error'] > 0
+
+def test_concurrent_sessions_on_one_upload_share_only_finished_sketches():
+    from concurrent.futures import ThreadPoolExecutor
+    from app.crud import get_column_stats
+    df = _frame(50_000).assign(ID=np.arange(50_000) + 7)
+    csv = df.to_csv(index=False).encode()
+    sessions = [
+        client.post("/create_session", files={"file": ("same.csv", io.BytesIO(csv), "text/csv")}).json()["session_id"]
+        for _ in range(4)
+    ]
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda session_id: get_column_stats(None, session_id, approximate=True), sessions))
+    for stats in results:
+        assert stats['Score']['count'] == df['Score'].count()
+        assert stats['Type']['count'] == len(df)
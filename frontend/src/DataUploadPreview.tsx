@@ -18,6 +18,7 @@ const DataUploadPreview: React.FC = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [paginationModel, setPaginationModel] = useState({ page: 0, pageSize: 10 });
+  const [rowCount, setRowCount] = useState<number | null>(null);
   const [selectedColumns, setSelectedColumns] = useState<string[]>([]);
   const [action, setAction] = useState<string>('');
   const [sessionId, setSessionId] = useState<string | null>(null);
@@ -60,6 +61,7 @@ const DataUploadPreview: React.FC = () => {
       setRows([]);
       setError(null);
       setSessionId(null);
+      setRowCount(null);
       // Create a session for this file
       const formData = new FormData();
       formData.append('file', newFile);
@@ -78,12 +80,53 @@ const DataUploadPreview: React.FC = () => {
     }
   };
 
+  // Fetch one page of the session's current data; the server only touches that window
+  const loadPage = async (model: { page: number; pageSize: number }) => {
+    if (!sessionId) return;
+    const formData = new FormData();
+    formData.append('session_id', sessionId);
+    const offset = model.page * model.pageSize;
+    const response = await fetch(`http://127.0.0.1:8000/page?offset=${offset}&limit=${model.pageSize}`, {
+      method: 'POST',
+      body: formData,
+    });
+    if (!response.ok) throw new Error(await response.text());
+    const data = await response.json();
+    setColumns(data.columns.map((col: string) => ({
+      field: col,
+      headerName: col,
+      width: 150,
+    })));
+    setRows(data.data.map((row: any[], idx: number) => {
+      const rowObj: any = { id: offset + idx };
+      data.columns.forEach((col: string, i: number) => {
+        rowObj[col] = row[i];
+      });
+      return rowObj;
+    }));
+    setRowCount(data.total_rows);
+  };
+
+  const handlePaginationModelChange = async (model: { page: number; pageSize: number }) => {
+    setPaginationModel(model);
+    try {
+      await loadPage(model);
+    } catch (err: any) {
+      setError(err.message || 'Failed to load page');
+    }
+  };
+
   const handleUpload = async () => {
     if (!file) return;
     setLoading(true);
     setError(null);
     const formData = new FormData();
-    formData.append('file', file);
+    // Once a session exists the server already holds the parsed file
+    if (sessionId) {
+      formData.append('session_id', sessionId);
+    } else {
+      formData.append('file', file);
+    }
     formData.append('rows', '10');
     try {
       const response = await fetch(API_URL + '?rows=10', {
@@ -110,6 +153,8 @@ const DataUploadPreview: React.FC = () => {
       });
       setColumns(gridCols);
       setRows(gridRows);
+      setPaginationModel({ ...paginationModel, page: 0 });
+      await loadPage({ ...paginationModel, page: 0 });
       await fetchColumnStats(file, true); // resetOnMissing true for file upload
     } catch (err: any) {
       setError(err.message || 'Upload failed');
@@ -123,7 +168,6 @@ const DataUploadPreview: React.FC = () => {
     setLoading(true);
     setError(null);
     const formData = new FormData();
-    formData.append('file', file);
     formData.append('session_id', sessionId);
     formData.append('action', action);
     formData.append('columns', JSON.stringify(selectedColumns));
@@ -157,6 +201,8 @@ const DataUploadPreview: React.FC = () => {
       });
       setColumns(gridCols);
       setRows(gridRows);
+      setPaginationModel({ ...paginationModel, page: 0 });
+      await loadPage({ ...paginationModel, page: 0 });
       setCanUndo(true);
       setUndoCount(undoCount + 1);
       setSelectedColumns([]); // Reset column selection after action
@@ -172,7 +218,6 @@ const DataUploadPreview: React.FC = () => {
     setLoading(true);
     setError(null);
     const formData = new FormData();
-    formData.append('file', file);
     formData.append('session_id', sessionId);
     try {
       const response = await fetch('http://127.0.0.1:8000/undo?rows=10', {
@@ -195,6 +240,8 @@ const DataUploadPreview: React.FC = () => {
       });
       setColumns(gridCols);
       setRows(gridRows);
+      setPaginationModel({ ...paginationModel, page: 0 });
+      await loadPage({ ...paginationModel, page: 0 });
       setUndoCount(undoCount - 1);
       setCanUndo(!!data.can_undo);
       await fetchColumnStats(file, false); // preserve customizations
@@ -207,8 +254,25 @@ const DataUploadPreview: React.FC = () => {
   };
 
   // Export current data as CSV
-  const handleExportCSV = () => {
+  const handleExportCSV = async () => {
     if (columns.length === 0 || rows.length === 0) return;
+    if (sessionId) {
+      // The server streams the full transformed dataset, not just the visible rows
+      const formData = new FormData();
+      formData.append('session_id', sessionId);
+      formData.append('format', 'csv');
+      try {
+        const response = await fetch('http://127.0.0.1:8000/export', {
+          method: 'POST',
+          body: formData,
+        });
+        if (!response.ok) throw new Error(await response.text());
+        saveAs(await response.blob(), 'processed_data.csv');
+      } catch (err: any) {
+        setError(err.message || 'Export failed');
+      }
+      return;
+    }
     const csvRows = [];
     // Header
     csvRows.push(columns.map(col => col.headerName).join(','));
@@ -225,9 +289,10 @@ const DataUploadPreview: React.FC = () => {
   const fetchColumnStats = async (fileObj: File | null, resetOnMissing = false) => {
     if (!fileObj) return;
     const formData = new FormData();
-    formData.append('file', fileObj);
     if (sessionId) {
       formData.append('session_id', sessionId);
+    } else {
+      formData.append('file', fileObj);
     }
     const response = await fetch('http://127.0.0.1:8000/column_stats', {
       method: 'POST',
@@ -639,7 +704,6 @@ const DataUploadPreview: React.FC = () => {
     setLoading(true);
     setError(null);
     const formData = new FormData();
-    formData.append('file', file);
     formData.append('session_id', sessionId);
     formData.append('action', action);
     formData.append('columns', JSON.stringify(columns));
@@ -667,6 +731,8 @@ const DataUploadPreview: React.FC = () => {
       });
       setColumns(gridCols);
       setRows(gridRows);
+      setPaginationModel({ ...paginationModel, page: 0 });
+      await loadPage({ ...paginationModel, page: 0 });
       setCanUndo(true);
       setUndoCount(undoCount + 1);
       // Mark this recommendation as dismissed
@@ -847,8 +913,10 @@ const DataUploadPreview: React.FC = () => {
             rows={rows}
             columns={columns}
             paginationModel={paginationModel}
-            onPaginationModelChange={setPaginationModel}
-            pageSizeOptions={[10]}
+            onPaginationModelChange={handlePaginationModelChange}
+            paginationMode={sessionId && rowCount !== null ? 'server' : 'client'}
+            rowCount={sessionId && rowCount !== null ? rowCount : undefined}
+            pageSizeOptions={[10, 25, 100]}
           />
         </Box>
       )}